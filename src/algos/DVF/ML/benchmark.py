@@ -0,0 +1,305 @@
+"""
+    Benchmark du pipeline ML (preprocessing.py + prediction.py) sur données synthétiques
+    - Génère des jeux "façon DVF" à 1x, 10x, 100x les 191K ventes actuelles (+ features bruit optionnelles)
+    - Chronomètre chaque étape : chargement, feature engineering, scaling, export/rechargement ml,
+      fit HGBR, fit logistique, permutation importance
+    - Mesure le pic de RSS par étape (échantillonnage en tâche de fond)
+    - Chaque configuration tourne dans un process neuf pour que les pics mémoire ne se mélangent pas
+    - Rapport JSON + Markdown, comparaison optionnelle avec un rapport de référence (code retour 1 si régression)
+
+    Exemple :
+        python src/algos/DVF/ML/benchmark.py --echelles 0.1,1 --threads 1,4 --max-iter 200
+        python src/algos/DVF/ML/benchmark.py --reference models/benchmark/benchmark_20250101.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+#lancé en script : la racine du projet doit être dans le path pour importer src
+root_path = str(Path(__file__).resolve().parents[4])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.config import paths
+
+OUTPUT_DIR = paths.models.path / 'benchmark'
+N_VENTES_REF = 191_193  # lignes exploitables actuelles
+SEUIL_REGRESSION = 1.20  # +20% de temps ou de mémoire = régression
+
+#centres approximatifs des arrondissements (cf. tableau_prep.py) et niveau de prix relatif
+CENTRES = {
+    1: (48.8628, 2.3469), 2: (48.8637, 2.3522), 3: (48.8606, 2.3600), 4: (48.8530, 2.3554),
+    5: (48.8467, 2.3523), 6: (48.8490, 2.3333), 7: (48.8549, 2.3103), 8: (48.8698, 2.3078),
+    9: (48.8771, 2.3382), 10: (48.8734, 2.3609), 11: (48.8636, 2.3801), 12: (48.8407, 2.3978),
+    13: (48.8273, 2.3558), 14: (48.8289, 2.3278), 15: (48.8427, 2.2892), 16: (48.8565, 2.2777),
+    17: (48.8803, 2.2888), 18: (48.8893, 2.3449), 19: (48.8925, 2.3885), 20: (48.8599, 2.4079),
+}
+PRIX_ARR = {1: 13500, 2: 12000, 3: 12800, 4: 13500, 5: 12800, 6: 15000, 7: 14500, 8: 12500,
+            9: 11300, 10: 10000, 11: 10500, 12: 9700, 13: 9200, 14: 10200, 15: 10400, 16: 11800,
+            17: 11000, 18: 9400, 19: 8800, 20: 9200}
+
+ETAPES = ['chargement', 'feature_engineering', 'scaling', 'export_ml', 'chargement_ml',
+          'hgbr_fit', 'logistic_fit', 'permutation_importance']
+
+
+def generate_dvf_synthetique(n, n_features_extra=0, seed=42):
+    """Jeu au format du CSV nettoyé (colonnes utilisées par preprocessing.py), prix cohérents avec la géographie"""
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(1, 21, n)
+    centres = np.array([CENTRES[a] for a in range(1, 21)])
+    lat = centres[arr - 1, 0] + rng.normal(0, 0.006, n)
+    lon = centres[arr - 1, 1] + rng.normal(0, 0.009, n)
+
+    surface = np.clip(rng.lognormal(3.8, 0.55, n), 9, 300).round(1)
+    pieces = np.clip(np.round(surface / 22 + rng.normal(0, 0.6, n)), 1, 10)
+    pieces[rng.random(n) < 0.03] = np.nan
+
+    jours = rng.integers(0, 365 * 5 + 180, n)
+    dates = pd.Timestamp('2020-01-01') + pd.to_timedelta(jours, unit='D')
+    tendance = 1 + 0.04 * np.sin(jours / 365 * np.pi / 2) - 0.02 * (jours / 365 - 3).clip(0)
+
+    prix_arr = np.array([PRIX_ARR[a] for a in range(1, 21)])[arr - 1]
+    prix_m2 = prix_arr * tendance * (1 + 0.08 * np.log(60 / surface)) * rng.lognormal(0, 0.25, n)
+    prix_m2 = np.clip(prix_m2, 2000, 36000).round(2)
+
+    df = pd.DataFrame({
+        'date_mutation': dates.strftime('%Y-%m-%d'),
+        'valeur_fonciere': (prix_m2 * surface).round(0),
+        'code_commune': 75100 + arr,
+        'type_local': 'Appartement',
+        'surface_reelle_bati': surface,
+        'nombre_pieces_principales': pieces,
+        'latitude': lat.round(6),
+        'longitude': lon.round(6),
+        'surface_m2_retenue': surface,
+        'prix_m2': prix_m2,
+        'code_arrondissement': arr,
+        'annee': dates.year,
+        'mois': dates.month,
+    })
+    for i in range(n_features_extra):
+        df[f'bruit_{i}'] = rng.normal(size=n).round(4)
+    return df
+
+
+def _rss_mo():
+    """RSS courant du process en Mo (Linux /proc, sinon psutil s'il est installé)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        return float('nan')
+
+
+class SuiviMemoire(threading.Thread):
+    """Échantillonne le RSS toutes les 10 ms pour garder le pic de l'étape en cours"""
+
+    def __init__(self, intervalle=0.01):
+        super().__init__(daemon=True)
+        self.intervalle = intervalle
+        self.pic = _rss_mo()
+        self._stop_event = threading.Event()
+
+    def reset(self):
+        self.pic = _rss_mo()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.pic = max(self.pic, _rss_mo())
+            time.sleep(self.intervalle)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def run_configuration(echelle, threads, n_features_extra, max_iter):
+    """Exécute le pipeline complet pour une configuration (dans un process dédié)"""
+    from threadpoolctl import threadpool_limits
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from sklearn.linear_model import LogisticRegression
+    from src.algos.DVF.ML.importance import compute_importance
+    from src.algos.DVF.ML.preprocessing import feature_engineering, prepare_ml_data, save_ml_arrays, load_ml_arrays
+
+    n = int(N_VENTES_REF * echelle)
+    resultats = {}
+    suivi = SuiviMemoire()
+    suivi.start()
+
+    @contextmanager
+    def etape(nom):
+        suivi.reset()
+        debut = time.perf_counter()
+        yield
+        resultats[nom] = {'secondes': round(time.perf_counter() - debut, 4),
+                          'pic_rss_mo': round(max(suivi.pic, _rss_mo()), 1)}
+        print(f"    {nom:<25}{resultats[nom]['secondes']:>10.2f}s {resultats[nom]['pic_rss_mo']:>10.0f} Mo")
+
+    with tempfile.TemporaryDirectory() as tmp, threadpool_limits(limits=threads):
+        csv_path = Path(tmp) / 'dvf_synthetique.csv'
+        generate_dvf_synthetique(n, n_features_extra).to_csv(csv_path, sep=';', index=False)
+
+        with etape('chargement'):
+            df = pd.read_csv(csv_path, sep=';')
+
+        with etape('feature_engineering'):
+            df_fe = feature_engineering(df)
+            X, y, feature_cols = prepare_ml_data(df_fe)
+            extra = [c for c in df_fe.columns if c.startswith('bruit_')]
+            if extra:
+                X = pd.concat([X, df_fe.loc[X.index, extra]], axis=1)
+                feature_cols = feature_cols + extra
+            del df, df_fe
+
+        with etape('scaling'):
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
+
+        with etape('export_ml'):
+            save_ml_arrays(X_train_scaled, X_test_scaled, y_train, y_test, feature_cols, Path(tmp))
+            del X_train_scaled, X_test_scaled
+
+        with etape('chargement_ml'):
+            X_train, X_test, y_train, y_test, _ = load_ml_arrays(Path(tmp))
+
+        with etape('hgbr_fit'):
+            #mêmes réglages que prediction.train_model_principal
+            model = HistGradientBoostingRegressor(
+                max_iter=max_iter, learning_rate=0.05, max_leaf_nodes=63, max_depth=None,
+                min_samples_leaf=20, l2_regularization=0.5, early_stopping=True, random_state=42
+            ).fit(X_train, y_train)
+
+        with etape('logistic_fit'):
+            LogisticRegression(max_iter=1000, random_state=42).fit(X_train, (y_train > np.median(y_train)).astype(int))
+
+        with etape('permutation_importance'):
+            compute_importance(model, X_test, y_test, feature_cols, n_jobs=threads, use_cache=False)
+
+    suivi.stop()
+    return {
+        'echelle': echelle, 'threads': threads, 'n_features_extra': n_features_extra,
+        'n_lignes': n, 'n_features': len(feature_cols), 'max_iter': max_iter,
+        'n_iter_hgbr': int(model.n_iter_), 'etapes': resultats,
+    }
+
+
+def compare(rapport, reference):
+    """Liste des (configuration, étape, mesure, ratio) qui dépassent SEUIL_REGRESSION"""
+    cle = lambda r: (r['echelle'], r['threads'], r['n_features_extra'], r['max_iter'])
+    ref = {cle(r): r for r in reference['resultats']}
+    regressions = []
+    for r in rapport['resultats']:
+        base = ref.get(cle(r))
+        if base is None:
+            continue
+        for nom, mesure in r['etapes'].items():
+            avant = base['etapes'].get(nom)
+            if not avant:
+                continue
+            for champ in ['secondes', 'pic_rss_mo']:
+                #on ignore les étapes trop courtes pour être mesurées proprement
+                if champ == 'secondes' and avant[champ] < 0.05:
+                    continue
+                ratio = mesure[champ] / avant[champ] if avant[champ] else float('inf')
+                if ratio > SEUIL_REGRESSION:
+                    regressions.append((cle(r), nom, champ, ratio))
+    return regressions
+
+
+def to_markdown(rapport, regressions):
+    lignes = [f"# Benchmark pipeline ML - {rapport['date']}", "",
+              f"Machine : {rapport['machine']['cpu']} CPU, Python {rapport['machine']['python']}", ""]
+    for r in rapport['resultats']:
+        lignes += [f"## {r['n_lignes']:,} lignes ({r['echelle']}x) - {r['threads']} thread(s) - "
+                   f"{r['n_features']} features - HGBR {r['n_iter_hgbr']}/{r['max_iter']} itérations", "",
+                   "| Étape | Temps (s) | Pic RSS (Mo) |", "|---|---:|---:|"]
+        for nom in ETAPES:
+            m = r['etapes'][nom]
+            lignes.append(f"| {nom} | {m['secondes']:.2f} | {m['pic_rss_mo']:.0f} |")
+        total = sum(m['secondes'] for m in r['etapes'].values())
+        lignes += [f"| **total** | **{total:.2f}** | |", ""]
+
+    if regressions:
+        lignes += ["## Régressions (> {:.0%} vs référence)".format(SEUIL_REGRESSION - 1), ""]
+        for conf, nom, champ, ratio in regressions:
+            lignes.append(f"- {conf} {nom} {champ} : x{ratio:.2f}")
+    return "\n".join(lignes) + "\n"
+
+
+def parse_liste(texte, type_):
+    return [type_(v) for v in texte.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline ML DVF")
+    parser.add_argument('--echelles', default='1,10,100', help="multiples de 191K lignes (ex: 0.1,1,10)")
+    parser.add_argument('--threads', default=str(os.cpu_count()), help="nombres de threads BLAS/OpenMP (ex: 1,4)")
+    parser.add_argument('--features-extra', default='0', help="features bruit ajoutées (ex: 0,20)")
+    parser.add_argument('--max-iter', type=int, default=1000, help="itérations max HGBR (1000 comme prediction.py)")
+    parser.add_argument('--reference', type=Path, help="rapport JSON précédent pour détecter les régressions")
+    parser.add_argument('--sortie', type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    configurations = [(e, t, f) for e in parse_liste(args.echelles, float)
+                      for t in parse_liste(args.threads, int)
+                      for f in parse_liste(args.features_extra, int)]
+
+    print("BENCHMARK PIPELINE ML")
+    resultats = []
+    #spawn : process neuf par configuration, pic RSS propre et pas de threads OpenMP hérités
+    contexte = multiprocessing.get_context('spawn')
+    for echelle, threads, extra in configurations:
+        print(f"\n{int(N_VENTES_REF * echelle):,} lignes | {threads} thread(s) | +{extra} features")
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexte) as executor:
+            resultats.append(executor.submit(run_configuration, echelle, threads, extra, args.max_iter).result())
+
+    rapport = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'cpu': os.cpu_count(), 'python': sys.version.split()[0]},
+        'resultats': resultats,
+    }
+
+    regressions = []
+    if args.reference:
+        with open(args.reference, 'r', encoding='utf-8') as f:
+            regressions = compare(rapport, json.load(f))
+    rapport['regressions'] = [list(map(str, r)) for r in regressions]
+
+    args.sortie.mkdir(parents=True, exist_ok=True)
+    nom = f"benchmark_{datetime.now():%Y%m%d_%H%M%S}"
+    with open(args.sortie / f"{nom}.json", 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    with open(args.sortie / f"{nom}.md", 'w', encoding='utf-8') as f:
+        f.write(to_markdown(rapport, regressions))
+    print(f"\nRapport : {args.sortie / nom}.json / .md")
+
+    if regressions:
+        print(f"{len(regressions)} régression(s) détectée(s) :")
+        for conf, nom_etape, champ, ratio in regressions:
+            print(f"  {conf} {nom_etape} {champ} x{ratio:.2f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
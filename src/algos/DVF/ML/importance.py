@@ -0,0 +1,137 @@
+"""
+    Importance des features par permutation (remplace sklearn.permutation_importance dans prediction.py)
+    - Échantillon stratifié par arrondissement (N_ECHANTILLON lignes du test au lieu de tout le test)
+    - Permutation groupée : les dummies arrond_* sont permutées ensemble (une seule feature "arrondissement")
+    - Permutations en parallèle (threads, HGBR.predict relâche le GIL)
+    - Cache sur disque indexé par le hash du modèle : rien n'est recalculé si le modèle n'a pas changé
+    - Importance par arrondissement (hausse de MAE en €/m²) exportée pour le dashboard
+"""
+
+import hashlib
+import pickle
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+from src.config import paths
+
+OUTPUT_DIR = paths.models.path
+CACHE_DIR = OUTPUT_DIR / 'importance_cache'
+EXPORT_ARRONDISSEMENTS = OUTPUT_DIR / 'importance_arrondissements.csv'
+
+N_ECHANTILLON = 20000  # None = tout le jeu de test
+N_REPEATS = 5
+
+
+def model_hash(model):
+    """
+    Empreinte du modèle entraîné (paramètres + arbres).
+    Pas de hash du pickle complet : ses octets changent d'un chargement à l'autre pour un même modèle.
+    """
+    h = hashlib.sha256(repr(sorted(model.get_params().items())).encode())
+    if hasattr(model, '_predictors'):
+        for iteration in model._predictors:
+            for predictor in iteration:
+                h.update(predictor.nodes.tobytes())
+        h.update(np.asarray(model._baseline_prediction).tobytes())
+    else:
+        h.update(pickle.dumps(model, protocol=4))
+    return h.hexdigest()[:16]
+
+
+def feature_groups(feature_names):
+    """arrond_* regroupées en 'arrondissement', les autres features seules"""
+    groups = {}
+    dummies = [f for f in feature_names if f.startswith('arrond_')]
+    if dummies:
+        groups['arrondissement'] = dummies
+    for f in feature_names:
+        if not f.startswith('arrond_'):
+            groups[f] = [f]
+    return groups
+
+
+def arrondissement_of(X):
+    """Arrondissement de chaque ligne depuis ses dummies (fonctionne aussi sur les features standardisées)"""
+    dummies = [c for c in X.columns if c.startswith('arrond_')]
+    codes = np.array([int(c.split('_')[1]) for c in dummies])
+    return codes[X[dummies].values.argmax(axis=1)]
+
+
+def stratified_sample(X, y, arrondissements, n_echantillon, seed=42):
+    if n_echantillon is None or n_echantillon >= len(X):
+        return X, y, arrondissements
+    X_s, _, y_s, _, arr_s, _ = train_test_split(
+        X, y, arrondissements, train_size=n_echantillon, stratify=arrondissements, random_state=seed
+    )
+    return X_s, y_s, arr_s
+
+
+def _permuted_prediction(model, X, cols, seed):
+    """Prédiction avec le bloc de colonnes cols permuté d'un seul tenant"""
+    rng = np.random.default_rng(seed)
+    X_perm = X.copy()
+    X_perm[cols] = X[cols].values[rng.permutation(len(X))]
+    return model.predict(X_perm)
+
+
+def compute_importance(model, X, y, feature_names, n_echantillon=N_ECHANTILLON, n_repeats=N_REPEATS,
+                       n_jobs=-1, use_cache=True):
+    """
+    Renvoie un dict :
+        'globale' : DataFrame feature / importance (baisse de R²) / std, trié
+        'par_arrondissement' : DataFrame arrondissement x feature (hausse de MAE en €/m²)
+    """
+    y = np.asarray(y)
+    data_key = hashlib.sha256(np.ascontiguousarray(y).tobytes()).hexdigest()[:8]
+    key = f"{model_hash(model)}_{data_key}_{n_echantillon}_{n_repeats}"
+    cache_path = CACHE_DIR / f"{key}.pkl"
+
+    if use_cache and cache_path.exists():
+        print(f"Importance en cache (modèle {key.split('_')[0]})")
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+
+    arrondissements = arrondissement_of(X)
+    X_s, y_s, arr_s = stratified_sample(X, y, arrondissements, n_echantillon)
+    print(f"Permutation sur {len(X_s)} lignes (stratifiées par arrondissement), {n_repeats} répétitions")
+
+    base_pred = model.predict(X_s)
+    base_r2 = r2_score(y_s, base_pred)
+    base_err = np.abs(y_s - base_pred)
+
+    groups = feature_groups(feature_names)
+    jobs = [(name, r) for name in groups for r in range(n_repeats)]
+    preds = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(_permuted_prediction)(model, X_s, groups[name], 42 + r) for name, r in jobs
+    )
+
+    drops = {name: [] for name in groups}
+    hausse_mae = {name: np.zeros(len(X_s)) for name in groups}
+    for (name, _), pred in zip(jobs, preds):
+        drops[name].append(base_r2 - r2_score(y_s, pred))
+        hausse_mae[name] += (np.abs(y_s - pred) - base_err) / n_repeats
+
+    globale = pd.DataFrame({
+        'feature': list(groups),
+        'importance': [np.mean(drops[name]) for name in groups],
+        'std': [np.std(drops[name]) for name in groups],
+    }).sort_values('importance', ascending=False)
+
+    par_arrondissement = pd.DataFrame(hausse_mae).groupby(arr_s).mean()
+    par_arrondissement.index.name = 'arrondissement'
+
+    result = {'globale': globale, 'par_arrondissement': par_arrondissement, 'n_echantillon': len(X_s)}
+
+    if use_cache:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            pickle.dump(result, f)
+    return result
+
+
+def export_par_arrondissement(result):
+    """CSV lu par le dashboard (page Estimation)"""
+    result['par_arrondissement'].round(2).to_csv(EXPORT_ARRONDISSEMENTS, sep=';')
+    print(f"Importance par arrondissement: {EXPORT_ARRONDISSEMENTS}")
@@ -0,0 +1,303 @@
+"""
+    Réentraînement incrémental quand de nouveaux mois DVF arrivent
+    - Repère les ventes postérieures à la date_max de training_state.json
+    - Met à jour le StandardScaler (partial_fit sur les nouvelles ventes) ; les seuils des arbres existants
+      sont ré-exprimés dans la nouvelle échelle sur une copie des modèles
+    - Prolonge le boosting (HGBR principal + quantiles) par le warm start sklearn : max_iter relevé,
+      nouveau fit sur l'historique complet (anciennes + nouvelles ventes)
+    - Remplace la regression logistique par un SGDClassifier (log_loss) initialisé avec ses coefficients puis partial_fit
+    - Dérive : métriques avant/après sur le mois le plus récent, tenu à l'écart de la mise à jour
+
+    Le mois tenu à l'écart n'avance pas date_max : il sera appris au prochain passage.
+    Un réentraînement complet reste possible (preprocessing.py puis prediction.py).
+
+    python -m src.algos.DVF.ML.incremental
+    python -m src.algos.DVF.ML.incremental --verifier   # assertions sur données synthétiques
+"""
+
+import sys
+import copy
+import pickle
+import argparse
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import r2_score, mean_absolute_error, accuracy_score, roc_auc_score
+from sklearn.preprocessing import StandardScaler
+from src.dashboard.utils.quantile_trees import garder_bornes
+from src.algos.DVF.ML.preprocessing import (
+    INPUT_PATH, OUTPUT_DIR, feature_engineering, prepare_ml_data,
+    load_training_state, update_training_state
+)
+
+HOLDOUT_MOIS = 1
+N_ITER_SUPPLEMENTAIRES = 100
+TAILLE_LOT_SGD = 5000
+MIN_NOUVELLES_VENTES = 100
+#décalage relatif des seuils ré-exprimés, cf. rescale_trees
+MARGE_SEUIL = 1e-9
+
+
+def load_transactions():
+    """Toutes les ventes du fichier nettoyé (le warm start réapprend sur l'historique complet)"""
+    print(f"Chargement des ventes: {INPUT_PATH.name}")
+    df = pd.read_csv(INPUT_PATH, sep=';', low_memory=False)
+
+    cols = ['latitude', 'longitude', 'surface_m2_retenue', 'nombre_pieces_principales', 'prix_m2', 'annee']
+    for c in cols: df[c] = pd.to_numeric(df[c], errors='coerce')
+    df['date_mutation'] = pd.to_datetime(df['date_mutation'], errors='coerce')
+    print(f"OK - {len(df)} ventes\n")
+    return df
+
+
+def build_matrix(df, feature_names, pieces_mediane):
+    """Mêmes features que preprocessing.py, alignées sur les colonnes du modèle existant"""
+    df_fe = feature_engineering(df, pieces_mediane)
+    X, y, _ = prepare_ml_data(df_fe)
+    #un arrondissement absent des ventes n'a pas de dummy -> colonne à 0
+    X = X.reindex(columns=feature_names, fill_value=0).astype(float)
+    dates = df_fe.loc[X.index, 'date_mutation']
+    return X, y.values, dates
+
+
+def rescale_trees(model, old_scaler, new_scaler):
+    """
+    Copie de `model` dont les seuils sont exprimés dans la nouvelle échelle
+    (x = t * scale + mean, puis normalisation avec le nouveau scaler) ; `model` n'est pas modifié.
+    Transformation monotone : chaque vente suit le même chemin dans les arbres, les prédictions sont identiques.
+
+    MARGE_SEUIL : un seuil HGBR peut valoir exactement une valeur observée (percentile "midpoint" entre deux
+    valeurs égales) et cette vente va à gauche (x <= t). Après conversion, t et x sont recalculés par deux
+    chemins d'arrondi différents et x peut dépasser t de quelques ulp : la vente basculerait à droite.
+    Le seuil est donc relevé de 1e-9 en relatif, bien au-dessus de l'erreur d'arrondi (~1e-15) et bien
+    en dessous de l'écart entre deux valeurs distinctes d'une feature (cf. verify()).
+    """
+    model = copy.deepcopy(model)
+    for iteration in model._predictors:
+        for predictor in iteration:
+            nodes = predictor.nodes
+            split = nodes['is_leaf'] == 0
+            feat = nodes['feature_idx'][split]
+            brut = nodes['num_threshold'][split] * old_scaler.scale_[feat] + old_scaler.mean_[feat]
+            seuil = (brut - new_scaler.mean_[feat]) / new_scaler.scale_[feat]
+            nodes['num_threshold'][split] = seuil + MARGE_SEUIL * np.maximum(1.0, np.abs(seuil))
+    return model
+
+
+def rescale_linear(coef, intercept, old_scaler, new_scaler):
+    """Même conversion pour un modèle linéaire (w.z + b)"""
+    ratio = new_scaler.scale_ / old_scaler.scale_
+    shift = (new_scaler.mean_ - old_scaler.mean_) / old_scaler.scale_
+    new_coef = coef * ratio
+    new_intercept = intercept + (coef * shift).sum(axis=1)
+    return new_coef, new_intercept
+
+
+def continue_boosting(model, X, y):
+    """
+    Warm start sklearn : max_iter relevé de N_ITER_SUPPLEMENTAIRES puis fit sur l'historique complet.
+    Les arbres existants sont gardés, les nouveaux suivent le gradient de la perte du modèle
+    (moyenne, ou pinball pour les quantiles) sur toutes les ventes.
+    Early stopping coupé : l'historique de validation du premier fit vient d'un autre découpage,
+    le contrôle se fait sur la tranche tenue à l'écart (report_drift).
+
+    Approximation (propre au warm start sklearn) : les bins sont recalculés sur les données du nouveau fit
+    et les anciens arbres y sont évalués par numéro de bin ; les gradients des nouveaux arbres peuvent donc
+    s'écarter un peu de ceux du modèle réel. La prédiction utilise les seuils réels et n'est pas affectée.
+    """
+    model.set_params(warm_start=True, early_stopping=False, max_iter=model.n_iter_ + N_ITER_SUPPLEMENTAIRES)
+    model.fit(X, y)
+    return model.set_params(warm_start=False)
+
+
+def update_classifier(clf, X, y, seuil, old_scaler, new_scaler):
+    """
+    LogisticRegression n'a pas de partial_fit : on la remplace par un SGDClassifier (log_loss)
+    initialisé avec ses coefficients, puis mis à jour par lots.
+    """
+    coef, intercept = rescale_linear(clf.coef_, clf.intercept_, old_scaler, new_scaler)
+    y_binary = (y > seuil).astype(int)
+    lots = [slice(i, i + TAILLE_LOT_SGD) for i in range(0, len(X), TAILLE_LOT_SGD)]
+
+    if isinstance(clf, SGDClassifier):
+        clf.coef_, clf.intercept_ = coef, intercept
+    else:
+        print("Remplacement LogisticRegression -> SGDClassifier(log_loss)")
+        clf = SGDClassifier(loss='log_loss', alpha=1e-5, learning_rate='constant', eta0=1e-3,
+                            max_iter=1, tol=None, random_state=42)
+        with warnings.catch_warnings():
+            #une seule passe voulue, pas de convergence attendue
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            clf.fit(X.iloc[lots[0]], y_binary[lots[0]], coef_init=coef, intercept_init=intercept)
+        lots = lots[1:]
+
+    for lot in lots:
+        clf.partial_fit(X.iloc[lot], y_binary[lot], classes=[0, 1])
+    return clf
+
+
+def evaluate(model, clf, scaler, X, y, seuil, feature_names):
+    X_scaled = pd.DataFrame(scaler.transform(X), columns=feature_names)
+    y_pred = model.predict(X_scaled)
+    y_binary = (y > seuil).astype(int)
+    metrics = {
+        'r2': r2_score(y, y_pred),
+        'mae': mean_absolute_error(y, y_pred),
+        'accuracy': accuracy_score(y_binary, clf.predict(X_scaled)),
+    }
+    #roc indéfini si le mois tenu à l'écart ne contient qu'une classe
+    metrics['roc_auc'] = roc_auc_score(y_binary, clf.predict_proba(X_scaled)[:, 1]) \
+        if len(np.unique(y_binary)) == 2 else float('nan')
+    return {k: float(v) for k, v in metrics.items()}
+
+
+def report_drift(reference, avant, apres, periode, n_train, n_holdout):
+    """Affiche et archive la dérive des métriques sur la tranche récente"""
+    lignes = [
+        f"MISE A JOUR INCREMENTALE DU {datetime.now():%Y-%m-%d %H:%M}",
+        f"Ventes apprises: {n_train} | Tranche de contrôle ({periode}): {n_holdout} ventes",
+        f"{'':<10}{'référence':>12}{'avant':>12}{'après':>12}",
+    ]
+    for key in ['r2', 'mae', 'accuracy', 'roc_auc']:
+        ref = reference.get(key, float('nan'))
+        lignes.append(f"{key:<10}{ref:>12.4f}{avant[key]:>12.4f}{apres[key]:>12.4f}")
+
+    texte = "\n".join(lignes) + "\n\n"
+    print("\n" + texte)
+    with open(OUTPUT_DIR / 'resultats_incremental.txt', 'a', encoding='utf-8') as f:
+        f.write(texte)
+
+
+def verify():
+    """Assertions sur données synthétiques : conversion des seuils exacte, warm start sans toucher aux anciens arbres"""
+    rng = np.random.default_rng(0)
+    n = 20000
+    #surfaces entières sur plus de 255 valeurs : seuils en percentiles, égaux à des valeurs observées
+    #(sans MARGE_SEUIL, la conversion change des prédictions) ; coordonnées continues
+    X = np.column_stack([rng.integers(15, 400, n), rng.normal(48.86, 0.02, n), rng.integers(1, 6, n)]).astype(float)
+    y = 10000 + 2e5 * (X[:, 1] - 48.86) - 10 * X[:, 0] + 300 * X[:, 2] + rng.normal(0, 800, n)
+    anciennes, nouvelles = slice(0, 15000), slice(15000, n)
+    X[nouvelles, 0] += 5  #les nouvelles ventes décalent moyenne et variance
+    erreurs = []
+
+    old_scaler = StandardScaler().fit(X[anciennes])
+    new_scaler = copy.deepcopy(old_scaler).partial_fit(X[nouvelles])
+    reglages = dict(max_iter=50, learning_rate=0.1, random_state=42)
+    modeles = [HistGradientBoostingRegressor(**reglages)] + \
+              [HistGradientBoostingRegressor(loss='quantile', quantile=q, **reglages) for q in (0.1, 0.9)]
+    for model in modeles:
+        model.fit(old_scaler.transform(X[anciennes]), y[anciennes])
+        seuils = [p.nodes['num_threshold'].copy() for it in model._predictors for p in it]
+        avant = model.predict(old_scaler.transform(X))
+
+        converti = rescale_trees(model, old_scaler, new_scaler)
+        if not all(np.array_equal(a, p.nodes['num_threshold']) for a, p in zip(seuils, (p for it in model._predictors for p in it))):
+            erreurs.append("rescale_trees a modifié le modèle d'origine")
+        if not np.array_equal(converti.predict(new_scaler.transform(X)), avant):
+            erreurs.append(f"{model.loss}: prédictions changées par la conversion des seuils")
+
+        n_iter = converti.n_iter_
+        continue_boosting(converti, new_scaler.transform(X), y)
+        if converti.n_iter_ != n_iter + N_ITER_SUPPLEMENTAIRES:
+            erreurs.append(f"{model.loss}: {converti.n_iter_} itérations au lieu de {n_iter + N_ITER_SUPPLEMENTAIRES}")
+        #les anciens arbres sont intacts : la prédiction à l'itération n_iter est celle d'avant la mise à jour
+        etape = next(p for i, p in enumerate(converti.staged_predict(new_scaler.transform(X)), 1) if i == n_iter)
+        if not np.array_equal(etape, avant):
+            erreurs.append(f"{model.loss}: anciens arbres modifiés par le warm start")
+        if model.loss == 'quantile':
+            couverture = np.mean(y[nouvelles] <= converti.predict(new_scaler.transform(X[nouvelles])))
+            if abs(couverture - model.quantile) > 0.03:
+                erreurs.append(f"quantile {model.quantile}: couverture {couverture:.3f} sur les nouvelles ventes")
+
+    for erreur in erreurs:
+        print(f"ECHEC: {erreur}")
+    print("OK" if not erreurs else f"{len(erreurs)} échec(s)")
+    return not erreurs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réentraînement incrémental sur les nouveaux mois DVF")
+    parser.add_argument('--verifier', action='store_true', help="assertions sur données synthétiques, sans toucher aux modèles")
+    args = parser.parse_args()
+    if args.verifier:
+        sys.exit(0 if verify() else 1)
+
+    print("REENTRAINEMENT INCREMENTAL DVFGeo")
+
+    state = load_training_state()
+    if 'date_max' not in state or 'seuil_classification' not in state:
+        print("ERREUR: training_state.json incomplet, lancer preprocessing.py puis prediction.py d'abord.")
+        sys.exit(1)
+
+    with open(OUTPUT_DIR / 'feature_names.pkl', 'rb') as f: feature_names = pickle.load(f)
+    X, y, dates = build_matrix(load_transactions(), feature_names, state.get('nb_pieces_mediane'))
+    nouvelles = (dates > pd.Timestamp(state['date_max'])).values
+    if nouvelles.sum() < MIN_NOUVELLES_VENTES:
+        print(f"Moins de {MIN_NOUVELLES_VENTES} nouvelles ventes, rien à faire.")
+        return
+
+    #tranche de contrôle = dernier(s) mois, jamais vue pendant la mise à jour
+    limite = dates[nouvelles].max() - pd.DateOffset(months=HOLDOUT_MOIS)
+    mask_holdout = nouvelles & (dates > limite).values
+    apprises = nouvelles & ~mask_holdout
+    if apprises.sum() < MIN_NOUVELLES_VENTES:
+        print("Pas assez de ventes hors tranche de contrôle, on attend le mois suivant.")
+        return
+    X_hold, y_hold = X[mask_holdout], y[mask_holdout]
+
+    with open(OUTPUT_DIR / 'scaler.pkl', 'rb') as f: old_scaler = pickle.load(f)
+    with open(OUTPUT_DIR / 'model_linear_regression.pkl', 'rb') as f: model = pickle.load(f)
+    with open(OUTPUT_DIR / 'model_logistic_regression.pkl', 'rb') as f: clf = pickle.load(f)
+    quantiles_path = OUTPUT_DIR / 'model_quantiles.pkl'
+    bundle = None
+    if quantiles_path.exists():
+        with open(quantiles_path, 'rb') as f: bundle = pickle.load(f)
+        models, quantiles = garder_bornes(bundle['models'], bundle['quantiles'])
+        bundle = {'quantiles': quantiles, 'models': models}
+    seuil = state['seuil_classification']
+
+    avant = evaluate(model, clf, old_scaler, X_hold, y_hold, seuil, feature_names)
+
+    #scaler : moyenne/variance mises à jour avec les seules nouvelles ventes
+    print("Mise à jour du scaler (partial_fit)...")
+    new_scaler = copy.deepcopy(old_scaler).partial_fit(X[apprises])
+    #historique complet hors tranche de contrôle, pour le warm start des arbres
+    X_hist = pd.DataFrame(new_scaler.transform(X[~mask_holdout]), columns=feature_names)
+    y_hist = y[~mask_holdout]
+
+    print(f"Boosting: +{N_ITER_SUPPLEMENTAIRES} itérations sur {len(X_hist)} ventes...")
+    model = continue_boosting(rescale_trees(model, old_scaler, new_scaler), X_hist, y_hist)
+
+    if bundle is not None:
+        print("Modèles quantiles: +{} itérations...".format(N_ITER_SUPPLEMENTAIRES))
+        bundle['models'] = [continue_boosting(rescale_trees(m, old_scaler, new_scaler), X_hist, y_hist)
+                            for m in bundle['models']]
+
+    print("Classification: partial_fit...")
+    X_new = pd.DataFrame(new_scaler.transform(X[apprises]), columns=feature_names)
+    clf = update_classifier(clf, X_new, y[apprises], seuil, old_scaler, new_scaler)
+
+    apres = evaluate(model, clf, new_scaler, X_hold, y_hold, seuil, feature_names)
+    periode = f"{limite:%Y-%m-%d} -> {dates.max():%Y-%m-%d}"
+    report_drift(state.get('reference', {}), avant, apres, periode, int(apprises.sum()), len(X_hold))
+
+    #sauvegardes (mêmes noms de fichiers que prediction.py pour le dashboard et l'API)
+    with open(OUTPUT_DIR / 'scaler.pkl', 'wb') as f: pickle.dump(new_scaler, f)
+    with open(OUTPUT_DIR / 'model_linear_regression.pkl', 'wb') as f: pickle.dump(model, f)
+    with open(OUTPUT_DIR / 'model_logistic_regression.pkl', 'wb') as f: pickle.dump(clf, f)
+    if bundle is not None:
+        with open(quantiles_path, 'wb') as f: pickle.dump(bundle, f)
+
+    update_training_state(
+        date_max=dates[apprises].max().strftime('%Y-%m-%d'),
+        derniere_derive={'periode': periode, 'avant': avant, 'apres': apres}
+    )
+    print("fini")
+
+
+if __name__ == "__main__":
+    main()
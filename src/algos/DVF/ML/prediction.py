@@ -1,48 +1,43 @@
 """
     Entrainement modeles ML pour prediction prix immobiliers (VERSION OPTIMISÉE)
     - Modele Principal : Histogram Gradient Boosting (remplace la Reg Linéaire/Random Forest)
+    - Intervalles : 2 HGBR quantiles (bas / haut) entraines en parallele
     - Classification : Regression Logistique (Classification cher/bon marche)
     - Evaluation et visualisations
 """
 
-import pandas as pd
 import numpy as np
 import pickle
 import matplotlib.pyplot as plt
 import seaborn as sns
+from joblib import Parallel, delayed
 from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.linear_model import LogisticRegression
-from sklearn.inspection import permutation_importance
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, confusion_matrix
 from src.config import paths
+from src.algos.DVF.ML.preprocessing import update_training_state, load_ml_arrays
+from src.algos.DVF.ML.importance import compute_importance, export_par_arrondissement
 
 ML_DIR = paths.models.path
 OUTPUT_DIR = paths.models.path
 
+#bornes de l'intervalle de prix renvoye par l'API (80% des ventes attendues dedans) ;
+#pas de quantile median : le prix estime vient du modele principal
+QUANTILES = (0.1, 0.9)
+
 
 def load_data():
-    """Charge les données préparées par preprocessing.py"""
+    """Charge les matrices préparées par preprocessing.py (memory-map float32)"""
     print("Chargement donnees ML...")
 
     try:
-        X_train = pd.read_csv(ML_DIR / 'ml_train.csv', sep=';')
-        X_test = pd.read_csv(ML_DIR / 'ml_test.csv', sep=';')
+        X_train, X_test, y_train, y_test, feature_names = load_ml_arrays(ML_DIR)
     except FileNotFoundError:
-        print("ERREUR: Fichiers ml_train.csv ou ml_test.csv introuvables.")
+        print("ERREUR: Fichiers ml_X.npy / ml_y.npy / ml_schema.json introuvables.")
         print("Veuillez lancer preprocessing.py d'abord.")
         exit(1)
 
-    y_train = X_train['prix_m2'].values
-    y_test = X_test['prix_m2'].values
-
-    # Suppression de la cible dans les features
-    X_train = X_train.drop('prix_m2', axis=1)
-    X_test = X_test.drop('prix_m2', axis=1)
-
-    # Récupération des noms de colonnes pour l'interprétabilité
-    feature_names = X_train.columns.tolist()
-
     print("OK - {} samples train, {} samples test".format(len(X_train), len(X_test)))
     print(f"Features ({len(feature_names)}): {feature_names}\n")
 
@@ -91,16 +86,12 @@ def train_model_principal(X_train, X_test, y_train, y_test, feature_names):
     print(f"Test RMSE: {rmse_test:.2f}€/m²")
 
     # HGBR n'a pas de .feature_importances_ direct fiable, on utilise la permutation
+    # (échantillon stratifié, dummies arrond_* groupées, mis en cache par hash du modèle)
     print("\nCalcul de l'importance des features (Permutation)...")
-    result = permutation_importance(
-        model, X_test, y_test, n_repeats=5, random_state=42, n_jobs=-1
-    )
+    result = compute_importance(model, X_test, y_test, feature_names)
+    export_par_arrondissement(result)
 
-    importances = pd.DataFrame({
-        'feature': feature_names,
-        'importance': result.importances_mean,
-        'std': result.importances_std
-    }).sort_values('importance', ascending=False).head(15)
+    importances = result['globale'].head(15)
 
     #creer le texte pour l export txt
     importance_text = "\nTOP 15 FEATURES IMPORTATNTES :\n"
@@ -143,6 +134,50 @@ def train_model_principal(X_train, X_test, y_train, y_test, feature_names):
     return model, r2_test, mae_test, importance_text
 
 
+def _fit_quantile(alpha, X_train, y_train):
+    """Un HGBR avec perte pinball pour un quantile donné (mêmes réglages que le modèle principal)"""
+    model = HistGradientBoostingRegressor(
+        loss='quantile',
+        quantile=alpha,
+        max_iter=1000,
+        learning_rate=0.05,
+        max_leaf_nodes=63,
+        min_samples_leaf=20,
+        l2_regularization=0.5,
+        early_stopping=True,
+        random_state=42,
+        verbose=0
+    )
+    return model.fit(X_train, y_train)
+
+
+def train_quantile_models(X_train, X_test, y_train, y_test):
+    """
+    Entraîne les modèles quantiles en parallèle et les sauvegarde ensemble.
+    Le dashboard/API les évalue en une seule passe (cf. utils/quantile_trees.py).
+    """
+    print("\nMODELES QUANTILES - Intervalle de prix " + " / ".join(f"q{int(q * 100)}" for q in QUANTILES))
+
+    #threads : HGBR relâche le GIL pendant le fit, pas besoin de dupliquer les données dans des process
+    models = Parallel(n_jobs=len(QUANTILES), prefer="threads")(
+        delayed(_fit_quantile)(alpha, X_train, y_train) for alpha in QUANTILES
+    )
+
+    preds = np.sort(np.column_stack([m.predict(X_test) for m in models]), axis=1)
+    couverture = np.mean((y_test >= preds[:, 0]) & (y_test <= preds[:, -1]))
+    largeur = np.median(preds[:, -1] - preds[:, 0])
+
+    print(f"Couverture test [{QUANTILES[0]:.0%} - {QUANTILES[-1]:.0%}]: {couverture:.4f} "
+          f"(attendu {QUANTILES[-1] - QUANTILES[0]:.2f})")
+    print(f"Largeur médiane de l'intervalle: {largeur:.0f}€/m²")
+
+    with open(OUTPUT_DIR / 'model_quantiles.pkl', 'wb') as f:
+        pickle.dump({'quantiles': list(QUANTILES), 'models': models}, f)
+        print("Modèles quantiles sauvegardés sous 'model_quantiles.pkl'")
+
+    return models, couverture, largeur
+
+
 def logistic_regression(X_train, X_test, y_train, y_test, feature_names):
     """Regression logistique pour classification cher/bon marche"""
     print("\nREGRESSION LOGISTIQUE - Classification Cher/Bon marche")
@@ -198,10 +233,10 @@ def logistic_regression(X_train, X_test, y_train, y_test, feature_names):
     with open(OUTPUT_DIR / 'model_logistic_regression.pkl', 'wb') as f:
         pickle.dump(model, f)
 
-    return model, acc_test, roc_auc
+    return model, acc_test, roc_auc, seuil
 
 
-def export_results(r2, mae, acc, roc_auc, importance_text=""):
+def export_results(r2, mae, acc, roc_auc, importance_text="", couverture=None, largeur=None):
     """Exporte résumé résultats"""
     print("\nEXPORT RESULTATS")
 
@@ -216,6 +251,11 @@ def export_results(r2, mae, acc, roc_auc, importance_text=""):
         f.write(importance_text)
         f.write("\n")
 
+        if couverture is not None:
+            f.write("INTERVALLES (HGBR quantiles {})\n".format(", ".join(str(q) for q in QUANTILES)))
+            f.write(f"Couverture Test: {couverture:.4f}\n")
+            f.write(f"Largeur médiane: {largeur:.0f}€/m²\n\n")
+
         f.write("CLASSIFICATION (LogisticRegression)\n")
         f.write(f"Accuracy Test: {acc:.4f}\n")
         f.write(f"ROC-AUC: {roc_auc:.4f}\n")
@@ -230,11 +270,18 @@ def main():
 
     model_boost, r2_val, mae_val, importance_text = train_model_principal(X_train, X_test, y_train, y_test, feature_names)
 
-    model_log, acc_val, roc_val = logistic_regression(
+    _, couverture, largeur = train_quantile_models(X_train, X_test, y_train, y_test)
+
+    model_log, acc_val, roc_val, seuil = logistic_regression(
         X_train, X_test, y_train, y_test, feature_names
     )
 
-    export_results(r2_val, mae_val, acc_val, roc_val, importance_text)
+    export_results(r2_val, mae_val, acc_val, roc_val, importance_text, couverture, largeur)
+    #état lu par incremental.py, écrit une fois l'entraînement complet terminé :
+    #même seuil pour que la classe reste comparable, métriques de référence pour le suivi de dérive
+    update_training_state(seuil_classification=float(seuil),
+                          reference={'r2': float(r2_val), 'mae': float(mae_val),
+                                     'accuracy': float(acc_val), 'roc_auc': float(roc_val)})
 
     print("\nfini d attendre")
 
@@ -3,10 +3,33 @@ import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import pickle
+import json
 from src.config import paths
 
 INPUT_PATH = paths.data.DVF.geocodes.cleaned/"dvf_paris_2020-2025-exploitables-clean.csv"
 OUTPUT_DIR = paths.models.path
+#etat partagé entre preprocessing / prediction / incremental (derniere date vue, seuil, métriques)
+STATE_PATH = OUTPUT_DIR / 'training_state.json'
+#matrices d'entraînement : float32 contigu, relu en memory-map par prediction.py
+ML_X = 'ml_X.npy'
+ML_Y = 'ml_y.npy'
+ML_SCHEMA = 'ml_schema.json'
+
+
+def load_training_state():
+    if not STATE_PATH.exists():
+        return {}
+    with open(STATE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def update_training_state(**values):
+    """Met à jour quelques clés de training_state.json sans écraser les autres"""
+    state = load_training_state()
+    state.update(values)
+    with open(STATE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    return state
 
 def load_data(filepath):
     print(f"Chargement: {filepath.name}")
@@ -48,15 +71,59 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
 
-def feature_engineering(df):
+def save_ml_arrays(X_train_scaled, X_test_scaled, y_train, y_test, feature_cols, output_dir=OUTPUT_DIR):
+    """
+    Écrit train puis test dans une seule matrice float32 (écrite directement sur disque via open_memmap,
+    sans copie intermédiaire) + la cible, et un schéma JSON (features, bornes des splits).
+    """
+    n_train, n_test = len(X_train_scaled), len(X_test_scaled)
+    X = np.lib.format.open_memmap(output_dir / ML_X, mode='w+', dtype=np.float32,
+                                  shape=(n_train + n_test, len(feature_cols)))
+    X[:n_train] = X_train_scaled
+    X[n_train:] = X_test_scaled
+    X.flush()
+    del X
+
+    #cible gardée en float64 : petite, et les métriques restent exactes
+    np.save(output_dir / ML_Y, np.concatenate([np.asarray(y_train), np.asarray(y_test)]).astype(np.float64))
+
+    schema = {
+        'feature_names': list(feature_cols),
+        'dtype': 'float32',
+        'n_lignes': n_train + n_test,
+        'splits': {'train': [0, n_train], 'test': [n_train, n_train + n_test]},
+    }
+    with open(output_dir / ML_SCHEMA, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, indent=2)
+
+
+def load_ml_arrays(ml_dir=OUTPUT_DIR):
+    """Memory-map des matrices : pas de parsing, les pages sont lues à la demande"""
+    with open(ml_dir / ML_SCHEMA, 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+    X = np.load(ml_dir / ML_X, mmap_mode='r')
+    y = np.load(ml_dir / ML_Y, mmap_mode='r')
+    feature_names = schema['feature_names']
+
+    (a, b), (c, d) = schema['splits']['train'], schema['splits']['test']
+    #copy=False : les DataFrames restent des vues sur le memmap
+    X_train = pd.DataFrame(X[a:b], columns=feature_names, copy=False)
+    X_test = pd.DataFrame(X[c:d], columns=feature_names, copy=False)
+    return X_train, X_test, np.asarray(y[a:b]), np.asarray(y[c:d]), feature_names
+
+
+def feature_engineering(df, pieces_mediane=None):
     print("Feature engineering...")
     df_fe = df.copy()
     df_fe['log_surface_m2'] = np.log1p(df_fe['surface_m2_retenue'])
     df_fe['dist_center'] = haversine_distance(df_fe['latitude'], df_fe['longitude'], 48.853, 2.3499)
     df_fe['annee_norm'] = (df_fe['annee'] - 2020) / 5.0
 
-    df_fe['nb_pieces_fill'] = df_fe['nombre_pieces_principales'].fillna(df_fe['nombre_pieces_principales'].median())
+    if pieces_mediane is None:
+        pieces_mediane = df_fe['nombre_pieces_principales'].median()
+    df_fe['nb_pieces_fill'] = df_fe['nombre_pieces_principales'].fillna(pieces_mediane)
     #pour les pieces: on remplit les NaN avec la mediane (plutot que la moyenne) pour eviter les outliers
+    #en incrémental on réutilise la médiane du jeu initial pour ne pas décaler la feature
 
     arrond_dummies = pd.get_dummies(df_fe['code_arrondissement'], prefix='arrond')
     df_fe = pd.concat([df_fe, arrond_dummies], axis=1)
@@ -109,13 +176,18 @@ def main():
     X_test_scaled = scaler.transform(X_test)
 
     #exports
-    pd.DataFrame(X_train_scaled, columns=feature_cols).assign(prix_m2=y_train.values).to_csv(
-        OUTPUT_DIR / 'ml_train.csv', sep=';', index=False)
-    pd.DataFrame(X_test_scaled, columns=feature_cols).assign(prix_m2=y_test.values).to_csv(OUTPUT_DIR / 'ml_test.csv', sep=';', index=False)
+    save_ml_arrays(X_train_scaled, X_test_scaled, y_train, y_test, feature_cols)
 
     with open(OUTPUT_DIR / 'scaler.pkl', 'wb') as f: pickle.dump(scaler, f)
     with open(OUTPUT_DIR / 'feature_names.pkl', 'wb') as f: pickle.dump(feature_cols, f)
 
+    #point de départ du mode incrémental (incremental.py ne traitera que les ventes postérieures)
+    date_max = pd.to_datetime(df['date_mutation'], errors='coerce').max()
+    update_training_state(
+        date_max=date_max.strftime('%Y-%m-%d'),
+        nb_pieces_mediane=float(df['nombre_pieces_principales'].median())
+    )
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
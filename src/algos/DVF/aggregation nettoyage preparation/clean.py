@@ -3,6 +3,7 @@
     - Supprime colonnes vides
     - Filtre sur Paris
     - Ajoute prix_m2 et arrondissement
+    - Vérifie l'arrondissement de code_commune contre les coordonnées (arrondissements.geojson)
     - Filtre les aberrantes HAUTES ET BASSES
     - Exclut les ventes symboliques et prix irréalistes
 
@@ -16,6 +17,7 @@
 import sys
 import pandas as pd
 from src.config import paths
+from src.dashboard.utils.arrondissements import get_resolver
 
 
 INPUT_PATH = paths.data.DVF.geocodes.cleaned/"dvf_paris_2020-2025-exploitables.csv"
@@ -67,6 +69,31 @@ def load_and_prepare(filepath):
     return df
 
 
+def validate_arrondissements(df):
+    """
+    Compare code_commune à l'arrondissement des coordonnées (polygones arrondissements.geojson).
+    Ajoute code_arrondissement_geo (0 = hors Paris / sans coordonnées) ; les lignes ne sont pas modifiées.
+    """
+    resolver = get_resolver()
+    if resolver is None:
+        print("arrondissements.geojson absent, validation des arrondissements ignorée\n")
+        return df
+
+    print("Validation code_commune / coordonnées...")
+    df['code_arrondissement_geo'] = resolver.resolve_many(df['latitude'].values, df['longitude'].values)
+
+    geolocalisees = df['code_arrondissement_geo'] > 0
+    ecarts = geolocalisees & (df['code_arrondissement_geo'] != df['code_arrondissement'])
+    print(f"Coordonnées hors Paris ou absentes: {(~geolocalisees).sum()}")
+    print(f"Arrondissement incohérent avec code_commune: {ecarts.sum()} ({ecarts.mean() * 100:.2f}%)")
+    if ecarts.any():
+        paires = df[ecarts].groupby(['code_arrondissement', 'code_arrondissement_geo']).size()
+        print("Principaux écarts (code_commune -> coordonnées):")
+        print(paires.sort_values(ascending=False).head(10).to_string())
+    print()
+    return df
+
+
 def remove_empty_columns(df):
     """Supprime colonnes entièrement vides"""
     initial_cols = len(df.columns)
@@ -246,6 +273,7 @@ def main():
 
     print("NETTOYAGE old_dataset GÉOCODÉES - FILTRAGE COMPLET (HAUT + BAS)")
     df = load_and_prepare(INPUT_PATH)
+    df = validate_arrondissements(df)
     df = remove_empty_columns(df)
     #analyser distribution et trouver seuils
     seuil_bas, seuil_haut = analyze_distribution(df)
@@ -308,17 +308,17 @@ class AnnoncesCleaner:
         apres = len(df)
         print("  Lignes supprimées: {}".format(avant - apres))
 
-        # Sélectionner colonnes finales
+        # Sélectionner colonnes finales (texte de localisation d'origine gardé pour le géocodage)
         df_clean = df[[
             "source", "type", "prix_num", "surface_num",
-            "prix_m2_num", "nb_pieces_num", "localisation_clean", "details"
+            "prix_m2_num", "nb_pieces_num", "localisation_clean", "localisation", "details"
         ]].rename(columns={
             "prix_num": "prix",
             "surface_num": "surface",
             "prix_m2_num": "prix_m2",
             "nb_pieces_num": "nb_pieces",
-            "localisation_clean": "localisation"
-        })
+            "localisation": "localisation_brute",
+        }).rename(columns={"localisation_clean": "localisation"})
 
         print("Nettoyage terminé: {} lignes".format(len(df_clean)))
 
@@ -0,0 +1,191 @@
+"""
+    Géocodage en masse des annonces scrappées (après annonces_cleaner.py)
+
+    Les annonces n'ont qu'un code postal : on construit une requête par annonce à partir du texte
+    de localisation d'origine (quartier, rue) et des détails, puis :
+    1. Déduplication des requêtes (beaucoup d'annonces partagent la même adresse / le même quartier)
+    2. Résolution locale : index d'adresses DVF puis cache de géocodage (LRU + SQLite)
+    3. Le reste part vers la BAN par lots concurrents (pool borné de N_WORKERS requêtes en vol)
+    4. Coordonnées réécrites dans annonces_paris_final.csv (latitude, longitude, geo_*)
+
+    Reprise après interruption : les adresses résolues sont enregistrées dans le cache SQLite à la fin de chaque lot,
+    un nouveau lancement ne renvoie à la BAN que ce qui manque. Les annonces déjà géocodées sont ignorées.
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+import pandas as pd
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", "..", "..", ".."))
+BASE_DIR = os.path.join(PROJECT_ROOT, "data", "scrapped")
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.config import paths
+from src.dashboard.utils.geocoder_offline import OfflineGeocoder, INDEX_FILENAME
+from src.dashboard.utils.geocode_cache import GeocodeCache, normalize_address
+from src.dashboard.utils.ban_client import AsyncBanClient, BanUnavailable
+
+ANNONCES_PATH = os.path.join(BASE_DIR, "annonces_paris_final.csv")
+
+N_WORKERS = 8  # requêtes BAN simultanées (limite publique : 50 req/s par IP)
+TAILLE_LOT = 200  # adresses par lot, progression affichée entre deux lots
+
+GEO_COLUMNS = ["latitude", "longitude", "geo_label", "geo_source", "geo_precision"]
+
+#voies citées dans les détails : "rue de la Roquette", "bd Voltaire", "12 avenue Foch"...
+RE_VOIE = re.compile(
+    r"\b(?:\d{1,4}\s*(?:bis|ter)?,?\s+)?"
+    r"(?:rue|avenue|av\.?|boulevard|bd|place|quai|impasse|all[ée]e|square|passage|villa|cit[ée]|cours|faubourg)"
+    r"\s+(?:[\w'’-]+\s+){0,4}?[\w'’-]{3,}",
+    flags=re.IGNORECASE
+)
+RE_ARRONDISSEMENT = re.compile(r"^\s*\d{1,2}\s*(?:er|ème|eme|e)?\s*(?:\(75\))?\s*-?\s*", flags=re.IGNORECASE)
+
+
+def build_query(localisation, localisation_brute, details):
+    """Texte envoyé au géocodeur : voie citée, sinon quartier, puis le code postal"""
+    cp = "" if pd.isna(localisation) else str(localisation)
+    voie = RE_VOIE.search(str(details)) if pd.notna(details) else None
+    if voie:
+        return f"{voie.group().strip()} {cp} Paris".strip()
+
+    #"11- philippe-auguste" -> "philippe auguste" ; "16ème (75)" -> rien
+    quartier = RE_ARRONDISSEMENT.sub("", str(localisation_brute)) if pd.notna(localisation_brute) else ""
+    quartier = quartier.replace("-", " ").strip()
+    if re.search(r"[a-zA-Z]{3,}", quartier):
+        return f"{quartier} {cp} Paris".strip()
+    return f"{cp} Paris".strip()
+
+
+def resolve_local(queries, offline_geocoder, cache):
+    """Index DVF puis cache ; renvoie (résolues, restantes)"""
+    resolues, restantes = {}, []
+    for q in queries:
+        geo = offline_geocoder.geocode(q) if offline_geocoder is not None else None
+        if geo:
+            resolues[q] = geo
+            continue
+        trouve, geo, _ = cache.get(q)
+        if trouve:
+            resolues[q] = geo
+        else:
+            restantes.append(q)
+    return resolues, restantes
+
+
+async def geocode_remote(queries, client, cache, n_workers=N_WORKERS, taille_lot=TAILLE_LOT):
+    """
+    Lots de taille_lot adresses, au plus n_workers requêtes en vol.
+    Les résultats d'un lot sont mis en cache en une transaction, dans un thread pour ne pas bloquer
+    la boucle pendant l'écriture SQLite (point de reprise) ; arrêt propre si la BAN tombe.
+    """
+    semaphore = asyncio.Semaphore(n_workers)
+    resolues = {}
+
+    async def one(q):
+        async with semaphore:
+            debut = time.perf_counter()
+            try:
+                geo = await client.search(q)
+            except BanUnavailable:
+                return q, False, None, 0.0
+            return q, True, geo, (time.perf_counter() - debut) * 1000
+
+    try:
+        for i in range(0, len(queries), taille_lot):
+            lot = queries[i:i + taille_lot]
+            debut = time.perf_counter()
+            results = await asyncio.gather(*(one(q) for q in lot))
+            a_garder = [(q, geo, duree) for q, ok, geo, duree in results if ok]
+            await asyncio.to_thread(cache.put_many, a_garder)
+            resolues.update((q, geo) for q, geo, _ in a_garder)
+            echecs = len(lot) - len(a_garder)
+            print("  Lot {}/{}: {} adresses en {:.1f}s ({} échecs)".format(
+                i // taille_lot + 1, -(-len(queries) // taille_lot), len(lot), time.perf_counter() - debut, echecs))
+            if client.breaker.etat != 'ferme':
+                print("  BAN indisponible (disjoncteur ouvert), arrêt : relancer le script pour reprendre.")
+                break
+    finally:
+        await client.aclose()
+    return resolues
+
+
+def write_back(df, path):
+    """Écriture atomique : un arrêt pendant l'export ne corrompt pas le fichier"""
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, sep=";", index=False, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def main():
+    print("GEOCODAGE DES ANNONCES")
+    if not os.path.isfile(ANNONCES_PATH):
+        print("Fichier introuvable: {} (lancer annonces_cleaner.py d'abord)".format(ANNONCES_PATH))
+        sys.exit(1)
+
+    df = pd.read_csv(ANNONCES_PATH, sep=";", dtype=str)
+    for col in GEO_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    if "localisation_brute" not in df.columns:
+        df["localisation_brute"] = None
+    print("Annonces: {}".format(len(df)))
+
+    a_faire = df["latitude"].isna()
+    print("Déjà géocodées: {}".format((~a_faire).sum()))
+    if not a_faire.any():
+        print("Rien à faire.")
+        return
+
+    df.loc[a_faire, "geo_requete"] = [
+        build_query(loc, brute, det) for loc, brute, det in
+        zip(df.loc[a_faire, "localisation"], df.loc[a_faire, "localisation_brute"], df.loc[a_faire, "details"])
+    ]
+    #déduplication sur la forme normalisée (casse, accents, ponctuation)
+    df.loc[a_faire, "geo_cle"] = df.loc[a_faire, "geo_requete"].map(normalize_address)
+    uniques = df.loc[a_faire].drop_duplicates("geo_cle")
+    requetes = dict(zip(uniques["geo_cle"], uniques["geo_requete"]))
+    print("Adresses distinctes: {} (pour {} annonces)".format(len(requetes), a_faire.sum()))
+
+    offline_geocoder = None
+    index_path = paths.models.path / INDEX_FILENAME
+    if index_path.exists():
+        offline_geocoder = OfflineGeocoder.load(index_path)
+    cache = GeocodeCache()
+
+    resolues, restantes = resolve_local(list(requetes.values()), offline_geocoder, cache)
+    print("Résolues sans réseau (index DVF / cache): {}".format(len(resolues)))
+
+    try:
+        if restantes:
+            print("\nEnvoi à la BAN: {} adresses, {} requêtes simultanées".format(len(restantes), N_WORKERS))
+            resolues.update(asyncio.run(geocode_remote(restantes, AsyncBanClient(), cache)))
+    except KeyboardInterrupt:
+        print("\nInterrompu : les adresses déjà résolues sont enregistrées.")
+    finally:
+        #report sur les annonces (geo None = introuvable : l'annonce reste sans coordonnées)
+        par_cle = {normalize_address(q): geo for q, geo in resolues.items() if geo}
+        geos = df["geo_cle"].map(par_cle)
+        trouvees = geos.notna() & a_faire
+        df.loc[trouvees, "latitude"] = geos[trouvees].map(lambda g: g["latitude"])
+        df.loc[trouvees, "longitude"] = geos[trouvees].map(lambda g: g["longitude"])
+        df.loc[trouvees, "geo_label"] = geos[trouvees].map(lambda g: g.get("label"))
+        df.loc[trouvees, "geo_source"] = geos[trouvees].map(lambda g: g.get("source"))
+        df.loc[trouvees, "geo_precision"] = geos[trouvees].map(lambda g: g.get("precision"))
+
+        write_back(df.drop(columns=["geo_requete", "geo_cle"]), ANNONCES_PATH)
+        print("\nGéocodées: {} / {} annonces".format(df["latitude"].notna().sum(), len(df)))
+        print("Répartition par précision:")
+        print(df["geo_precision"].value_counts(dropna=False))
+        print("Fichier mis à jour: {}".format(ANNONCES_PATH))
+
+
+if __name__ == "__main__":
+    main()
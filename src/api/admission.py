@@ -0,0 +1,144 @@
+"""
+Contrôle d'admission de /predict (et de chaque bloc de /predict/csv) : limite de débit par client et concurrence bornée
+
+    - RateLimiter : seau à jetons par ip_client (la même IP que dans les logs) ;
+      DEBIT_CLIENT requêtes/s en continu, rafales jusqu'à RAFALE_CLIENT -> 429 + Retry-After
+    - AdmissionController : au plus CONCURRENCE_MAX estimations en cours (géocodage + modèles),
+      FILE_MAX en attente ; file pleine ou attente > ATTENTE_MAX -> 503 + Retry-After
+Un pic de charge est refusé vite au lieu de s'accumuler : la latence des requêtes admises reste stable
+et la BAN ne reçoit pas plus de CONCURRENCE_MAX géocodages à la fois.
+Temps d'attente et refus sont exportés dans /metrics.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from src.api.metrics import REGISTRY
+
+DEBIT_CLIENT = 20.0  # requêtes/s par client
+RAFALE_CLIENT = 40  # jetons max d'un seau
+MAX_CLIENTS = 10000  # seaux gardés en mémoire (les plus anciens sont oubliés, donc pleins)
+
+CONCURRENCE_MAX = 32
+FILE_MAX = 64
+ATTENTE_MAX = 2.0  # secondes
+
+QUEUE_TIME = REGISTRY.histogram("admission_queue_duration_seconds",
+                                "Attente avant d'obtenir une place d'estimation (requêtes admises)")
+REJECTIONS = REGISTRY.counter("admission_rejections", "Requêtes refusées par le contrôle d'admission, par cause",
+                              ("cause",))
+
+
+class Rejected(Exception):
+    """Requête refusée : status HTTP (429 / 503) et délai conseillé avant de réessayer"""
+
+    def __init__(self, status, cause, retry_after):
+        super().__init__(cause)
+        self.status = status
+        self.cause = cause
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Seau à jetons par client ; debit=None désactive la limite"""
+
+    def __init__(self, debit=DEBIT_CLIENT, rafale=RAFALE_CLIENT, max_clients=MAX_CLIENTS):
+        self.debit = debit
+        self.rafale = rafale
+        self.max_clients = max_clients
+        self._seaux = OrderedDict()  # client -> (jetons, instant de la dernière mise à jour)
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        """Consomme un jeton ou lève Rejected(429)"""
+        if self.debit is None:
+            return
+        maintenant = time.monotonic()
+        with self._lock:
+            jetons, derniere = self._seaux.pop(client, (self.rafale, maintenant))
+            jetons = min(self.rafale, jetons + (maintenant - derniere) * self.debit)
+            if jetons >= 1:
+                jetons -= 1
+                refus = None
+            else:
+                refus = math.ceil((1 - jetons) / self.debit)
+            self._seaux[client] = (jetons, maintenant)
+            if len(self._seaux) > self.max_clients:
+                self._seaux.popitem(last=False)
+        if refus is not None:
+            REJECTIONS.inc(cause='debit_client')
+            raise Rejected(429, "Trop de requêtes pour ce client", refus)
+
+
+class AdmissionController:
+    """
+    async with controller.slot(): ...  # lève Rejected(503) si saturé
+    File d'attente FIFO de futures asyncio, sur la boucle du serveur.
+    """
+
+    def __init__(self, concurrence_max=CONCURRENCE_MAX, file_max=FILE_MAX, attente_max=ATTENTE_MAX):
+        self.concurrence_max = concurrence_max
+        self.file_max = file_max
+        self.attente_max = attente_max
+        self.en_cours = 0
+        self._attente = deque()
+
+    @property
+    def en_attente(self):
+        return len(self._attente)
+
+    def _refuse(self, cause):
+        REJECTIONS.inc(cause=cause)
+        return Rejected(503, "Service saturé, réessayer plus tard", max(1, math.ceil(self.attente_max)))
+
+    async def acquire(self):
+        if self.en_cours < self.concurrence_max and not self._attente:
+            self.en_cours += 1
+            QUEUE_TIME.observe(0.0)
+            return
+        if len(self._attente) >= self.file_max:
+            raise self._refuse('file_pleine')
+
+        debut = time.perf_counter()
+        place = asyncio.get_running_loop().create_future()
+        self._attente.append(place)
+        try:
+            #la place est transmise par release() (en_cours déjà compté pour nous)
+            await asyncio.wait_for(asyncio.shield(place), self.attente_max)
+        except BaseException as e:
+            #délai dépassé ou client parti (annulation)
+            if place.done() and not place.cancelled():
+                #place obtenue au même moment : on la rend
+                self.release()
+            else:
+                place.cancel()
+                self._attente.remove(place)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._refuse('attente_depassee')
+            raise
+        QUEUE_TIME.observe((time.perf_counter() - debut) * 1000)
+
+    def release(self):
+        #la place passe directement au premier en attente encore vivant
+        while self._attente:
+            place = self._attente.popleft()
+            if not place.done():
+                place.set_result(None)
+                return
+        self.en_cours -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def register_metrics(controller, registry=REGISTRY):
+    registry.gauge("admission_in_flight", "Estimations en cours", lambda: controller.en_cours)
+    registry.gauge("admission_waiting", "Requêtes en attente d'une place", lambda: controller.en_attente)
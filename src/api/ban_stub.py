@@ -0,0 +1,378 @@
+"""
+Serveur local qui imite l'API Adresse (BAN) : même format de réponse, latence et pannes simulées.
+Sert à tester le client de géocodage (src/dashboard/utils/ban_client.py) sans réseau.
+
+Lancer le serveur seul puis pointer l'API dessus :
+    python src/api/ban_stub.py --port 8765 --latence 40 --taux-erreur 0.1
+    BAN_URL=http://127.0.0.1:8765/search/ uvicorn src.api.main:app
+
+Scénario de démonstration (pool de connexions, retries, timeouts, disjoncteur, client async) :
+    python src/api/ban_stub.py --demo
+
+Vérification du client (assertions sur retries, timeouts, 4xx, réponses illisibles, disjoncteur ;
+code de sortie 1 si l'une échoue) :
+    python src/api/ban_stub.py --verifier
+"""
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import asyncio
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+
+class StubConfig:
+    """Comportement du serveur, modifiable pendant qu'il tourne"""
+
+    def __init__(self, latence_ms=30.0, jitter_ms=10.0, taux_erreur=0.0, taux_blocage=0.0, blocage_s=5.0,
+                 cout_connexion_ms=0.0):
+        self.latence_ms = latence_ms
+        self.jitter_ms = jitter_ms
+        self.taux_erreur = taux_erreur  # part des requêtes en 503
+        self.taux_blocage = taux_blocage  # part des requêtes qui ne répondent qu'après blocage_s
+        self.blocage_s = blocage_s
+        self.cout_connexion_ms = cout_connexion_ms  # handshake TCP+TLS simulé, payé à chaque nouvelle connexion
+        self.echecs_a_venir = 0  # les N prochaines requêtes reçoivent code_erreur (scénarios déterministes)
+        self.code_erreur = 503
+        self.reponse_invalide = False  # 200 dont le corps n'a pas la forme de la BAN
+        self.requetes = 0
+        self.connexions = 0
+
+
+def fake_feature(adresse):
+    """Coordonnées déterministes dans Paris à partir du texte de l'adresse"""
+    h = int(hashlib.md5(adresse.lower().encode()).hexdigest(), 16)
+    arrondissement = h % 20 + 1
+    lat = 48.815 + (h >> 8) % 10000 / 10000 * 0.085
+    lon = 2.255 + (h >> 24) % 10000 / 10000 * 0.16
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+        'properties': {'label': f"{adresse} 750{arrondissement:02d} Paris", 'score': 0.9,
+                       'type': 'housenumber' if adresse[:1].isdigit() else 'street',
+                       'postcode': f"750{arrondissement:02d}", 'citycode': '75056'},
+    }
+
+
+def make_handler(config):
+    class BanStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, comme la vraie BAN
+        disable_nagle_algorithm = True  # sinon en-têtes et corps partent séparément (+40 ms d'ACK retardé)
+
+        def setup(self):
+            super().setup()
+            config.connexions += 1
+            time.sleep(config.cout_connexion_ms / 1000)
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            config.requetes += 1
+            url = urlparse(self.path)
+            adresse = parse_qs(url.query).get('q', [''])[0]
+
+            if random.random() < config.taux_blocage:
+                time.sleep(config.blocage_s)
+            time.sleep(max(0.0, random.gauss(config.latence_ms, config.jitter_ms)) / 1000)
+
+            if not url.path.startswith('/search'):
+                return self._send(404, {'error': 'not found'})
+            if not 3 <= len(adresse.strip()) <= 200:
+                #contrôle de saisie de la BAN
+                return self._send(400, {'code': 400, 'message': 'q must contain between 3 and 200 chars'})
+            if config.echecs_a_venir > 0:
+                config.echecs_a_venir -= 1
+                return self._send(config.code_erreur, {'error': 'erreur simulée'})
+            if random.random() < config.taux_erreur:
+                return self._send(503, {'error': 'service unavailable'})
+            if config.reponse_invalide:
+                return self._send(200, {'type': 'FeatureCollection', 'features': [{'properties': {}}]})
+            features = [] if 'introuvable' in adresse.lower() else [fake_feature(adresse)]
+            self._send(200, {'type': 'FeatureCollection', 'features': features, 'query': adresse})
+
+        def _send(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return BanStubHandler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # 5 par défaut : des connexions simultanées seraient refusées puis réémises 1 s après
+
+    def handle_error(self, request, client_address):
+        #client parti avant la réponse (timeout de lecture) : attendu avec taux_blocage
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_stub(config=None, port=0):
+    """Démarre le serveur dans un thread, renvoie (serveur, url de /search/)"""
+    config = config or StubConfig()
+    server = StubServer(('127.0.0.1', port), make_handler(config))
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/search/"
+
+
+def _ms(debut):
+    return (time.perf_counter() - debut) * 1000
+
+
+def demo():
+    import requests
+    from src.dashboard.utils.ban_client import BanClient, AsyncBanClient, BanUnavailable, CircuitBreaker
+
+    server, url = start_stub(StubConfig(latence_ms=20, jitter_ms=5, cout_connexion_ms=15))
+    config = server.config
+    adresses = [f"{i} rue de rivoli" for i in range(1, 51)]
+    print(f"Serveur BAN simulé: {url}\n")
+
+    print("1. requests.get sans session vs client avec pool keep-alive (50 appels, handshake simulé 15 ms)")
+    config.connexions = 0
+    debut = time.perf_counter()
+    for a in adresses:
+        requests.get(url, params={'q': a}, timeout=5)
+    print(f"   requests.get : {_ms(debut):.0f} ms, {config.connexions} connexions TCP")
+    client = BanClient(base_url=url)
+    config.connexions = 0
+    debut = time.perf_counter()
+    for a in adresses:
+        client.search(a)
+    print(f"   BanClient    : {_ms(debut):.0f} ms, {config.connexions} connexion(s) TCP")
+
+    print("\n2. 30% de réponses 503 : les retries avec jitter masquent les erreurs")
+    config.taux_erreur = 0.3
+    client = BanClient(base_url=url, breaker=CircuitBreaker(seuil=1000))
+    ok = sum(1 for a in adresses if _safe(client.search, a, BanUnavailable))
+    print(f"   {ok}/{len(adresses)} réussies, {client.stats()}")
+    config.taux_erreur = 0.0
+
+    print("\n3. serveur bloqué 5 s : timeout de lecture au lieu d'un worker figé")
+    config.taux_blocage = 1.0
+    client = BanClient(base_url=url, timeout_lecture=0.3, max_tentatives=2)
+    debut = time.perf_counter()
+    _safe(client.search, adresses[0], BanUnavailable)
+    print(f"   abandon après {_ms(debut):.0f} ms (2 tentatives)")
+
+    print("\n4. panne totale : le disjoncteur s'ouvre après 5 échecs, les appels suivants échouent immédiatement")
+    config.taux_blocage, config.taux_erreur = 0.0, 1.0
+    client = BanClient(base_url=url, max_tentatives=1, breaker=CircuitBreaker(seuil=5, duree_ouverture=0.5))
+    for i, a in enumerate(adresses[:8]):
+        debut = time.perf_counter()
+        _safe(client.search, a, BanUnavailable)
+        print(f"   appel {i + 1}: {_ms(debut):6.1f} ms, disjoncteur {client.breaker.etat}")
+    config.taux_erreur = 0.0
+    time.sleep(0.6)
+    print(f"   après {0.5} s et retour du serveur: {client.search(adresses[0]) is not None}, "
+          f"disjoncteur {client.breaker.etat}")
+
+    print("\n5. client asynchrone : 50 géocodages concurrents sur une seule boucle")
+    client = AsyncBanClient(base_url=url)
+
+    async def run():
+        debut = time.perf_counter()
+        results = await asyncio.gather(*(client.search(a) for a in adresses))
+        duree = _ms(debut)
+        await client.aclose()
+        return results, duree
+
+    results, duree = asyncio.run(run())
+    print(f"   {sum(r is not None for r in results)} résultats en {duree:.0f} ms "
+          f"(~{config.latence_ms:.0f} ms par appel en série)")
+
+    server.shutdown()
+
+
+def verify():
+    """Comportement du client contre le serveur simulé ; renvoie le nombre de vérifications en échec"""
+    from src.dashboard.utils.ban_client import BanClient, AsyncBanClient, BanUnavailable, CircuitBreaker
+
+    server, url = start_stub(StubConfig(latence_ms=2, jitter_ms=0))
+    config = server.config
+    echecs = []
+
+    def check(description, condition):
+        print(f"   {'ok    ' if condition else 'ECHEC '} {description}")
+        if not condition:
+            echecs.append(description)
+
+    def appel(client, adresse="1 rue de rivoli"):
+        """(résultat ou None, exception levée ou None, requêtes reçues par le serveur)"""
+        avant = config.requetes
+        try:
+            return client.search(adresse), None, config.requetes - avant
+        except Exception as e:
+            return None, e, config.requetes - avant
+
+    def scenario(**kwargs):
+        config.echecs_a_venir, config.code_erreur = kwargs.get('echecs', 0), kwargs.get('code', 503)
+        config.taux_blocage, config.reponse_invalide = kwargs.get('blocage', 0.0), kwargs.get('invalide', False)
+        config.taux_erreur = kwargs.get('taux_erreur', 0.0)
+
+    print("Client synchrone")
+    client = BanClient(base_url=url, breaker=CircuitBreaker(seuil=100))
+    scenario()
+    geo, e, n = appel(client)
+    check("réponse normale : coordonnées, 1 requête", e is None and geo and geo['source'] == 'ban' and n == 1)
+    geo, e, n = appel(client, "rue introuvable")
+    check("adresse introuvable : None, pas d'erreur", geo is None and e is None)
+    scenario(echecs=2)
+    geo, e, n = appel(client)
+    check("2 réponses 503 puis succès : réussi en 3 tentatives", geo is not None and n == 3)
+    scenario(echecs=3)
+    geo, e, n = appel(client)
+    check("3 réponses 503 : BanUnavailable après 3 tentatives", isinstance(e, BanUnavailable) and n == 3)
+    scenario(echecs=1, code=429)
+    geo, e, n = appel(client)
+    check("429 : nouvelle tentative", geo is not None and n == 2)
+
+    breaker = CircuitBreaker(seuil=2)
+    client = BanClient(base_url=url, breaker=breaker)
+    scenario(echecs=3, code=400)
+    resultats = [appel(client) for _ in range(3)]
+    check("400 (saisie refusée) : None sans nouvelle tentative ni erreur",
+          all(geo is None and e is None and n == 1 for geo, e, n in resultats))
+    scenario(echecs=3, code=403)
+    resultats = [appel(client) for _ in range(3)]
+    check("403 : BanUnavailable sans nouvelle tentative",
+          all(isinstance(e, BanUnavailable) and n == 1 for _, e, n in resultats))
+    check("4xx répétées : disjoncteur toujours fermé", breaker.etat == 'ferme' and breaker.echecs == 0)
+    scenario()
+    geo, e, n = appel(client, "ab")
+    check("adresse de 2 caractères : None sans requête", geo is None and e is None and n == 0)
+    geo, e, n = appel(client, "x" * 300)
+    check("adresse de 300 caractères : None sans requête", geo is None and e is None and n == 0)
+    scenario(invalide=True)
+    geo, e, n = appel(client)
+    check("200 au corps inattendu : BanUnavailable (pas KeyError), échec compté",
+          isinstance(e, BanUnavailable) and client.stats()['echecs'] == 1)
+
+    scenario(blocage=1.0)
+    config.blocage_s = 2.0
+    client = BanClient(base_url=url, timeout_lecture=0.2, max_tentatives=2)
+    debut = time.perf_counter()
+    geo, e, n = appel(client)
+    duree = time.perf_counter() - debut
+    check(f"serveur bloqué : abandon après 2 timeouts de lecture ({duree:.2f} s < 1 s)",
+          isinstance(e, BanUnavailable) and n == 2 and duree < 1.0)
+
+    scenario(taux_erreur=1.0)
+    breaker = CircuitBreaker(seuil=3, duree_ouverture=0.3)
+    client = BanClient(base_url=url, max_tentatives=1, breaker=breaker)
+    for _ in range(3):
+        appel(client)
+    check("3 échecs consécutifs : disjoncteur ouvert", breaker.etat == 'ouvert')
+    geo, e, n = appel(client)
+    check("disjoncteur ouvert : refus immédiat sans requête", isinstance(e, BanUnavailable) and n == 0)
+    scenario()
+    time.sleep(0.35)
+    geo, e, n = appel(client)
+    check("après la durée d'ouverture : appel d'essai réussi, disjoncteur refermé",
+          geo is not None and breaker.etat == 'ferme')
+
+    client = BanClient(base_url=url, breaker=CircuitBreaker(seuil=100))
+    fils = [threading.Thread(target=lambda: [appel(client) for _ in range(25)]) for _ in range(8)]
+    for t in fils:
+        t.start()
+    for t in fils:
+        t.join()
+    check("8 threads x 25 appels : compteurs exacts", client.stats()['appels'] == 200)
+
+    print("Client asynchrone")
+
+    async def run():
+        async def appel_async(client, adresse="1 rue de rivoli"):
+            avant = config.requetes
+            try:
+                return await client.search(adresse), None, config.requetes - avant
+            except Exception as e:
+                return None, e, config.requetes - avant
+
+        client = AsyncBanClient(base_url=url, breaker=CircuitBreaker(seuil=100))
+        scenario(echecs=2)
+        geo, e, n = await appel_async(client)
+        check("2 réponses 503 puis succès : réussi en 3 tentatives", geo is not None and n == 3)
+        scenario(echecs=1, code=404)
+        geo, e, n = await appel_async(client)
+        check("404 : BanUnavailable sans nouvelle tentative, disjoncteur fermé",
+              isinstance(e, BanUnavailable) and n == 1 and client.breaker.echecs == 0)
+        scenario(echecs=1, code=400)
+        geo, e, n = await appel_async(client)
+        check("400 (saisie refusée) : None sans nouvelle tentative", geo is None and e is None and n == 1)
+        scenario(invalide=True)
+        geo, e, n = await appel_async(client)
+        check("200 au corps inattendu : BanUnavailable", isinstance(e, BanUnavailable))
+        scenario(blocage=1.0)
+        lent = AsyncBanClient(base_url=url, timeout_lecture=0.2, max_tentatives=2)
+        debut = time.perf_counter()
+        geo, e, n = await appel_async(lent)
+        check("serveur bloqué : abandon après 2 timeouts de lecture",
+              isinstance(e, BanUnavailable) and n == 2 and time.perf_counter() - debut < 1.0)
+        scenario()
+        geos = await asyncio.gather(*(client.search(f"{i} rue de rivoli") for i in range(50)))
+        check("50 géocodages concurrents", all(g is not None for g in geos))
+        await client.aclose()
+        await lent.aclose()
+
+    asyncio.run(run())
+    server.shutdown()
+    print(f"\n{'Toutes les vérifications passent' if not echecs else f'{len(echecs)} vérification(s) en échec'}")
+    return len(echecs)
+
+
+def _safe(fn, arg, erreur):
+    try:
+        return fn(arg) is not None
+    except erreur:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local imitant l'API Adresse (BAN)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latence', type=float, default=30.0, help="latence moyenne (ms)")
+    parser.add_argument('--jitter', type=float, default=10.0, help="écart-type de la latence (ms)")
+    parser.add_argument('--taux-erreur', type=float, default=0.0, help="part des réponses 503")
+    parser.add_argument('--taux-blocage', type=float, default=0.0, help="part des requêtes bloquées")
+    parser.add_argument('--blocage', type=float, default=5.0, help="durée d'un blocage (s)")
+    parser.add_argument('--cout-connexion', type=float, default=0.0, help="handshake simulé par connexion (ms)")
+    parser.add_argument('--demo', action='store_true', help="scénario de démonstration du client")
+    parser.add_argument('--verifier', action='store_true', help="vérifications du client (code de sortie 1 si échec)")
+    args = parser.parse_args()
+
+    if args.demo:
+        demo()
+        return
+    if args.verifier:
+        sys.exit(1 if verify() else 0)
+
+    config = StubConfig(args.latence, args.jitter, args.taux_erreur, args.taux_blocage, args.blocage,
+                        args.cout_connexion)
+    server = StubServer(('127.0.0.1', args.port), make_handler(config))
+    print(f"BAN simulée sur http://127.0.0.1:{args.port}/search/ (Ctrl+C pour arrêter)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{config.requetes} requêtes servies")
+
+
+if __name__ == "__main__":
+    main()
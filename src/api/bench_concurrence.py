@@ -0,0 +1,162 @@
+"""
+Test de montée en charge de /predict : le débit doit croître avec le nombre de clients simultanés.
+
+L'API (uvicorn, une seule boucle), la BAN simulée (ban_stub.py) et le générateur de charge tournent
+dans trois process distincts, pour que les mesures ne se disputent pas le même GIL.
+Chaque requête porte une adresse différente pour forcer un vrai appel BAN (pas de cache, pas d'index DVF).
+Pour comparaison, /predict_bloquant reprend l'ancien chemin (géocodage requests + modèle sur la boucle) :
+son débit reste plat, les requêtes sont traitées les unes après les autres.
+
+    python src/api/bench_concurrence.py
+    python src/api/bench_concurrence.py --concurrences 1 8 32 --requetes 300 --latence 80
+
+Code de sortie 1 si /predict ne passe pas à l'échelle (débit max < SEUIL_ACCELERATION x débit à 1 client).
+"""
+import os
+import sys
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+
+import httpx
+import numpy as np
+import uvicorn
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+#volontairement bas : sur une machine à 1 cœur, API + BAN simulée + charge plafonnent vite côté CPU
+#(un chemin sérialisé reste à x1, quel que soit le nombre de clients)
+SEUIL_ACCELERATION = 2.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_api(port, ban_url, tmp_dir):
+    """Process de l'API : importée après BAN_URL, isolée des vraies bases"""
+    os.environ["BAN_URL"] = ban_url
+    from src.api import database
+    from src.dashboard.utils import geocode_cache
+
+    #logs et cache dans un dossier temporaire (avant l'import de l'API qui les ouvre),
+    #pas d'index DVF : chaque adresse part vers la BAN simulée
+    database.DB_PATH = Path(tmp_dir) / "logs_bench.db"
+    geocode_cache.CACHE_DB_PATH = Path(tmp_dir) / "geocode_bench.db"
+    import src.api.main as api
+    api.predictor.models.offline_geocoder = None
+    api.rate_limiter.debit = None  # toute la charge vient de 127.0.0.1
+
+    @api.app.post("/predict_bloquant")
+    async def predict_bloquant(request: api.EstimationRequest):
+        """Ancien chemin : requests.get et modèle exécutés directement sur la boucle"""
+        result = api.predictor.estimate_complet(request.surface, request.pieces, request.annee, request.adresse)
+        result.pop('timings_ms', None)
+        return result
+
+    uvicorn.run(api.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def run_stub(port, latence):
+    from src.api.ban_stub import StubServer, StubConfig, make_handler
+    StubServer(('127.0.0.1', port), make_handler(StubConfig(latence_ms=latence, jitter_ms=latence / 10))).serve_forever()
+
+
+def wait_ready(url, timeout=120):
+    debut = time.perf_counter()
+    while time.perf_counter() - debut < timeout:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} ne répond pas")
+
+
+async def charge(url, route, n_requetes, concurrence):
+    """n_requetes envoyées par `concurrence` clients ; renvoie débit, latences et codes HTTP"""
+    semaphore = asyncio.Semaphore(concurrence)
+    run_id = uuid.uuid4().hex[:6]
+    latences, codes = [], []
+
+    async with httpx.AsyncClient(base_url=url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrence)) as client:
+        async def one(i):
+            payload = {'surface': 50, 'pieces': 2, 'annee': 2024, 'adresse': f"{i} villa bench {run_id}"}
+            async with semaphore:
+                debut = time.perf_counter()
+                r = await client.post(route, json=payload)
+                latences.append((time.perf_counter() - debut) * 1000)
+                codes.append(r.status_code)
+
+        debut = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n_requetes)))
+        duree = time.perf_counter() - debut
+
+    return {
+        'rps': n_requetes / duree,
+        'p50_ms': float(np.percentile(latences, 50)),
+        'p95_ms': float(np.percentile(latences, 95)),
+        'erreurs': sum(c != 200 for c in codes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de /predict selon le nombre de clients simultanés")
+    parser.add_argument('--concurrences', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--requetes', type=int, default=200, help="requêtes par palier")
+    parser.add_argument('--latence', type=float, default=50.0, help="latence de la BAN simulée (ms)")
+    parser.add_argument('--sans-bloquant', action='store_true', help="ne pas mesurer /predict_bloquant")
+    args = parser.parse_args()
+
+    routes = ['/predict'] if args.sans_bloquant else ['/predict', '/predict_bloquant']
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        port_ban, port_api = free_port(), free_port()
+        ban_url = f"http://127.0.0.1:{port_ban}/search/"
+        url = f"http://127.0.0.1:{port_api}"
+        process = [ctx.Process(target=run_stub, args=(port_ban, args.latence), daemon=True),
+                   ctx.Process(target=run_api, args=(port_api, ban_url, tmp_dir), daemon=True)]
+        for p in process:
+            p.start()
+        wait_ready(ban_url)
+        wait_ready(url)
+
+        print(f"API {url} | BAN simulée {args.latence:.0f} ms | {args.requetes} requêtes par palier\n")
+        print(f"{'route':<20}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'erreurs':>9}")
+
+        resultats = {}
+        for route in routes:
+            for c in args.concurrences:
+                r = asyncio.run(charge(url, route, args.requetes, c))
+                resultats[(route, c)] = r
+                print(f"{route:<20}{c:>8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['erreurs']:>9}")
+            print()
+
+        for p in process:
+            p.terminate()
+            p.join()
+
+    base = resultats[('/predict', args.concurrences[0])]['rps']
+    meilleur = max(resultats[('/predict', c)]['rps'] for c in args.concurrences)
+    acceleration = meilleur / base
+    print(f"/predict : x{acceleration:.1f} entre {args.concurrences[0]} client(s) et le meilleur palier")
+    if resultats[('/predict', args.concurrences[0])]['erreurs']:
+        print("ATTENTION : des requêtes ont échoué (modèles absents de models/ ?)")
+    if len(args.concurrences) > 1 and acceleration < SEUIL_ACCELERATION:
+        print(f"ECHEC : accélération < x{SEUIL_ACCELERATION}, les requêtes se sérialisent")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
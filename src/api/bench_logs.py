@@ -0,0 +1,90 @@
+"""
+Écriture des logs d'estimation : écriture directe (log_request) contre écriture par lots (LogWriter)
+
+Mesure, sur une base temporaire, le coût vu par la requête (durée de l'appel, p50 / p99)
+et le débit soutenu jusqu'à ce que toutes les lignes soient en base.
+
+    python src/api/bench_logs.py
+    python src/api/bench_logs.py --lignes 50000
+"""
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.api import database
+
+SEUIL_DEBIT = 2000  # lignes/s attendues pour l'écriture par lots
+
+
+def fake_log(i):
+    data = {'adresse': f"{i} rue du bench 75011 Paris", 'surface': 50.0, 'pieces': 2, 'annee': 2024}
+    result = {
+        'geo_info': {'arrondissement': 11, 'source': 'ban'},
+        'prix_m2_estime': 10500.0, 'classification': 'Normal', 'confiance': 0.8,
+        'timings_ms': {stage: 1.0 for stage in database.TIMING_STAGES}
+    }
+    return data, result
+
+
+def mesure(nom, ecrire, n, fin=None):
+    durees = np.empty(n)
+    debut = time.perf_counter()
+    for i in range(n):
+        data, result = fake_log(i)
+        t = time.perf_counter()
+        ecrire(data, result, "127.0.0.1")
+        durees[i] = (time.perf_counter() - t) * 1000
+    if fin is not None:
+        fin()
+    duree = time.perf_counter() - debut
+    debit = n / duree
+    print(f"{nom:<18}{n:>8}{debit:>12.0f}{np.percentile(durees, 50):>12.3f}{np.percentile(durees, 99):>12.3f}")
+    return debit
+
+
+def count_rows():
+    conn = sqlite3.connect(database.DB_PATH)
+    n = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    conn.close()
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit d'écriture des logs d'estimation")
+    parser.add_argument('--lignes', type=int, default=20000, help="lignes pour l'écriture par lots")
+    parser.add_argument('--lignes-directes', type=int, default=1000, help="lignes pour log_request")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database.DB_PATH = Path(tmp_dir) / "logs_bench.db"
+        database.init_db()
+
+        print(f"{'écriture':<18}{'lignes':>8}{'lignes/s':>12}{'p50 ms':>12}{'p99 ms':>12}")
+        mesure("log_request", database.log_request, args.lignes_directes)
+
+        writer = database.LogWriter().start()
+        debit = mesure("LogWriter", writer.enqueue, args.lignes, fin=writer.flush)
+        stats = writer.stats()
+        writer.close()
+
+        attendu = args.lignes_directes + args.lignes
+        print(f"\n{stats['lots']} lots, {stats['abandonnees']} lignes abandonnées, "
+              f"{count_rows()} / {attendu} lignes en base")
+
+    if debit < SEUIL_DEBIT:
+        print(f"ECHEC : débit par lots < {SEUIL_DEBIT} lignes/s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Micro-batching des modèles : débit, CPU par requête et latence, avec et sans regroupement
+
+Le géocodage est remplacé par une coroutine de 1 ms (coordonnées fixes) pour ne mesurer
+que la partie modèles de MLPredictor.estimate_complet_async. TAILLE_MAX = 1 revient à l'ancien
+comportement (un appel des modèles par requête).
+
+    python src/api/bench_micro_batch.py
+    python src/api/bench_micro_batch.py --clients 1 16 64 --requetes 2000
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.dashboard.utils.ml_predictor import MLPredictor
+from src.dashboard.utils.micro_batch import TAILLE_MAX
+
+
+async def fake_geocode(address, leve_indisponible=False):
+    await asyncio.sleep(0.001)
+    return {'latitude': 48.86, 'longitude': 2.35, 'arrondissement': 4, 'label': address, 'source': 'bench'}
+
+
+async def charge(predictor, n_requetes, concurrence):
+    semaphore = asyncio.Semaphore(concurrence)
+    latences = []
+
+    async def one(i):
+        async with semaphore:
+            debut = time.perf_counter()
+            await predictor.estimate_complet_async(30 + i % 80, 1 + i % 5, 2024, f"{i} rue du bench")
+            latences.append((time.perf_counter() - debut) * 1000)
+
+    cpu, debut = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requetes)))
+    duree = time.perf_counter() - debut
+    return {
+        'rps': n_requetes / duree,
+        'cpu_ms': (time.process_time() - cpu) / n_requetes * 1000,
+        'p50_ms': float(np.percentile(latences, 50)),
+        'p99_ms': float(np.percentile(latences, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Effet du micro-batching sur les modèles")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 64])
+    parser.add_argument('--requetes', type=int, default=1000)
+    args = parser.parse_args()
+
+    predictor = MLPredictor()
+    if predictor.model_linear is None:
+        print("Modèles absents de models/ : lancer l'entraînement d'abord")
+        sys.exit(1)
+    predictor.geocode_address_async = fake_geocode
+
+    print(f"{'taille max':>10}{'clients':>9}{'req/s':>10}{'CPU ms/req':>12}{'p50 ms':>9}{'p99 ms':>9}{'lot moyen':>11}")
+    for taille in (1, TAILLE_MAX):
+        predictor.batcher.taille_max = taille
+        for clients in args.clients:
+            predictor.batcher.compteurs = {'lots': 0, 'lignes': 0, 'lots_pleins': 0}
+            r = asyncio.run(charge(predictor, args.requetes, clients))
+            lot = predictor.batcher.stats()['taille_moyenne']
+            print(f"{taille:>10}{clients:>9}{r['rps']:>10.0f}{r['cpu_ms']:>12.2f}"
+                  f"{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{lot:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Débit de l'API selon le nombre de workers du lanceur serve.py (master + workers forkés)
+
+Pour chaque nombre de workers : l'API est lancée par serve.py (modèles chargés une fois dans le master),
+la BAN simulée tourne dans son propre process, puis la charge de bench_concurrence.py est envoyée.
+Adresses toutes différentes : ni cache de réponses ni cache de géocodage, chaque requête fait
+géocodage + modèles. On relève aussi la mémoire des workers : RSS (ce que chacun voit)
+et PSS (pages partagées divisées entre les process) pour vérifier le partage copy-on-write.
+
+    python src/api/bench_workers.py
+    python src/api/bench_workers.py --workers 1 2 4 --concurrence 64 --requetes 400
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.api.bench_concurrence import free_port, wait_ready, charge, run_stub
+
+
+def run_server(port, ban_url, tmp_dir, workers):
+    """Process master : chemins isolés, préchargement, puis fork des workers"""
+    os.environ["BAN_URL"] = ban_url
+    from src.api import serve, database
+    from src.dashboard.utils import geocode_cache
+    database.DB_PATH = Path(tmp_dir) / "logs_bench.db"
+    geocode_cache.CACHE_DB_PATH = Path(tmp_dir) / "geocode_bench.db"
+    serve.pin_threads()
+    api = serve.preload()
+    api.predictor.models.offline_geocoder = None
+    api.rate_limiter.debit = None  # toute la charge vient de 127.0.0.1
+    serve.serve(api.app, "127.0.0.1", port, workers, log_level="warning")
+
+
+def worker_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def memoire_mo(pid):
+    """(RSS, PSS) en Mo d'après /proc/<pid>/smaps_rollup (Linux)"""
+    valeurs = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for ligne in f:
+                morceaux = ligne.split()
+                if morceaux[0] in ("Rss:", "Pss:"):
+                    valeurs[morceaux[0][:-1]] = int(morceaux[1]) / 1024
+    except OSError:
+        return None, None
+    return valeurs.get("Rss"), valeurs.get("Pss")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de l'API selon le nombre de workers")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrence', type=int, default=32)
+    parser.add_argument('--requetes', type=int, default=300)
+    parser.add_argument('--latence', type=float, default=20.0, help="latence de la BAN simulée (ms)")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    port_ban = free_port()
+    ban_url = f"http://127.0.0.1:{port_ban}/search/"
+    stub = ctx.Process(target=run_stub, args=(port_ban, args.latence), daemon=True)
+    stub.start()
+    wait_ready(ban_url)
+
+    print(f"{os.cpu_count()} cœur(s) | BAN simulée {args.latence:.0f} ms | {args.concurrence} clients | "
+          f"{args.requetes} requêtes par palier\n")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'erreurs':>9}{'RSS Mo':>10}{'PSS Mo':>10}")
+
+    resultats = {}
+    for n in args.workers:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            master = ctx.Process(target=run_server, args=(port, ban_url, tmp_dir, n))
+            master.start()
+            wait_ready(url)
+            time.sleep(0.5 * n)  # tous les workers à l'écoute
+
+            asyncio.run(charge(url, '/predict', args.concurrence, args.concurrence))  # échauffement
+            r = asyncio.run(charge(url, '/predict', args.requetes, args.concurrence))
+            resultats[n] = r
+
+            memoires = [memoire_mo(pid) for pid in worker_pids(master.pid)]
+            rss = sum(m[0] for m in memoires if m[0] is not None)
+            pss = sum(m[1] for m in memoires if m[1] is not None)
+            print(f"{n:>8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['erreurs']:>9}"
+                  f"{rss:>10.0f}{pss:>10.0f}")
+
+            master.terminate()
+            master.join(30)
+
+    stub.terminate()
+    stub.join()
+
+    base = resultats[args.workers[0]]['rps']
+    print()
+    for n, r in resultats.items():
+        print(f"{n} worker(s) : x{r['rps'] / base:.2f}")
+    if os.cpu_count() and max(args.workers) > os.cpu_count():
+        print(f"(au-delà de {os.cpu_count()} worker(s), les workers se partagent les mêmes cœurs)")
+
+
+if __name__ == "__main__":
+    main()
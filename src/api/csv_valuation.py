@@ -0,0 +1,300 @@
+"""
+Valorisation d'un portefeuille CSV en flux (POST /predict/csv et ligne de commande)
+
+Le CSV (colonnes adresse, surface, pieces, annee ; id optionnel, séparateur ; ou ,) est lu au fil
+de l'eau et traité par blocs de TAILLE_BLOC lignes :
+    1. géocodage des adresses distinctes du bloc (index DVF / cache, puis BAN, N_GEOCODAGES en parallèle)
+    2. features + modèles en un seul appel vectorisé (MLPredictor.estimate_batch)
+    3. une ligne NDJSON par bien, dans l'ordre du fichier, puis une ligne de progression
+Seul le bloc courant est en mémoire : la consommation ne dépend pas de la taille du fichier,
+et le client reçoit les premiers résultats pendant qu'il envoie encore la suite.
+Une ligne invalide (ou une erreur sur un bloc) donne une ligne d'erreur, le flux continue.
+Chaque ligne d'erreur porte une cause : 'ligne_invalide', 'adresse_introuvable', 'erreur_interne', 'service_sature'
+ou 'ban_indisponible' (BAN en panne ou disjoncteur ouvert : ces lignes-là peuvent être renvoyées plus tard).
+Dans l'API, chaque bloc prend une place du contrôle d'admission comme un /predict ; API saturée ->
+lignes du bloc en erreur 'service_sature' (à renvoyer aussi), le flux continue.
+Limite : un champ entre guillemets ne doit pas contenir de retour à la ligne (chaque ligne est lue seule).
+
+    curl -T portefeuille.csv -H "Content-Type: text/csv" http://127.0.0.1:8000/predict/csv
+    python src/api/csv_valuation.py portefeuille.csv -o resultats.ndjson              # sans serveur
+    python src/api/csv_valuation.py portefeuille.csv --url http://127.0.0.1:8000      # via l'API
+"""
+import os
+import sys
+import csv
+import json
+import math
+import time
+import codecs
+import asyncio
+import argparse
+from contextlib import nullcontext
+from pathlib import Path
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.dashboard.utils.latency import StageTimer, StageHistograms
+from src.dashboard.utils.ban_client import BanUnavailable
+from src.api.admission import Rejected
+
+COLONNES = ['adresse', 'surface', 'pieces', 'annee']
+TAILLE_BLOC = 500
+N_GEOCODAGES = 8  # géocodages BAN simultanés par flux
+ERREUR_BAN = "Service de géocodage (BAN) indisponible, ligne à renvoyer plus tard"
+TAILLE_LECTURE = 64 * 1024  # octets lus à la fois (CLI)
+
+#durées par étape des valorisations CSV, à part pour ne pas fausser celles de /predict
+CSV_HISTOGRAMS = StageHistograms()
+
+
+async def iter_lines(chunks):
+    """Morceaux d'octets (corps de requête, fichier) -> lignes de texte, BOM UTF-8 retiré"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    reste = ""
+    async for chunk in chunks:
+        lignes = (reste + decoder.decode(chunk)).split("\n")
+        reste = lignes.pop()
+        for ligne in lignes:
+            yield ligne.rstrip("\r")
+    reste += decoder.decode(b"", final=True)
+    if reste.strip():
+        yield reste.rstrip("\r")
+
+
+def parse_header(ligne):
+    """(séparateur, noms de colonnes) ; ValueError si une colonne obligatoire manque"""
+    sep = ';' if ligne.count(';') >= ligne.count(',') else ','
+    colonnes = [c.strip().lower() for c in next(csv.reader([ligne], delimiter=sep))]
+    manquantes = [c for c in COLONNES if c not in colonnes]
+    if manquantes:
+        raise ValueError(f"colonnes manquantes: {', '.join(manquantes)} (attendu: {', '.join(COLONNES)})")
+    return sep, colonnes
+
+
+def parse_row(ligne, sep, colonnes):
+    """Bien à estimer ou message d'erreur ; chaque ligne est découpée seule (guillemet non fermé -> erreur)"""
+    try:
+        valeurs = next(csv.reader([ligne], delimiter=sep, strict=True))
+    except (csv.Error, StopIteration):
+        return None, "ligne CSV invalide"
+    row = dict(zip(colonnes, valeurs))
+    try:
+        surface = float(row['surface'].replace(',', '.'))
+        pieces = int(float(row['pieces'].replace(',', '.')))
+        annee = int(float(row['annee']))
+    except (KeyError, ValueError, OverflowError, AttributeError):
+        return None, "surface, pieces ou annee invalide"
+    adresse = (row.get('adresse') or "").strip()
+    if not adresse:
+        return None, "adresse vide"
+    #float() accepte 'nan' et 'inf', que les modèles refuseraient pour tout le bloc
+    if not math.isfinite(surface) or surface <= 0:
+        return None, "surface invalide"
+    return {'id': row.get('id'), 'adresse': adresse, 'surface': surface, 'pieces': pieces, 'annee': annee}, None
+
+
+def format_result(numero, bien, result):
+    ligne = {'type': 'resultat', 'ligne': numero}
+    if bien.get('id') is not None:
+        ligne['id'] = bien['id']
+    ligne['adresse'] = bien['adresse']
+    if 'error' in result:
+        ligne['erreur'] = result['error']
+        ligne['cause'] = result.get('cause', 'adresse_introuvable')
+        return ligne
+    for cle in ('prix_m2_estime', 'prix_total_estime', 'prix_m2_min', 'prix_m2_max', 'confiance'):
+        ligne[cle] = round(float(result[cle]), 2)
+    ligne['classification'] = result['classification']
+    ligne['arrondissement'] = int(result['geo_info']['arrondissement'])
+    ligne['geo_source'] = result['geo_info'].get('source')
+    return ligne
+
+
+async def _process_block(predictor, bloc, sep, colonnes, semaphore):
+    """Liste des lignes NDJSON (dicts) d'un bloc, dans l'ordre d'entrée"""
+    sorties = [None] * len(bloc)
+    biens = []  # (position dans le bloc, numéro de ligne, bien)
+    for k, (numero, ligne) in enumerate(bloc):
+        bien, erreur = parse_row(ligne, sep, colonnes)
+        if erreur:
+            sorties[k] = {'type': 'resultat', 'ligne': numero, 'erreur': erreur, 'cause': 'ligne_invalide'}
+        else:
+            biens.append((k, numero, bien))
+
+    #géocodage des adresses distinctes du bloc ; BAN indisponible -> None dans indisponibles, pas "introuvable"
+    indisponibles = set()
+
+    async def geocode(adresse):
+        async with semaphore:
+            try:
+                return adresse, await predictor.geocode_address_async(adresse, leve_indisponible=True)
+            except BanUnavailable:
+                indisponibles.add(adresse)
+                return adresse, None
+    geos = dict(await asyncio.gather(*(geocode(a) for a in {b['adresse'] for _, _, b in biens})))
+
+    for k, numero, bien in biens:
+        if bien['adresse'] in indisponibles:
+            sorties[k] = format_result(numero, bien, {'error': ERREUR_BAN, 'cause': 'ban_indisponible'})
+    biens = [b for b in biens if b[2]['adresse'] not in indisponibles]
+
+    #un appel des modèles pour tout le bloc
+    items = [(StageTimer(CSV_HISTOGRAMS), geos[b['adresse']], b['surface'], b['pieces'], b['annee'])
+             for _, _, b in biens]
+    if items:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(predictor.cpu_executor, predictor.estimate_batch, items)
+        for (k, numero, bien), result in zip(biens, results):
+            sorties[k] = format_result(numero, bien, result)
+    return sorties
+
+
+async def valuate_lines(predictor, lignes, sep, colonnes, taille_bloc=TAILLE_BLOC, n_geocodages=N_GEOCODAGES,
+                        admission_controller=None):
+    """
+    Lignes de données (sans l'en-tête) -> résultats et progressions, au fil de l'eau.
+    Générateur asynchrone de dicts : {'type': 'resultat', ...}, {'type': 'progression', ...}, {'type': 'fin', ...}
+    admission_controller (API) : une place prise par bloc, rendue avant d'envoyer ses lignes
+    """
+    semaphore = asyncio.Semaphore(n_geocodages)
+    debut = time.perf_counter()
+    compteurs = {'lignes': 0, 'ok': 0, 'erreurs': 0}
+
+    async def bloc_termine(bloc):
+        try:
+            async with (admission_controller.slot() if admission_controller else nullcontext()):
+                sorties = await _process_block(predictor, bloc, sep, colonnes, semaphore)
+        except Rejected as e:
+            sorties = [{'type': 'resultat', 'ligne': numero, 'erreur': str(e), 'cause': 'service_sature'}
+                       for numero, _ in bloc]
+        except Exception as e:
+            #erreur inattendue (modèles, géocodage) : lignes du bloc en erreur, le flux continue
+            print(f"Erreur valorisation CSV (lignes {bloc[0][0]}-{bloc[-1][0]}): {e}")
+            sorties = [{'type': 'resultat', 'ligne': numero, 'erreur': "erreur interne", 'cause': 'erreur_interne'}
+                       for numero, _ in bloc]
+        for sortie in sorties:
+            compteurs['lignes'] += 1
+            compteurs['erreurs' if 'erreur' in sortie else 'ok'] += 1
+            yield sortie
+        duree = time.perf_counter() - debut
+        yield dict({'type': 'progression'}, **compteurs, lignes_par_s=round(compteurs['lignes'] / duree, 1))
+
+    bloc, numero = [], 0
+    async for ligne in lignes:
+        if not ligne.strip():
+            continue
+        numero += 1
+        bloc.append((numero, ligne))
+        if len(bloc) >= taille_bloc:
+            async for sortie in bloc_termine(bloc):
+                yield sortie
+            bloc = []
+    if bloc:
+        async for sortie in bloc_termine(bloc):
+            yield sortie
+    yield dict({'type': 'fin'}, **compteurs, duree_s=round(time.perf_counter() - debut, 2))
+
+
+async def read_header(lignes):
+    """Première ligne non vide du flux -> (séparateur, colonnes) ; ValueError si absente ou invalide"""
+    async for ligne in lignes:
+        if ligne.strip():
+            return parse_header(ligne)
+    raise ValueError("fichier vide")
+
+
+async def _file_chunks(path, progression):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(TAILLE_LECTURE)
+            if not chunk:
+                return
+            progression['octets'] += len(chunk)
+            yield chunk
+
+
+def _print_progress(record, progression):
+    pourcentage = 100 * progression['octets'] / progression['total'] if progression['total'] else 100
+    print(f"\r  {record['lignes']} lignes ({record['erreurs']} erreurs), {record['lignes_par_s']:.0f} lignes/s, "
+          f"{pourcentage:.0f}% du fichier lu", end="", file=sys.stderr, flush=True)
+
+
+async def run_local(path, sortie):
+    """Valorisation dans ce process (modèles chargés ici)"""
+    from src.dashboard.utils.ml_predictor import MLPredictor
+    predictor = MLPredictor()
+    progression = {'octets': 0, 'total': os.path.getsize(path)}
+    lignes = iter_lines(_file_chunks(path, progression))
+    sep, colonnes = await read_header(lignes)
+    async for record in valuate_lines(predictor, lignes, sep, colonnes):
+        if record['type'] == 'progression':
+            _print_progress(record, progression)
+        elif record['type'] == 'resultat':
+            sortie.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            print(f"\n{record['lignes']} lignes en {record['duree_s']}s ({record['erreurs']} erreurs)", file=sys.stderr)
+    await predictor.ban_client_async.aclose()
+
+
+def run_remote(path, sortie, url):
+    """Envoi du fichier en flux à POST /predict/csv, réponses NDJSON écrites au fur et à mesure"""
+    import httpx
+    progression = {'octets': 0, 'total': os.path.getsize(path)}
+
+    def chunks():
+        with open(path, 'rb') as f:
+            while chunk := f.read(TAILLE_LECTURE):
+                progression['octets'] += len(chunk)
+                yield chunk
+
+    with httpx.stream("POST", url.rstrip("/") + "/predict/csv", content=chunks(),
+                      headers={'Content-Type': 'text/csv'}, timeout=None) as r:
+        if r.status_code != 200:
+            r.read()
+            print(f"Erreur {r.status_code}: {r.text}", file=sys.stderr)
+            sys.exit(1)
+        for ligne in r.iter_lines():
+            if not ligne:
+                continue
+            record = json.loads(ligne)
+            if record['type'] == 'progression':
+                _print_progress(record, progression)
+            elif record['type'] == 'resultat':
+                sortie.write(ligne + "\n")
+            else:
+                print(f"\n{record['lignes']} lignes en {record['duree_s']}s ({record['erreurs']} erreurs)",
+                      file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valorisation d'un CSV de biens, résultats en NDJSON")
+    parser.add_argument('fichier', help="CSV avec les colonnes adresse, surface, pieces, annee (id optionnel)")
+    parser.add_argument('-o', '--sortie', help="fichier NDJSON (défaut : sortie standard)")
+    parser.add_argument('--url', help="API à utiliser (ex. http://127.0.0.1:8000) ; sinon calcul local")
+    args = parser.parse_args()
+
+    sortie = open(args.sortie, 'w', encoding='utf-8') if args.sortie else sys.stdout
+    try:
+        if args.url:
+            run_remote(args.fichier, sortie, args.url)
+        else:
+            asyncio.run(run_local(args.fichier, sortie))
+    except ValueError as e:
+        print(f"Erreur: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if args.sortie:
+            sortie.close()
+    try:
+        import resource  # Unix seulement : pas de mesure mémoire sous Windows
+    except ImportError:
+        return
+    #ru_maxrss en Ko sous Linux
+    print(f"Mémoire max du process: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} Mo", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
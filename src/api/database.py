@@ -1,17 +1,90 @@
 """
 Module pour gérer la base de données SQLite des logs des estimations immobilières.
+
+Les requêtes de l'API ne font plus d'écriture SQLite : LogWriter.enqueue() pose la ligne dans une file
+et un thread d'écriture l'insère par lots (une transaction pour TAILLE_LOT lignes ou DELAI_FLUSH secondes),
+sur une connexion unique en mode WAL. La file est vidée à l'arrêt de l'API.
+log_request() reste disponible pour une écriture directe (scripts, tests ponctuels).
+
+Lecture (API /logs, page admin) : tout est calculé en SQL sur des index (timestamp, arrondissement),
+pagination par curseur (timestamp, id) plutôt que OFFSET, agrégats GROUP BY : rien ne charge la table entière.
+
+Rétention (log_retention.py) : les jours anciens sont résumés dans logs_jour (une ligne par jour,
+arrondissement et source de géocodage) puis retirés de logs. summarize_logs / aggregate_logs additionnent
+les deux tables : les lignes brutes récentes et les résumés des jours archivés.
 """
+import queue
 import sqlite3
+import threading
+import time
 from datetime import datetime
 from src.config import paths
 
 DB_PATH = paths/"logs_estimations.db"
 
+#durées par étape de MLPredictor.estimate_complet (ms), une colonne chacune pour pouvoir agréger en SQL
+TIMING_STAGES = ['geocodage', 'preparation', 'scaling', 'prediction', 'classification', 'quantiles', 'total']
+TIMING_COLUMNS = [f"t_{stage}_ms" for stage in TIMING_STAGES]
+
+#colonnes ajoutées après la création de la table : nom -> type SQL
+EXTRA_COLUMNS = {col: "REAL" for col in TIMING_COLUMNS}
+EXTRA_COLUMNS['geocode_source'] = "TEXT"  # dvf / ban / cache_memoire / cache_disque / cache_reponse
+
+LOG_COLUMNS = ['timestamp', 'adresse', 'arrondissement', 'surface', 'pieces', 'annee',
+               'prix_estime', 'classification', 'confiance', 'ip_client', 'geocode_source'] + TIMING_COLUMNS
+INSERT_SQL = f"INSERT INTO logs ({', '.join(LOG_COLUMNS)}) VALUES ({', '.join('?' * len(LOG_COLUMNS))})"
+
+TAILLE_LOT = 500  # lignes max par transaction
+DELAI_FLUSH = 0.5  # secondes max entre la mise en file et l'écriture
+TAILLE_FILE_MAX = 100_000  # au-delà, les lignes sont abandonnées plutôt que de bloquer les requêtes
+INTERVALLE_MAINTENANCE = 3600  # secondes entre deux appels de LogWriter.maintenance
+DELAI_FLUSH_MAX = 30  # secondes max d'attente de LogWriter.flush
+RECONNEXION_MIN, RECONNEXION_MAX = 0.5, 30  # secondes entre deux essais de connexion (doublées à chaque échec)
+
+INDEXES = {
+    'idx_logs_timestamp': "logs (timestamp)",
+    'idx_logs_arrondissement': "logs (arrondissement, timestamp)",
+}
+TAILLE_PAGE = 50
+TAILLE_PAGE_MAX = 1000
+
+#regroupements autorisés pour aggregate_logs : nom -> expression SQL sur logs, puis sur logs_jour
+#(None : pas disponible dans les résumés journaliers, seules les lignes brutes comptent)
+GROUPEMENTS = {
+    'jour': "substr(timestamp, 1, 10)",
+    'heure': "substr(timestamp, 1, 13)",
+    'arrondissement': "arrondissement",
+    'source': "geocode_source",
+}
+GROUPEMENTS_JOUR = {
+    'jour': "jour",
+    'heure': None,
+    'arrondissement': "NULLIF(arrondissement, 0)",
+    'source': "NULLIF(geocode_source, '')",
+}
+
+#colonnes moyennées : les résumés gardent somme et nombre de valeurs pour que les moyennes restent exactes
+ROLLUP_METRICS = ['prix_estime', 'confiance'] + TIMING_COLUMNS
+ROLLUP_SQL = f"""
+    CREATE TABLE IF NOT EXISTS logs_jour (
+        jour TEXT NOT NULL,
+        arrondissement INTEGER NOT NULL,  -- 0 si inconnu
+        geocode_source TEXT NOT NULL,  -- '' si inconnue
+        n INTEGER NOT NULL,
+        derniere TEXT,
+        {', '.join(f"somme_{m} REAL, n_{m} INTEGER" for m in ROLLUP_METRICS)},
+        PRIMARY KEY (jour, arrondissement, geocode_source)
+    ) WITHOUT ROWID
+"""
+
 
 def init_db():
     """Crée la table si elle n'existe pas"""
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
+    #pages libérées par la rétention rendues par PRAGMA incremental_vacuum, sans VACUUM complet dans l'API
+    #(effectif à la création de la base ; une base existante est convertie par log_retention.py --vacuum)
+    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
     c.execute('''
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -27,21 +100,28 @@ def init_db():
             ip_client TEXT
         )
     ''')
+
+    #bases créées avant l'instrumentation : on ajoute les colonnes manquantes
+    existing = {row[1] for row in c.execute("PRAGMA table_info(logs)")}
+    for col, sql_type in EXTRA_COLUMNS.items():
+        if col not in existing:
+            c.execute(f"ALTER TABLE logs ADD COLUMN {col} {sql_type}")
+
+    for nom, cible in INDEXES.items():
+        c.execute(f"CREATE INDEX IF NOT EXISTS {nom} ON {cible}")
+
+    #résumés journaliers et état de la rétention
+    c.execute(ROLLUP_SQL)
+    c.execute("CREATE TABLE IF NOT EXISTS logs_meta (cle TEXT PRIMARY KEY, valeur TEXT)")
+
     conn.commit()
     conn.close()
 
 
-def log_request(data: dict, result: dict, client_ip: str = "127.0.0.1"):
-    """Enregistre une requête et son résultat"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    c.execute('''
-        INSERT INTO logs (
-            timestamp, adresse, arrondissement, surface, pieces, annee, 
-            prix_estime, classification, confiance, ip_client
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+def build_row(data: dict, result: dict, client_ip: str = "127.0.0.1"):
+    """Ligne à insérer (ordre de LOG_COLUMNS) ; l'horodatage est celui de la requête, pas de l'écriture"""
+    timings = result.get('timings_ms', {})
+    return (
         datetime.now().isoformat(),
         data.get('adresse'),
         result['geo_info']['arrondissement'],
@@ -51,8 +131,329 @@ def log_request(data: dict, result: dict, client_ip: str = "127.0.0.1"):
         result.get('prix_m2_estime'),
         result.get('classification'),
         result.get('confiance'),
-        client_ip
-    ))
+        client_ip,
+        result['geo_info'].get('source'),
+        *[timings.get(stage) for stage in TIMING_STAGES]
+    )
+
 
+def log_request(data: dict, result: dict, client_ip: str = "127.0.0.1"):
+    """Enregistre une requête et son résultat (écriture directe, une transaction)"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute(INSERT_SQL, build_row(data, result, client_ip))
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+
+def _connect_lecture():
+    conn = sqlite3.connect(DB_PATH, timeout=5)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _filtres(debut=None, fin=None, arrondissement=None):
+    """Clause WHERE commune : fenêtre [debut, fin[ sur le timestamp ISO, arrondissement optionnel"""
+    clauses, params = [], []
+    if debut is not None:
+        clauses.append("timestamp >= ?")
+        params.append(str(debut))
+    if fin is not None:
+        clauses.append("timestamp < ?")
+        params.append(str(fin))
+    if arrondissement is not None:
+        clauses.append("arrondissement = ?")
+        params.append(int(arrondissement))
+    return clauses, params
+
+
+def encode_cursor(row):
+    return f"{row['timestamp']}|{row['id']}"
+
+
+def decode_cursor(curseur):
+    """'2026-01-08T09:17:06.463897|42' -> (timestamp, id) ; ValueError si mal formé"""
+    timestamp, _, id_ = str(curseur).rpartition("|")
+    if not timestamp:
+        raise ValueError(f"curseur invalide: {curseur}")
+    return timestamp, int(id_)
+
+
+def query_logs(limit=TAILLE_PAGE, curseur=None, debut=None, fin=None, arrondissement=None):
+    """
+    Page de logs, du plus récent au plus ancien.
+    Renvoie {'logs': [...], 'suivant': curseur de la page suivante ou None} ; le curseur est
+    le couple (timestamp, id) de la dernière ligne : le coût d'une page ne dépend pas de sa position.
+    """
+    limit = max(1, min(int(limit), TAILLE_PAGE_MAX))
+    clauses, params = _filtres(debut, fin, arrondissement)
+    if curseur is not None:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(decode_cursor(curseur))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    conn = _connect_lecture()
+    rows = conn.execute(f"SELECT * FROM logs {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+                        params + [limit + 1]).fetchall()
+    conn.close()
+
+    suivant = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {'logs': [dict(r) for r in rows[:limit]], 'suivant': suivant}
+
+
+def _filtres_jour(debut=None, fin=None, arrondissement=None):
+    """Mêmes filtres sur logs_jour, à la journée près (un jour entamé par la fenêtre est compté en entier)"""
+    clauses, params = [], []
+    if debut is not None:
+        clauses.append("jour >= ?")
+        params.append(str(debut)[:10])
+    if fin is not None:
+        clauses.append("jour < ?")
+        params.append(str(fin))
+    if arrondissement is not None:
+        clauses.append("arrondissement = ?")
+        params.append(int(arrondissement))
+    return clauses, params
+
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+#sommes et nombres de valeurs : sur les lignes brutes, puis sur les résumés
+SOMMES_BRUTES = ", ".join(f"TOTAL({m}) AS somme_{m}, COUNT({m}) AS n_{m}" for m in ROLLUP_METRICS)
+SOMMES_JOUR = ", ".join(f"SUM(somme_{m}) AS somme_{m}, SUM(n_{m}) AS n_{m}" for m in ROLLUP_METRICS)
+
+
+def _merge(parties):
+    """Lignes (dicts) de sommes issues de logs et de logs_jour -> n, derniere et moyennes"""
+    total = {'n': 0, 'derniere': None}
+    for partie in parties:
+        total['n'] += partie['n'] or 0
+        if partie['derniere'] and (total['derniere'] is None or partie['derniere'] > total['derniere']):
+            total['derniere'] = partie['derniere']
+        for m in ROLLUP_METRICS:
+            total[f"somme_{m}"] = total.get(f"somme_{m}", 0.0) + (partie[f"somme_{m}"] or 0.0)
+            total[f"n_{m}"] = total.get(f"n_{m}", 0) + (partie[f"n_{m}"] or 0)
+    moyennes = {m: total[f"somme_{m}"] / total[f"n_{m}"] if total[f"n_{m}"] else None for m in ROLLUP_METRICS}
+    return total['n'], total['derniere'], moyennes
+
+
+def summarize_logs(debut=None, fin=None, arrondissement=None):
+    """Nombre d'estimations, dernière activité, prix et confiance moyens, latence moyenne par étape"""
+    clauses, params = _filtres(debut, fin, arrondissement)
+    clauses_jour, params_jour = _filtres_jour(debut, fin, arrondissement)
+
+    conn = _connect_lecture()
+    brut = conn.execute(f"SELECT COUNT(*) AS n, MAX(timestamp) AS derniere, {SOMMES_BRUTES} FROM logs "
+                        f"{_where(clauses)}", params).fetchone()
+    jour = conn.execute(f"SELECT SUM(n) AS n, MAX(derniere) AS derniere, {SOMMES_JOUR} FROM logs_jour "
+                        f"{_where(clauses_jour)}", params_jour).fetchone()
+    conn.close()
+
+    n, derniere, moyennes = _merge([brut, jour])
+    resume = {'n': n, 'derniere': derniere, 'prix_moyen': moyennes['prix_estime'],
+              'confiance_moyenne': moyennes['confiance']}
+    resume.update({col: moyennes[col] for col in TIMING_COLUMNS})
+    return resume
+
+
+def aggregate_logs(par='jour', debut=None, fin=None, arrondissement=None):
+    """Agrégats par jour / heure / arrondissement / source de géocodage, calculés en SQL
+    (lignes brutes + résumés journaliers ; par heure, seulement sur les lignes brutes)"""
+    if par not in GROUPEMENTS:
+        raise ValueError(f"regroupement inconnu: {par} (attendu: {', '.join(GROUPEMENTS)})")
+    clauses, params = _filtres(debut, fin, arrondissement)
+
+    conn = _connect_lecture()
+    parties = {}
+    rows = conn.execute(f"""
+        SELECT {GROUPEMENTS[par]} AS groupe, COUNT(*) AS n, MAX(timestamp) AS derniere, {SOMMES_BRUTES}
+        FROM logs {_where(clauses)}
+        GROUP BY groupe
+    """, params).fetchall()
+    if GROUPEMENTS_JOUR[par] is not None:
+        clauses_jour, params_jour = _filtres_jour(debut, fin, arrondissement)
+        rows += conn.execute(f"""
+            SELECT {GROUPEMENTS_JOUR[par]} AS groupe, SUM(n) AS n, MAX(derniere) AS derniere, {SOMMES_JOUR}
+            FROM logs_jour {_where(clauses_jour)}
+            GROUP BY groupe
+        """, params_jour).fetchall()
+    conn.close()
+    for row in rows:
+        parties.setdefault(row['groupe'], []).append(row)
+
+    resultats = []
+    #groupe NULL (arrondissement ou source inconnus) en tête, comme ORDER BY groupe en SQL
+    for groupe in sorted(parties, key=lambda g: (g is not None, g)):
+        n, _, moyennes = _merge(parties[groupe])
+        resultats.append({'groupe': groupe, 'n': n, 'prix_moyen': moyennes['prix_estime'],
+                          'confiance_moyenne': moyennes['confiance'],
+                          't_geocodage_ms': moyennes['t_geocodage_ms'], 't_total_ms': moyennes['t_total_ms']})
+    return resultats
+
+
+class LogWriter:
+    """
+    writer.enqueue(data, result, client_ip) : non bloquant, la ligne est écrite plus tard par lot
+    writer.flush() : attend que tout ce qui est en file soit en base (False si délai dépassé ou thread arrêté)
+    writer.close() : vide la file et arrête les threads (relançable avec start())
+    Base inaccessible (dossier absent, verrou, disque plein) : les threads réessaient de se connecter,
+    délai doublé à chaque échec ; les lignes attendent dans la file (bornée) jusque-là.
+    maintenance(conn) : appelée toutes les intervalle_maintenance secondes (rétention des logs) par un thread
+    à part, sur sa propre connexion : les lots continuent d'être écrits pendant qu'elle tourne
+    """
+
+    def __init__(self, db_path=None, taille_lot=TAILLE_LOT, delai_flush=DELAI_FLUSH, taille_file=TAILLE_FILE_MAX,
+                 maintenance=None, intervalle_maintenance=INTERVALLE_MAINTENANCE):
+        self.db_path = db_path
+        self.taille_lot = taille_lot
+        self.delai_flush = delai_flush
+        self.maintenance = maintenance
+        self.intervalle_maintenance = intervalle_maintenance
+        self._queue = queue.Queue(maxsize=taille_file)
+        self._thread = None
+        self._thread_maintenance = None
+        self._arret = threading.Event()
+        self._lock = threading.Lock()
+        self.compteurs = {'ecrites': 0, 'lots': 0, 'abandonnees': 0, 'erreurs': 0}
+
+    def start(self):
+        with self._lock:
+            self._arret.clear()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+            if self.maintenance is not None and (self._thread_maintenance is None
+                                                 or not self._thread_maintenance.is_alive()):
+                self._thread_maintenance = threading.Thread(target=self._run_maintenance,
+                                                            name="log-maintenance", daemon=True)
+                self._thread_maintenance.start()
+        return self
+
+    def enqueue(self, data: dict, result: dict, client_ip: str = "127.0.0.1"):
+        self.put_row(build_row(data, result, client_ip))
+
+    def put_row(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.compteurs['abandonnees'] += 1
+                abandonnees = self.compteurs['abandonnees']
+            if abandonnees % 1000 == 1:
+                print(f"File des logs pleine ({self._queue.maxsize} lignes) : {abandonnees} lignes abandonnées")
+
+    def flush(self, timeout=DELAI_FLUSH_MAX):
+        """Attend que la file soit écrite ; False si `timeout` secondes passent ou si le thread d'écriture est arrêté"""
+        fin = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                reste = fin - time.monotonic()
+                thread = self._thread
+                if reste <= 0 or thread is None or not thread.is_alive():
+                    return False
+                self._queue.all_tasks_done.wait(min(reste, 1.0))
+        return True
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            maintenance, self._thread_maintenance = self._thread_maintenance, None
+        self._arret.set()  # le thread d'écriture vide la file puis s'arrête
+        if thread is not None:
+            thread.join()
+        if maintenance is not None:
+            maintenance.join()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path or DB_PATH, timeout=10)
+        try:
+            #WAL : les lectures (page admin) ne bloquent pas l'écriture ; NORMAL : pas de fsync à chaque commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _connect_retry(self, role):
+        """_connect jusqu'à réussite, délai doublé à chaque échec ; None si close() est appelé entre-temps"""
+        attente = RECONNEXION_MIN
+        while True:
+            try:
+                return self._connect()
+            except sqlite3.Error as e:
+                print(f"Logs ({role}) : connexion à {self.db_path or DB_PATH} impossible ({e}), "
+                      f"nouvel essai dans {attente:.1f} s")
+            if self._arret.wait(attente):
+                return None
+            attente = min(2 * attente, RECONNEXION_MAX)
+
+    def _abandon(self):
+        """Arrêt sans connexion : les lignes en file sont comptées en erreurs (flush ne reste pas bloqué)"""
+        perdues = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            perdues += 1
+        if perdues:
+            print(f"Logs : {perdues} lignes perdues, base inaccessible à l'arrêt")
+            self.compteurs['erreurs'] += perdues
+
+    def _write(self, conn, lot):
+        try:
+            with conn:
+                conn.executemany(INSERT_SQL, lot)
+            self.compteurs['ecrites'] += len(lot)
+            self.compteurs['lots'] += 1
+        except sqlite3.Error as e:
+            print(f"Erreur écriture logs ({len(lot)} lignes perdues): {e}")
+            self.compteurs['erreurs'] += len(lot)
+
+    def _maintain(self, conn):
+        try:
+            self.maintenance(conn)
+        except Exception as e:
+            print(f"Erreur maintenance logs: {e}")
+
+    def _run_maintenance(self):
+        conn = self._connect_retry("maintenance")
+        if conn is None:
+            return
+        #dès le démarrage, puis à intervalle régulier jusqu'à close()
+        while True:
+            self._maintain(conn)
+            if self._arret.wait(self.intervalle_maintenance):
+                break
+        conn.close()
+
+    def _run(self):
+        conn = self._connect_retry("écriture")
+        if conn is None:
+            self._abandon()
+            return
+        while True:
+            #attend la première ligne, puis complète le lot jusqu'à TAILLE_LOT ou DELAI_FLUSH ;
+            #après close(), s'arrête dès que la file est vide
+            try:
+                lot = [self._queue.get(timeout=self.delai_flush)]
+            except queue.Empty:
+                if self._arret.is_set():
+                    break
+                continue
+            echeance = time.monotonic() + self.delai_flush
+            while len(lot) < self.taille_lot:
+                try:
+                    lot.append(self._queue.get(timeout=max(0.0, echeance - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._write(conn, lot)
+            for _ in lot:
+                self._queue.task_done()
+        conn.close()
+
+    def stats(self):
+        return dict(self.compteurs, en_file=self._queue.qsize())
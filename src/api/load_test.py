@@ -0,0 +1,254 @@
+"""
+Test de charge de l'API en boucle ouverte, contre une BAN simulée (aucun appel réseau extérieur)
+
+Lance la BAN simulée (ban_stub.py : latence, erreurs 503, blocages réglables) et l'API dans leurs
+propres process (uvicorn seul, ou serve.py avec --workers), puis envoie le trafic :
+    - /predict à un débit cible fixe par palier (--rps), que l'API suive ou non : les requêtes partent
+      à l'heure prévue sans attendre les réponses précédentes (boucle ouverte, comme de vrais clients)
+    - en parallèle, des CSV de --csv-lignes biens sur /predict/csv (--csv-rps), réponse NDJSON lue en entier
+La latence est comptée depuis l'heure d'envoi prévue : si le générateur prend du retard, ce retard
+est dans les percentiles au lieu d'être masqué (coordinated omission).
+Par palier et par route : débit obtenu, p50 / p95 / p99, taux d'erreur et codes HTTP.
+
+    python src/api/load_test.py
+    python src/api/load_test.py --rps 20 50 100 --duree 30 --csv-rps 0.2 --taux-erreur 0.05
+    python src/api/load_test.py --workers 4 --rps 100 200 --sortie charge.json
+    python src/api/load_test.py --url http://127.0.0.1:8000 --rps 10   # API déjà lancée (pas de BAN simulée)
+
+Code de sortie 1 si un seuil (--p99-max, --erreurs-max) est dépassé sur /predict.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.api.bench_concurrence import free_port, wait_ready, run_api
+from src.api.bench_workers import run_server
+
+TIMEOUT = 30.0  # s, au-delà la requête compte comme une erreur 'timeout'
+TAILLE_POOL = 100  # adresses du pool réutilisées avec --repetition (caches de géocodage et de réponses)
+RETARD_MAX_MS = 5.0  # retard moyen d'envoi au-delà duquel le générateur est lui-même saturé
+
+
+def run_stub(port, latence, jitter, taux_erreur, taux_blocage, blocage):
+    from src.api.ban_stub import StubServer, StubConfig, make_handler
+    config = StubConfig(latence_ms=latence, jitter_ms=jitter, taux_erreur=taux_erreur,
+                        taux_blocage=taux_blocage, blocage_s=blocage)
+    StubServer(('127.0.0.1', port), make_handler(config)).serve_forever()
+
+
+class Scenario:
+    """Contenu des requêtes : adresses uniques (géocodage + modèles à chaque fois) ou tirées d'un pool"""
+
+    def __init__(self, repetition=0.0, csv_lignes=200, seed=0):
+        self.repetition = repetition
+        self.csv_lignes = csv_lignes
+        self.random = random.Random(seed)
+        self.run_id = uuid.uuid4().hex[:6]
+        self.n = 0
+
+    def payload(self):
+        self.n += 1
+        if self.random.random() < self.repetition:
+            k = self.random.randrange(TAILLE_POOL)
+            return {'surface': 20 + k, 'pieces': 1 + k % 5, 'annee': 2024, 'adresse': f"{k} rue du pool"}
+        return {'surface': 20 + self.n % 150, 'pieces': 1 + self.n % 5, 'annee': 2024,
+                'adresse': f"{self.n} villa charge {self.run_id}"}
+
+    def csv(self):
+        lignes = ["id;adresse;surface;pieces;annee"]
+        for _ in range(self.csv_lignes):
+            p = self.payload()
+            lignes.append(f"{self.n};{p['adresse']};{p['surface']};{p['pieces']};{p['annee']}")
+        return ("\n".join(lignes) + "\n").encode()
+
+
+async def send_predict(client, scenario):
+    r = await client.post('/predict', json=scenario.payload())
+    return r.status_code
+
+
+async def send_csv(client, scenario):
+    """200 seulement si le flux NDJSON va jusqu'à sa ligne de fin"""
+    async with client.stream('POST', '/predict/csv', content=scenario.csv(),
+                             headers={'Content-Type': 'text/csv'}) as r:
+        dernier = None
+        async for ligne in r.aiter_lines():
+            if ligne:
+                dernier = ligne
+        if r.status_code == 200 and (dernier is None or json.loads(dernier).get('type') != 'fin'):
+            return 'flux_incomplet'
+        return r.status_code
+
+
+async def open_loop(client, envoi, scenario, rps, duree, poisson, rng):
+    """Envois à l'heure prévue pendant `duree` s ; renvoie [(latence ms, code, retard d'envoi ms)]"""
+    loop = asyncio.get_running_loop()
+    resultats, taches = [], []
+
+    async def one(prevu):
+        retard = (loop.time() - prevu) * 1000
+        try:
+            code = await envoi(client, scenario)
+        except httpx.TimeoutException:
+            code = 'timeout'
+        except httpx.TransportError as e:
+            code = type(e).__name__
+        resultats.append(((loop.time() - prevu) * 1000, code, retard))
+
+    debut = loop.time()
+    prevu = debut
+    while prevu - debut < duree:
+        attente = prevu - loop.time()
+        if attente > 0:
+            await asyncio.sleep(attente)
+        taches.append(asyncio.create_task(one(prevu)))
+        prevu += rng.expovariate(rps) if poisson else 1 / rps
+    await asyncio.gather(*taches)
+    return resultats
+
+
+def summarize(resultats, duree):
+    if not resultats:
+        return None
+    latences = np.array([r[0] for r in resultats])
+    codes = {}
+    for _, code, _ in resultats:
+        codes[str(code)] = codes.get(str(code), 0) + 1
+    ok = codes.get('200', 0)
+    return {
+        'envoyees': len(resultats),
+        'debit_obtenu': ok / duree,
+        'p50_ms': float(np.percentile(latences, 50)),
+        'p95_ms': float(np.percentile(latences, 95)),
+        'p99_ms': float(np.percentile(latences, 99)),
+        'taux_erreur': 1 - ok / len(resultats),
+        'codes': codes,
+        'retard_envoi_ms': float(np.mean([r[2] for r in resultats])),
+    }
+
+
+async def palier(url, rps, csv_rps, duree, scenario, poisson, rng):
+    """Un palier : /predict à `rps` et, si demandé, /predict/csv à `csv_rps`, en même temps"""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=url, timeout=TIMEOUT, limits=limits) as client:
+        boucles = {'/predict': open_loop(client, send_predict, scenario, rps, duree, poisson, rng)}
+        if csv_rps:
+            boucles['/predict/csv'] = open_loop(client, send_csv, scenario, csv_rps, duree, poisson, rng)
+        debut = time.perf_counter()
+        sorties = await asyncio.gather(*boucles.values())
+        duree = time.perf_counter() - debut
+    return {route: summarize(r, duree) for route, r in zip(boucles, sorties)}
+
+
+def start_processes(args, tmp_dir):
+    """BAN simulée + API, chacune dans son process ; renvoie (url de l'API, process)"""
+    ctx = mp.get_context("spawn")
+    port_ban, port_api = free_port(), free_port()
+    ban_url = f"http://127.0.0.1:{port_ban}/search/"
+    stub = ctx.Process(target=run_stub, daemon=True,
+                       args=(port_ban, args.latence, args.latence / 10, args.taux_erreur, args.taux_blocage,
+                             args.blocage))
+    stub.start()
+    wait_ready(ban_url)
+    if args.workers:
+        api = ctx.Process(target=run_server, args=(port_api, ban_url, tmp_dir, args.workers))
+    else:
+        api = ctx.Process(target=run_api, args=(port_api, ban_url, tmp_dir), daemon=True)
+    api.start()
+    url = f"http://127.0.0.1:{port_api}"
+    wait_ready(url)
+    time.sleep(0.5 * args.workers)  # tous les workers à l'écoute
+    return url, [api, stub]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'API en boucle ouverte (BAN simulée)")
+    parser.add_argument('--rps', type=float, nargs='+', default=[10, 25, 50], help="débits cibles de /predict")
+    parser.add_argument('--duree', type=float, default=20.0, help="durée de chaque palier (s)")
+    parser.add_argument('--poisson', action='store_true', help="arrivées aléatoires (Poisson) au lieu de régulières")
+    parser.add_argument('--repetition', type=float, default=0.0,
+                        help=f"part des requêtes tirées d'un pool de {TAILLE_POOL} adresses (caches)")
+    parser.add_argument('--csv-rps', type=float, default=0.0, help="débit de fichiers CSV sur /predict/csv")
+    parser.add_argument('--csv-lignes', type=int, default=200, help="biens par fichier CSV")
+    parser.add_argument('--latence', type=float, default=30.0, help="latence de la BAN simulée (ms)")
+    parser.add_argument('--taux-erreur', type=float, default=0.0, help="part des réponses 503 de la BAN simulée")
+    parser.add_argument('--taux-blocage', type=float, default=0.0, help="part des requêtes BAN bloquées")
+    parser.add_argument('--blocage', type=float, default=5.0, help="durée d'un blocage BAN (s)")
+    parser.add_argument('--workers', type=int, default=0, help="lancer l'API via serve.py avec N workers")
+    parser.add_argument('--url', help="API déjà lancée à charger (ni API ni BAN simulée démarrées)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sortie', help="résultats en JSON (comparaison entre deux versions)")
+    parser.add_argument('--p99-max', type=float, help="seuil de p99 (ms) sur /predict")
+    parser.add_argument('--erreurs-max', type=float, help="seuil de taux d'erreur sur /predict (0-1)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scenario = Scenario(args.repetition, args.csv_lignes, args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.url:
+            url, process = args.url, []
+            print(f"API {url}")
+        else:
+            url, process = start_processes(args, tmp_dir)
+            print(f"API {url} ({args.workers or 1} worker(s)) | BAN simulée {args.latence:.0f} ms, "
+                  f"{args.taux_erreur:.0%} d'erreurs, {args.taux_blocage:.0%} de blocages | {os.cpu_count()} cœur(s)")
+        print(f"Paliers de {args.duree:.0f} s, arrivées {'Poisson' if args.poisson else 'régulières'}, "
+              f"{args.repetition:.0%} d'adresses répétées\n")
+
+        asyncio.run(palier(url, args.rps[0], 0, 2.0, scenario, args.poisson, rng))  # échauffement
+        print(f"{'route':<14}{'cible/s':>9}{'obtenu/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'erreurs':>9}  codes")
+        paliers = []
+        for rps in args.rps:
+            stats = asyncio.run(palier(url, rps, args.csv_rps, args.duree, scenario, args.poisson, rng))
+            paliers.append({'rps_cible': rps, 'routes': stats})
+            for route, s in stats.items():
+                if s is None:
+                    continue
+                cible = rps if route == '/predict' else args.csv_rps
+                codes = " ".join(f"{c}:{n}" for c, n in sorted(s['codes'].items()))
+                print(f"{route:<14}{cible:>9g}{s['debit_obtenu']:>10.1f}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+                      f"{s['p99_ms']:>9.1f}{s['taux_erreur']:>9.1%}  {codes}")
+                if s['retard_envoi_ms'] > RETARD_MAX_MS:
+                    print(f"  ATTENTION : envois en retard de {s['retard_envoi_ms']:.0f} ms en moyenne, "
+                          f"le générateur de charge est saturé")
+
+        for p in process:
+            p.terminate()
+            p.join(30)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump({'parametres': vars(args), 'paliers': paliers}, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats écrits dans {args.sortie}")
+
+    depassements = []
+    for p in paliers:
+        s = p['routes']['/predict']
+        if args.p99_max is not None and s['p99_ms'] > args.p99_max:
+            depassements.append(f"{p['rps_cible']:g} req/s : p99 {s['p99_ms']:.0f} ms > {args.p99_max:.0f} ms")
+        if args.erreurs_max is not None and s['taux_erreur'] > args.erreurs_max:
+            depassements.append(f"{p['rps_cible']:g} req/s : {s['taux_erreur']:.1%} d'erreurs > {args.erreurs_max:.1%}")
+    if depassements:
+        print("\nECHEC :\n  " + "\n  ".join(depassements))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
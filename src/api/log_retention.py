@@ -0,0 +1,248 @@
+"""
+Rétention des logs d'estimation : résumés journaliers, archives Parquet et compactage de logs_estimations.db
+
+Pour chaque jour plus ancien que RETENTION_JOURS encore présent dans la table logs :
+    1. les lignes brutes du jour sont écrites dans ARCHIVE_DIR/<année>/<jour>_<id min>-<id max>.parquet
+       (colonnes compressées zstd, relisibles avec read_archive ou pandas)
+    2. une transaction ajoute leurs sommes à logs_jour (jour x arrondissement x source) et les retire de logs
+puis la place libérée est rendue. Les vues d'administration sur plusieurs mois ne lisent plus que
+logs_jour (quelques centaines de lignes par mois) et les lignes brutes des derniers jours.
+L'archive est écrite avant la suppression : une interruption entre les deux réécrit le même fichier
+au passage suivant, sans perte ni doublon dans les résumés.
+
+Dans l'API, le thread de maintenance des logs appelle run_if_due : au plus une rétention par PERIODE_RETENTION,
+tous workers confondus (la date du dernier passage est réservée dans logs_meta). La place y est rendue par
+PRAGMA incremental_vacuum, par tranches de PAGES_PAR_TRANCHE pages : chaque tranche est une courte transaction
+et les écritures des autres workers passent entre deux. Le VACUUM complet (réécriture de toute la base, qui
+bloque les écritures pendant sa durée) n'est fait qu'en ligne de commande, hors des process de l'API (cron).
+
+    python src/api/log_retention.py                  # rétention immédiate sur logs_estimations.db
+    python src/api/log_retention.py --jours 90
+    python src/api/log_retention.py --vacuum         # + VACUUM complet (convertit aussi une base en auto_vacuum incrémental)
+    python src/api/log_retention.py --demo           # base synthétique de 6 mois : tailles et temps des vues
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.config import paths
+from src.api import database
+
+RETENTION_JOURS = 30  # lignes brutes gardées dans logs (la page admin propose 24 h, 7 j, 30 j en détail)
+PERIODE_RETENTION = 24 * 3600  # secondes entre deux rétentions
+ARCHIVE_DIR = paths / "logs_archive"
+COMPRESSION = "zstd"
+PAGES_PAR_TRANCHE = 1000  # pages rendues par transaction d'incremental_vacuum (4 Mo en pages de 4 Ko)
+
+
+def _taille_mo(db_path):
+    return sum(os.path.getsize(f"{db_path}{suffixe}") for suffixe in ("", "-wal")
+               if os.path.exists(f"{db_path}{suffixe}")) / 1e6
+
+
+def _rollup_sql():
+    """Ajoute les sommes des lignes [jour, jour suivant[ d'id <= id max à logs_jour (additif, par clé)"""
+    metrics = database.ROLLUP_METRICS
+    colonnes = ", ".join(f"somme_{m}, n_{m}" for m in metrics)
+    sommes = ", ".join(f"TOTAL({m}), COUNT({m})" for m in metrics)
+    cumuls = ", ".join(f"somme_{m} = somme_{m} + excluded.somme_{m}, n_{m} = n_{m} + excluded.n_{m}"
+                       for m in metrics)
+    return f"""
+        INSERT INTO logs_jour (jour, arrondissement, geocode_source, n, derniere, {colonnes})
+        SELECT substr(timestamp, 1, 10), COALESCE(arrondissement, 0), COALESCE(geocode_source, ''),
+               COUNT(*), MAX(timestamp), {sommes}
+        FROM logs WHERE timestamp >= ? AND timestamp < ? AND id <= ?
+        GROUP BY 1, 2, 3
+        ON CONFLICT (jour, arrondissement, geocode_source) DO UPDATE SET
+            n = n + excluded.n, derniere = max(derniere, excluded.derniere), {cumuls}
+    """
+
+
+def archive_day(conn, jour, archive_dir):
+    """Archive puis résume et retire les lignes brutes d'un jour ; renvoie (lignes, fichier)"""
+    lendemain = (date.fromisoformat(jour) + timedelta(days=1)).isoformat()
+    df = pd.read_sql_query("SELECT * FROM logs WHERE timestamp >= ? AND timestamp < ? ORDER BY id",
+                           conn, params=(jour, lendemain))
+    if df.empty:
+        return 0, None
+    id_max = int(df['id'].max())
+
+    fichier = Path(archive_dir) / jour[:4] / f"{jour}_{int(df['id'].min())}-{id_max}.parquet"
+    fichier.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = fichier.with_suffix(".tmp")
+    df.to_parquet(temporaire, compression=COMPRESSION, index=False)
+    os.replace(temporaire, fichier)
+
+    #résumé et suppression dans la même transaction : une ligne est soit brute, soit résumée
+    with conn:
+        conn.execute(_rollup_sql(), (jour, lendemain, id_max))
+        conn.execute("DELETE FROM logs WHERE timestamp >= ? AND timestamp < ? AND id <= ?", (jour, lendemain, id_max))
+    return len(df), fichier
+
+
+def incremental_vacuum(conn, pages=PAGES_PAR_TRANCHE):
+    """Rend les pages libres par tranches (base en auto_vacuum incrémental) ; renvoie le nombre de tranches"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0  # base créée sans auto_vacuum incrémental : seul un VACUUM complet rend la place
+    tranches = 0
+    while conn.execute("PRAGMA freelist_count").fetchone()[0]:
+        #une page est rendue à chaque pas de l'instruction : execute() n'en fait qu'un, executescript va au bout
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        tranches += 1
+    return tranches
+
+
+def run_retention(conn, db_path=None, retention_jours=RETENTION_JOURS, archive_dir=None, vacuum=False):
+    """
+    Rétention sur une connexion ouverte (hors transaction) ; renvoie un résumé de ce qui a été fait.
+    vacuum=True : VACUUM complet, réservé à la ligne de commande (bloque les écritures des autres process)
+    """
+    db_path = db_path or database.DB_PATH
+    archive_dir = archive_dir or ARCHIVE_DIR
+    debut, taille_avant = time.perf_counter(), _taille_mo(db_path)
+    limite = (date.today() - timedelta(days=retention_jours)).isoformat()
+    jours = [r[0] for r in conn.execute(
+        "SELECT DISTINCT substr(timestamp, 1, 10) FROM logs WHERE timestamp < ? ORDER BY 1", (limite,))]
+
+    archivees, fichiers = 0, []
+    for jour in jours:
+        n, fichier = archive_day(conn, jour, archive_dir)
+        archivees += n
+        if fichier is not None:
+            fichiers.append(fichier)
+
+    if vacuum:
+        #VACUUM réécrit la base sans les pages libérées (et applique auto_vacuum=INCREMENTAL aux anciennes bases),
+        #le checkpoint ramène le WAL à zéro
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    elif archivees:
+        incremental_vacuum(conn)
+        #recopie le WAL dans la base sans attendre les lecteurs en cours : le WAL repart du début
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    return {'jours': len(jours), 'archivees': archivees, 'fichiers': fichiers, 'limite': limite,
+            'taille_avant_mo': taille_avant, 'taille_apres_mo': _taille_mo(db_path),
+            'duree_s': time.perf_counter() - debut}
+
+
+def run_if_due(conn, periode=PERIODE_RETENTION, **kwargs):
+    """
+    Rétention si la dernière date de plus de `periode` secondes (LogWriter.maintenance), sans VACUUM complet.
+    L'UPDATE conditionnel réserve le passage : un seul process le fait, les autres voient la nouvelle date.
+    """
+    maintenant = datetime.now()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO logs_meta (cle, valeur) VALUES ('derniere_retention', '')")
+        reserve = conn.execute(
+            "UPDATE logs_meta SET valeur = ? WHERE cle = 'derniere_retention' AND valeur < ?",
+            (maintenant.isoformat(), (maintenant - timedelta(seconds=periode)).isoformat())).rowcount
+    if not reserve:
+        return None
+    resume = run_retention(conn, **dict(kwargs, vacuum=False))
+    if resume['archivees']:
+        print(f"Rétention des logs : {resume['archivees']} lignes de {resume['jours']} jours archivées, "
+              f"base {resume['taille_avant_mo']:.1f} -> {resume['taille_apres_mo']:.1f} Mo")
+    return resume
+
+
+def read_archive(debut=None, fin=None, archive_dir=None):
+    """Lignes brutes archivées dans [debut, fin[ (dates ISO), sans ouvrir les fichiers hors fenêtre"""
+    fichiers = sorted(Path(archive_dir or ARCHIVE_DIR).glob("*/*.parquet"))
+    #le nom commence par le jour des lignes qu'il contient
+    fichiers = [f for f in fichiers if (debut is None or f.name[:10] >= str(debut)[:10])
+                and (fin is None or f.name[:10] < str(fin))]
+    if not fichiers:
+        return pd.DataFrame(columns=['id'] + database.LOG_COLUMNS)
+    df = pd.concat([pd.read_parquet(f) for f in fichiers], ignore_index=True)
+    if debut is not None:
+        df = df[df['timestamp'] >= str(debut)]
+    if fin is not None:
+        df = df[df['timestamp'] < str(fin)]
+    return df
+
+
+def demo(mois=6, lignes_par_jour=2000):
+    """Base synthétique : taille et temps des vues de la page admin avant / après rétention"""
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / "logs_demo.db"
+        database.init_db()
+        rng = random.Random(0)
+        aujourd_hui = datetime.combine(date.today(), datetime.min.time())
+        rows = []
+        for j in range(mois * 30, -1, -1):
+            for _ in range(lignes_par_jour):
+                ts = aujourd_hui - timedelta(days=j) + timedelta(seconds=rng.uniform(0, 86399))
+                rows.append((ts.isoformat(), f"{rng.randint(1, 99)} rue de la demo", rng.randint(1, 20),
+                             rng.uniform(15, 150), rng.randint(1, 6), 2024, rng.gauss(10500, 2000),
+                             rng.choice(["Bon marché", "Normal", "Cher"]), rng.uniform(40, 95), "127.0.0.1",
+                             rng.choice(["dvf", "ban", "cache_memoire", "cache_disque", "cache_reponse"]),
+                             *[rng.uniform(0.1, 50) for _ in database.TIMING_COLUMNS]))
+        conn = sqlite3.connect(database.DB_PATH)
+        with conn:
+            conn.executemany(database.INSERT_SQL, rows)
+        conn.close()
+
+        def vues():
+            debut = time.perf_counter()
+            resume = database.summarize_logs()
+            for par in ('jour', 'arrondissement', 'source'):
+                database.aggregate_logs(par)
+            return resume, (time.perf_counter() - debut) * 1000
+
+        print(f"Base synthétique : {len(rows):,} lignes sur {mois} mois ({lignes_par_jour} par jour)")
+        avant, t_avant = vues()
+        conn = sqlite3.connect(database.DB_PATH)
+        resume = run_retention(conn, archive_dir=Path(tmp) / "archive")
+        conn.close()
+        apres, t_apres = vues()
+        taille_archive = sum(f.stat().st_size for f in resume['fichiers']) / 1e6
+
+        print(f"Rétention : {resume['archivees']:,} lignes de {resume['jours']} jours archivées "
+              f"en {resume['duree_s']:.1f} s ({len(resume['fichiers'])} fichiers Parquet, {taille_archive:.1f} Mo)")
+        print(f"Base : {resume['taille_avant_mo']:.1f} Mo -> {resume['taille_apres_mo']:.1f} Mo")
+        print(f"Vues 'Tout' (résumé + 3 agrégats) : {t_avant:.0f} ms -> {t_apres:.0f} ms")
+        identiques = avant['n'] == apres['n'] and abs(avant['prix_moyen'] - apres['prix_moyen']) < 1e-6
+        print(f"Mêmes totaux avant / après : {'oui' if identiques else 'NON'} "
+              f"({apres['n']:,} estimations, prix moyen {apres['prix_moyen']:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rétention des logs d'estimation (résumés, archives, compactage)")
+    parser.add_argument('--jours', type=int, default=RETENTION_JOURS, help="jours de lignes brutes gardés")
+    parser.add_argument('--archives', type=Path, default=ARCHIVE_DIR, help="dossier des fichiers Parquet")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM complet après la rétention (cron, hors API)")
+    parser.add_argument('--demo', action='store_true', help="démonstration sur une base synthétique")
+    args = parser.parse_args()
+
+    if args.demo:
+        demo()
+        return
+    if not database.DB_PATH.exists():
+        print(f"Base absente : {database.DB_PATH}")
+        sys.exit(1)
+    database.init_db()
+    conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    resume = run_retention(conn, retention_jours=args.jours, archive_dir=args.archives, vacuum=args.vacuum)
+    conn.close()
+    print(f"{resume['archivees']} lignes de {resume['jours']} jours (avant le {resume['limite']}) archivées "
+          f"dans {args.archives}")
+    print(f"Base : {resume['taille_avant_mo']:.1f} Mo -> {resume['taille_apres_mo']:.1f} Mo "
+          f"({resume['duree_s']:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,15 @@
 Point d'entrée de l'API FastAPI pour l'estimation immobilière à Paris.
 """
 import sys
+import json
+import atexit
+from time import perf_counter
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
 
 # Hack Path pour trouver src
@@ -13,12 +19,39 @@ if root_path not in sys.path:
     sys.path.insert(0, root_path)
 
 from src.dashboard.utils.ml_predictor import get_predictor
-from src.api.database import init_db, log_request
+from src.dashboard.utils.ban_client import LONGUEUR_MIN_ADRESSE, LONGUEUR_MAX_ADRESSE
+from src.api.database import init_db, LogWriter, query_logs, summarize_logs, aggregate_logs, TAILLE_PAGE
+from src.dashboard.utils.latency import STAGE_HISTOGRAMS
+from src.api.response_cache import ResponseCache, response_key
+from src.api.metrics import REGISTRY, CONTENT_TYPE, ERRORS, MetricsMiddleware, register_api_metrics
+from src.api import admission, log_retention
+from src.api.csv_valuation import iter_lines, read_header, valuate_lines
+from src.api.stats_tables import StatsTables, not_modified, MAX_AGE
 
 # Initialisation
-app = FastAPI(title="API Estimation Immo Paris", version="1.0")
 predictor = get_predictor()  # Charge le modèle au démarrage
 init_db()  # Crée la DB
+#écriture des logs par lots, hors du chemin des requêtes ; le même thread applique la rétention une fois par jour
+log_writer = LogWriter(maintenance=log_retention.run_if_due).start()
+atexit.register(log_writer.close)  # sans lifespan (TestClient hors `with`, import direct)
+response_cache = ResponseCache()  # réponses de /predict déjà calculées, vidé à chaque nouvelle version des modèles
+stats_tables = StatsTables()  # agrégats DVF / IRCOM précalculés pour /stats
+
+
+@asynccontextmanager
+async def lifespan(app):
+    log_writer.start()
+    yield
+    #arrêt du serveur : les logs encore en file sont écrits avant de quitter
+    log_writer.close()
+
+
+app = FastAPI(title="API Estimation Immo Paris", version="1.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)  # compte et chronomètre chaque requête pour /metrics
+register_api_metrics(predictor, log_writer, response_cache)
+rate_limiter = admission.RateLimiter()  # débit par ip_client
+admission_controller = admission.AdmissionController()  # estimations simultanées et file d'attente bornées
+admission.register_metrics(admission_controller)
 
 
 # Modèle de données (Validation des entrées)
@@ -26,7 +59,8 @@ class EstimationRequest(BaseModel):
     surface: float
     pieces: int
     annee: int
-    adresse: str
+    #longueurs acceptées par la BAN : une saisie hors limites est une 422, pas un appel refusé
+    adresse: str = Field(min_length=LONGUEUR_MIN_ADRESSE, max_length=LONGUEUR_MAX_ADRESSE)
 
 
 @app.get("/")
@@ -34,31 +68,169 @@ def read_root():
     return {"status": "online", "message": "API de prédiction immobilière opérationnelle"}
 
 
+@app.get("/timings")
+def read_timings():
+    """Histogrammes des durées par étape depuis le démarrage du process (ms)"""
+    return STAGE_HISTOGRAMS.snapshot()
+
+
+@app.get("/metrics")
+def read_metrics():
+    """Compteurs, histogrammes de latence et jauges au format texte Prometheus"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/geocode-cache")
+def read_geocode_cache():
+    """Compteurs du cache de géocodage de ce process (hits mémoire/disque, misses, temps BAN économisé)
+    et du client BAN asynchrone (tentatives, échecs, état du disjoncteur)"""
+    return dict(predictor.geocode_cache.stats(), ban=predictor.ban_client_async.stats())
+
+
+@app.get("/response-cache")
+def read_response_cache():
+    """Compteurs du cache de réponses de /predict (hits, misses, évictions, invalidations) pour le dimensionner"""
+    return response_cache.stats()
+
+
+def stats_response(req_info, table, **filtres):
+    """Réponse JSON précalculée, ou 304 si le client a déjà cette version (If-None-Match)"""
+    try:
+        corps, etag = stats_tables.response(table, **filtres)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={MAX_AGE}'}
+    if not_modified(req_info.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(corps, media_type="application/json", headers=headers)
+
+
+#async : simple lecture en mémoire, pas de passage par le pool de threads
+@app.get("/stats/arrondissements")
+async def read_stats_arrondissements(req_info: Request):
+    """Prix au m² (moyenne, médiane, quartiles, extrêmes), transactions, surface et valeur moyennes par arrondissement"""
+    return stats_response(req_info, 'arrondissements')
+
+
+@app.get("/stats/temporal")
+async def read_stats_temporal(req_info: Request, arr: Optional[int] = None,
+                              debut: Optional[int] = Query(None, alias="from"),
+                              fin: Optional[int] = Query(None, alias="to")):
+    """Prix au m² et transactions par année et arrondissement (?arr=11&from=2021&to=2024)"""
+    return stats_response(req_info, 'temporel', arr=arr, debut=debut, fin=fin)
+
+
+@app.get("/stats/accessibilite")
+async def read_stats_accessibilite(req_info: Request):
+    """Années de revenu fiscal moyen d'un foyer pour acheter un T2 de 45 m², par arrondissement"""
+    return stats_response(req_info, 'accessibilite')
+
+
+@app.get("/logs")
+def read_logs(limit: int = TAILLE_PAGE, curseur: Optional[str] = None, debut: Optional[str] = None,
+              fin: Optional[str] = None, arrondissement: Optional[int] = None):
+    """Logs du plus récent au plus ancien ; `suivant` est le curseur à repasser pour la page suivante.
+    debut / fin : dates ou horodatages ISO (fin exclue)"""
+    try:
+        return query_logs(limit, curseur, debut, fin, arrondissement)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/logs/resume")
+def read_logs_summary(debut: Optional[str] = None, fin: Optional[str] = None, arrondissement: Optional[int] = None):
+    """Nombre d'estimations, dernière activité, moyennes de prix, confiance et latences"""
+    return summarize_logs(debut, fin, arrondissement)
+
+
+@app.get("/logs/agregats")
+def read_logs_aggregates(par: str = 'jour', debut: Optional[str] = None, fin: Optional[str] = None,
+                         arrondissement: Optional[int] = None):
+    """Comptes et moyennes par jour, heure, arrondissement ou source de géocodage"""
+    try:
+        return aggregate_logs(par, debut, fin, arrondissement)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/predict")
-async def predict(request: EstimationRequest, req_info: Request):
-    """Endpoint principal pour l'estimation"""
+async def predict(request: EstimationRequest, req_info: Request, timings: bool = False):
+    """Endpoint principal pour l'estimation (?timings=true pour avoir les durées par étape)"""
     try:
-        #appel au modèle
-        result = predictor.estimate_complet(
-            surface_m2=request.surface,
-            nb_pieces=request.pieces,
-            annee=request.annee,
-            address_str=request.adresse
-        )
-
-        if 'error' in result:
-            raise HTTPException(status_code=400, detail=result['error'])
-
-        # Logging en base de données
+        #client trop rapide : refusé avant tout travail
         client_ip = req_info.client.host
-        log_request(request.dict(), result, client_ip)
+        rate_limiter.check(client_ip)
+
+        #même requête déjà estimée avec la même version des modèles : réponse en cache
+        debut = perf_counter()
+        cle = response_key(request.adresse, request.surface, request.pieces, request.annee)
+        version = predictor.check_model_version()
+        result = response_cache.get(cle, version)
+        if result is not None:
+            result['geo_info']['source'] = 'cache_reponse'
+            result['timings_ms'] = {'total': (perf_counter() - debut) * 1000}
+        else:
+            #appel au modèle : géocodage asynchrone, modèles dans le pool de calcul -> la boucle reste libre
+            #une place parmi CONCURRENCE_MAX, sinon attente bornée puis 503
+            async with admission_controller.slot():
+                result = await predictor.estimate_complet_async(
+                    surface_m2=request.surface,
+                    nb_pieces=request.pieces,
+                    annee=request.annee,
+                    address_str=request.adresse
+                )
 
+            if 'error' in result:
+                #adresse introuvable : erreur du client ; BAN en panne : réessayable
+                cause = result.get('cause', 'adresse_introuvable')
+                ERRORS.inc(cause=cause)
+                raise HTTPException(status_code=503 if cause == 'ban_indisponible' else 400, detail=result['error'])
+            response_cache.put(cle, result, version)
+
+        # Logging en base de données (mise en file, écrit par lots en arrière-plan)
+        log_writer.enqueue(request.dict(), result, client_ip)
+
+        if not timings:
+            result.pop('timings_ms', None)
         return result
 
+    except HTTPException:
+        raise
+    except admission.Rejected as e:
+        raise HTTPException(status_code=e.status, detail=str(e), headers={'Retry-After': str(e.retry_after)})
     except Exception as e:
+        ERRORS.inc(cause='modele')
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/predict/csv")
+async def predict_csv(req_info: Request):
+    """
+    Valorisation d'un CSV envoyé en flux (colonnes adresse, surface, pieces, annee ; id optionnel).
+    Réponse NDJSON au fil de l'eau : une ligne par bien, une ligne de progression par bloc, une ligne de fin.
+    """
+    try:
+        rate_limiter.check(req_info.client.host)
+    except admission.Rejected as e:
+        raise HTTPException(status_code=e.status, detail=str(e), headers={'Retry-After': str(e.retry_after)})
+
+    #en-tête lu avant de répondre : un fichier mal formé donne un 400, pas un flux en erreur
+    lignes = iter_lines(req_info.stream())
+    try:
+        sep, colonnes = await read_header(lignes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def ndjson():
+        #chaque bloc prend une place comme un /predict : un gros CSV ne monopolise pas les estimations
+        async for record in valuate_lines(predictor, lignes, sep, colonnes, admission_controller=admission_controller):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     #serveur sur le port 8000
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
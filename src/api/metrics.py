@@ -0,0 +1,272 @@
+"""
+Métriques de l'API au format texte Prometheus (GET /metrics)
+
+Registre en mémoire du process, sans dépendance :
+    - Counter : compteurs par jeu de labels (requêtes par route / code HTTP, erreurs par cause)
+    - Histogram : réutilise LatencyHistogram (latency.py), un par jeu de labels
+    - Gauge : valeur lue au moment du scrape (profondeur de la file de logs, taille des caches...)
+Sur le chemin des requêtes : un incrément ou un bisect sous verrou, le formatage n'a lieu qu'au scrape.
+Les durées sont stockées en ms (comme STAGE_HISTOGRAMS) et exposées en secondes, unité Prometheus.
+"""
+import math
+import threading
+from time import perf_counter
+
+from src.dashboard.utils.latency import LatencyHistogram, STAGE_HISTOGRAMS
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    paires = []
+    for nom, valeur in zip(labelnames, values):
+        valeur = str(valeur).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        paires.append(f'{nom}="{valeur}"')
+    return "{" + ",".join(paires) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    type = "counter"
+    suffixe = "_total"  # nom des échantillons, repris par # HELP / # TYPE (format 0.0.4)
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        cle = tuple(labels.get(nom, "") for nom in self.labelnames)
+        with self._lock:
+            self._values[cle] = self._values.get(cle, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(nom, "") for nom in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            valeurs = list(self._values.items())
+        for cle, valeur in valeurs:
+            yield self.name + self.suffixe, _format_labels(self.labelnames, cle), valeur
+
+
+class Histogram:
+    """Un LatencyHistogram (ms) par jeu de labels ; exposé en secondes"""
+    type = "histogram"
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, ms, **labels):
+        cle = tuple(labels.get(nom, "") for nom in self.labelnames)
+        hist = self._histograms.get(cle)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(cle, LatencyHistogram())
+        hist.observe(ms)
+
+    def items(self):
+        with self._lock:
+            return list(self._histograms.items())
+
+    def samples(self):
+        for cle, hist in self.items():
+            yield from histogram_samples(self.name, self.labelnames, cle, hist)
+
+
+def histogram_samples(name, labelnames, values, hist):
+    """Lignes _bucket (cumulées, bornes en secondes), _sum et _count d'un LatencyHistogram"""
+    with hist._lock:
+        counts, count, total = list(hist.counts), hist.count, hist.sum
+    cumul = 0
+    for borne, n in zip(hist.buckets + (float('inf'),), counts):
+        cumul += n
+        le = "+Inf" if math.isinf(borne) else repr(borne / 1000)
+        yield name + "_bucket", _format_labels(labelnames + ("le",), values + (le,)), cumul
+    yield name + "_sum", _format_labels(labelnames, values), total / 1000
+    yield name + "_count", _format_labels(labelnames, values), count
+
+
+class Gauge:
+    """Valeur calculée au scrape : fonction -> nombre, ou {tuple de labels: nombre}"""
+    type = "gauge"
+
+    def __init__(self, name, description, fonction, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.fonction = fonction
+
+    def samples(self):
+        valeur = self.fonction()
+        if isinstance(valeur, dict):
+            for cle, v in valeur.items():
+                yield self.name, _format_labels(self.labelnames, cle), v
+        else:
+            yield self.name, "", valeur
+
+
+class CounterFunction(Gauge):
+    """Compteur tenu ailleurs (stats() d'un cache, du LogWriter...) et lu au scrape"""
+    type = "counter"
+    suffixe = "_total"
+
+    def samples(self):
+        for nom, labels, valeur in super().samples():
+            yield nom + self.suffixe, labels, valeur
+
+
+class StageHistogramsCollector:
+    """Expose STAGE_HISTOGRAMS (durées par étape de estimate_complet) sans les dupliquer"""
+    type = "histogram"
+
+    def __init__(self, name, description, histograms=STAGE_HISTOGRAMS):
+        self.name = name
+        self.description = description
+        self.histograms = histograms
+
+    def samples(self):
+        for stage, hist in self.histograms.items():
+            yield from histogram_samples(self.name, ("stage",), (stage,), hist)
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labelnames=()):
+        return self.register(Counter(name, description, labelnames))
+
+    def histogram(self, name, description, labelnames=()):
+        return self.register(Histogram(name, description, labelnames))
+
+    def gauge(self, name, description, fonction, labelnames=()):
+        return self.register(Gauge(name, description, fonction, labelnames))
+
+    def counter_function(self, name, description, fonction, labelnames=()):
+        return self.register(CounterFunction(name, description, fonction, labelnames))
+
+    def render(self):
+        """Format d'exposition texte Prometheus 0.0.4"""
+        lignes = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                #une jauge en erreur ne doit pas faire tomber tout le scrape
+                print(f"Erreur métrique {metric.name}: {e}")
+                continue
+            #HELP et TYPE portent le nom des échantillons (api_requests_total), comme prometheus_client
+            nom = metric.name + getattr(metric, 'suffixe', "")
+            lignes.append(f"# HELP {nom} {metric.description}")
+            lignes.append(f"# TYPE {nom} {metric.type}")
+            for nom, labels, valeur in samples:
+                lignes.append(f"{nom}{labels} {_format_value(valeur)}")
+        return "\n".join(lignes) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter("api_requests", "Requêtes HTTP traitées, par route et code de réponse",
+                            ("route", "status"))
+REQUEST_LATENCY = REGISTRY.histogram("api_request_duration_seconds",
+                                     "Durée de bout en bout des requêtes HTTP, par route", ("route",))
+ERRORS = REGISTRY.counter("estimation_errors",
+                          "Estimations en échec, par cause (adresse_introuvable, ban_indisponible, modele)", ("cause",))
+REGISTRY.register(StageHistogramsCollector("estimation_stage_duration_seconds",
+                                           "Durée de chaque étape d'une estimation calculée"))
+
+
+def register_api_metrics(predictor, log_writer, response_cache, registry=REGISTRY):
+    """Jauges et compteurs lus au scrape sur les objets de l'API (rien n'est ajouté à leur chemin chaud)"""
+    registry.gauge("model_info", "Version (empreinte des fichiers de models/) des modèles chargés",
+                   lambda: {(predictor.model_version,): 1}, ("version",))
+
+    registry.gauge("log_writer_queue_depth", "Lignes de log en attente d'écriture",
+                   lambda: log_writer.stats()['en_file'])
+    registry.counter_function("log_writer_rows", "Lignes de log par issue (ecrites, abandonnees, erreurs)",
+                              lambda: {(etat,): log_writer.compteurs[etat]
+                                       for etat in ('ecrites', 'abandonnees', 'erreurs')}, ("etat",))
+    registry.counter_function("log_writer_batches", "Transactions d'écriture des logs",
+                              lambda: log_writer.compteurs['lots'])
+
+    registry.counter_function("response_cache_requests", "Consultations du cache de réponses de /predict",
+                              lambda: {('hit',): response_cache.compteurs['hits'],
+                                       ('miss',): response_cache.compteurs['misses']}, ("resultat",))
+    registry.counter_function("response_cache_evictions", "Réponses évincées (LRU plein)",
+                              lambda: response_cache.compteurs['evictions'])
+    registry.counter_function("response_cache_invalidations", "Vidages du cache sur changement de version des modèles",
+                              lambda: response_cache.compteurs['invalidations'])
+    registry.gauge("response_cache_entries", "Réponses en cache", lambda: response_cache.stats()['taille'])
+    registry.gauge("response_cache_hit_ratio", "Part des requêtes servies par le cache de réponses",
+                   lambda: response_cache.stats()['taux_hit'])
+
+    geocode_cache = predictor.geocode_cache
+    registry.counter_function("geocode_cache_requests", "Consultations du cache de géocodage",
+                              lambda: {(r,): geocode_cache.compteurs[r]
+                                       for r in ('hits_memoire', 'hits_disque', 'misses')}, ("resultat",))
+    registry.gauge("geocode_cache_hit_ratio", "Part des géocodages (hors index DVF) servis par le cache",
+                   lambda: geocode_cache.stats()['taux_hit'])
+
+    batcher = predictor.batcher
+    registry.counter_function("model_batches", "Appels groupés des modèles (micro-batching)",
+                              lambda: batcher.compteurs['lots'])
+    registry.counter_function("model_batch_rows", "Estimations passées par les appels groupés",
+                              lambda: batcher.compteurs['lignes'])
+
+    ban = predictor.ban_client_async
+    registry.counter_function("ban_requests", "Appels au client BAN asynchrone (appels, tentatives, échecs, refus)",
+                              lambda: {(k,): v for k, v in ban.compteurs.items()}, ("type",))
+    registry.gauge("ban_circuit_open", "1 si le disjoncteur BAN est ouvert ou semi-ouvert",
+                   lambda: int(ban.breaker.etat != 'ferme'))
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (plus léger qu'un BaseHTTPMiddleware) : compte et chronomètre chaque requête HTTP.
+    La route est le chemin déclaré (/logs, /predict...) et pas l'URL, pour borner le nombre de séries.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        debut = perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "inconnue"
+            REQUESTS.inc(route=route, status=status[0])
+            REQUEST_LATENCY.observe((perf_counter() - debut) * 1000, route=route)
@@ -0,0 +1,86 @@
+"""
+Cache des réponses de /predict pour les requêtes répétées
+
+Le formulaire Streamlit et les clients de l'API renvoient souvent le même tuple
+(adresse, surface, pièces, année) : on garde la réponse complète pour éviter géocodage et modèles.
+    - clé normalisée : adresse comme dans le cache de géocodage, surface arrondie au centième
+    - mémoire bornée : au plus TAILLE_MAX réponses, éviction LRU, expiration après TTL secondes
+    - chaque entrée porte la version des modèles : si elle change (réentraînement), le cache est vidé
+Les erreurs (adresse introuvable...) ne sont pas mises en cache.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from src.dashboard.utils.geocode_cache import normalize_address
+
+TAILLE_MAX = 10000  # ~2 Ko par réponse
+TTL = 3600  # secondes : les géocodages et l'index DVF peuvent évoluer sans changer de version de modèle
+
+
+def response_key(adresse, surface, pieces, annee):
+    """('10, Rue de Rivoli', 50.0, 2, 2024) et ('10 rue de rivoli', 50, 2, 2024) -> même clé"""
+    return normalize_address(adresse), round(float(surface), 2), int(pieces), int(annee)
+
+
+class ResponseCache:
+    """
+    cache.get(cle, version) -> réponse (copie) ou None
+    cache.put(cle, reponse, version)
+    """
+
+    def __init__(self, taille_max=TAILLE_MAX, ttl=TTL):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self.version = None
+        self._entrees = OrderedDict()  # clé -> (expiration, réponse)
+        self._lock = threading.Lock()
+        self.compteurs = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _check_version(self, version):
+        #appelé sous le verrou : une nouvelle version de modèle rend toutes les réponses obsolètes
+        if version != self.version:
+            if self._entrees:
+                self.compteurs['invalidations'] += 1
+            self._entrees.clear()
+            self.version = version
+
+    def get(self, cle, version):
+        with self._lock:
+            self._check_version(version)
+            entree = self._entrees.get(cle)
+            if entree is not None and entree[0] <= time.monotonic():
+                del self._entrees[cle]
+                self.compteurs['expirations'] += 1
+                entree = None
+            if entree is None:
+                self.compteurs['misses'] += 1
+                return None
+            self._entrees.move_to_end(cle)
+            self.compteurs['hits'] += 1
+        #copie : l'appelant modifie la réponse (timings, source)
+        return copy.deepcopy(entree[1])
+
+    def put(self, cle, reponse, version):
+        reponse = copy.deepcopy(reponse)
+        reponse.pop('timings_ms', None)
+        with self._lock:
+            self._check_version(version)
+            self._entrees[cle] = (time.monotonic() + self.ttl, reponse)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+                self.compteurs['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entrees.clear()
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.compteurs, taille=len(self._entrees), taille_max=self.taille_max,
+                     version_modele=self.version)
+        total = c['hits'] + c['misses']
+        c['taux_hit'] = c['hits'] / total if total else None
+        return c
@@ -0,0 +1,149 @@
+"""
+Lanceur de production de l'API : un master qui charge tout, N workers forkés
+
+    - le master importe l'API une seule fois : modèles, arbres quantiles, index d'adresses DVF,
+      grille des arrondissements ; les workers forkés partagent ces tableaux en lecture
+      (copy-on-write, gc.freeze() pour que le ramasse-miettes ne recopie pas les pages)
+    - la socket d'écoute est ouverte par le master et partagée : le noyau répartit les connexions
+    - BLAS / OpenMP limités à THREADS_PAR_WORKER par worker (HGBR lance sinon un thread par cœur
+      dans chaque worker : N x cœurs threads pour cœurs CPU)
+    - un worker qui meurt est relancé ; SIGINT / SIGTERM arrêtent proprement tous les workers
+
+Chaque worker garde ses propres caches (réponses, LRU de géocodage) et ses propres compteurs /metrics.
+Linux / macOS uniquement (fork).
+
+    python src/api/serve.py --workers 4
+    python src/api/serve.py --workers 2 --port 8080 --threads-par-worker 2
+"""
+import os
+import sys
+import gc
+import time
+import random
+import signal
+import socket
+import argparse
+from pathlib import Path
+
+THREADS_PAR_WORKER = 1
+THREADS_ENV = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+#avant numpy / sklearn : les runtimes OpenMP et BLAS lisent ces variables au chargement
+for _var in THREADS_ENV:
+    os.environ.setdefault(_var, str(THREADS_PAR_WORKER))
+
+import uvicorn
+from threadpoolctl import threadpool_limits
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+
+def pin_threads(n=THREADS_PAR_WORKER):
+    """Variables d'environnement (bibliothèques pas encore chargées) et threadpoolctl (déjà chargées)"""
+    for var in THREADS_ENV:
+        os.environ[var] = str(n)
+    threadpool_limits(limits=n)
+
+
+def preload():
+    """Import de l'API dans le master ; rien qui ne survive mal au fork (thread d'écriture des logs)"""
+    import src.api.main as api
+    #le thread d'écriture et sa connexion SQLite ne passent pas le fork : chaque worker relance le sien (lifespan)
+    api.log_writer.close()
+    #objets chargés déplacés hors des générations suivies : le GC ne touche plus leurs pages partagées
+    gc.collect()
+    gc.freeze()
+    return api
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, threads, log_level):
+    """Dans le process forké : limites de threads, graine aléatoire propre, serveur uvicorn sur la socket partagée"""
+    random.seed()
+    pin_threads(threads)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(app, host="127.0.0.1", port=8000, workers=None, threads=THREADS_PAR_WORKER, log_level="info"):
+    workers = workers or os.cpu_count() or 1
+    sock = bind_socket(host, port)
+    enfants = {}
+    arret = False
+
+    def fork_worker(numero):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(app, sock, threads, log_level)
+            except BaseException as e:
+                print(f"Worker {numero} arrêté: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        enfants[pid] = numero
+
+    def stop(signum, frame):
+        nonlocal arret
+        arret = True
+        for pid in list(enfants):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for numero in range(workers):
+        fork_worker(numero)
+    print(f"API sur http://{host}:{port} : {workers} workers, {threads} thread(s) BLAS/OpenMP chacun "
+          f"(master pid {os.getpid()})")
+
+    while enfants:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        numero = enfants.pop(pid, None)
+        if numero is not None and not arret:
+            print(f"Worker {numero} (pid {pid}) terminé (code {os.waitstatus_to_exitcode(status)}), relance")
+            time.sleep(0.5)
+            fork_worker(numero)
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API d'estimation, master + workers forkés")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads-par-worker', type=int, default=THREADS_PAR_WORKER)
+    parser.add_argument('--log-level', default="info")
+    args = parser.parse_args()
+
+    pin_threads(args.threads_par_worker)
+    debut = time.perf_counter()
+    api = preload()
+    print(f"Modèles et index chargés en {time.perf_counter() - debut:.1f}s (version {api.predictor.model_version})")
+    serve(api.app, args.host, args.port, args.workers, args.threads_par_worker, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Statistiques agrégées de l'API (GET /stats/...) servies depuis des tables précalculées en mémoire
+
+Les agrégats par arrondissement / année (ceux de tableau_prep.py et de viz croisee) sont calculés une fois
+au démarrage à partir du CSV DVF nettoyé (et d'IRCOM pour l'accessibilité), au lieu d'être refaits
+par chaque page ou client à partir des fichiers complets :
+    - chaque réponse (table + filtres) est sérialisée en JSON une seule fois, avec son ETag (hash du contenu)
+    - un client qui renvoie If-None-Match reçoit un 304 sans corps : on peut interroger souvent
+    - si les fichiers sources changent, les tables sont recalculées dans un thread, les anciennes
+      restent servies d'ici là
+"""
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from time import monotonic
+
+import numpy as np
+import pandas as pd
+from src.config import paths
+
+DVF_PATH = paths.data / "DVF/geocodes/cleaned/dvf_paris_2020-2025-exploitables-clean.csv"
+IRCOM_PATH = paths.data / "fiscal/cleaned/ircom_2020-2023_paris_clean.csv"
+DVF_COLONNES = ['code_arrondissement', 'annee', 'type_local', 'prix_m2', 'surface_m2_retenue', 'valeur_fonciere']
+
+INTERVALLE_VERIF = 30.0  # secondes entre deux stat() des fichiers sources
+MAX_AGE = 60  # Cache-Control : les clients peuvent garder une réponse 60 s sans revalider
+SURFACE_T2 = 45  # m², référence de l'indicateur d'accessibilité (comme viz croisee)
+
+
+def sources_fingerprint(sources):
+    """Empreinte (nom, taille, date de modification) des fichiers sources présents"""
+    h = hashlib.sha1()
+    for path in sources:
+        try:
+            infos = os.stat(path)
+        except FileNotFoundError:
+            continue
+        h.update(f"{path.name}:{infos.st_size}:{infos.st_mtime_ns};".encode())
+    return h.hexdigest()[:12]
+
+
+def _records(df):
+    """DataFrame -> liste de dicts JSON (NaN -> null, types numpy -> types Python)"""
+    df = df.round(2).astype(object).where(df.notna(), None)
+    return df.to_dict(orient='records')
+
+
+def build_arrondissements(dvf):
+    g = dvf.groupby('arrondissement')
+    df = pd.DataFrame({
+        'prix_m2_moyen': g['prix_m2'].mean(),
+        'prix_m2_median': g['prix_m2'].median(),
+        'prix_m2_q1': g['prix_m2'].quantile(0.25),
+        'prix_m2_q3': g['prix_m2'].quantile(0.75),
+        'prix_m2_min': g['prix_m2'].min(),
+        'prix_m2_max': g['prix_m2'].max(),
+        'nombre_transactions': g.size(),
+        'surface_moyenne': g['surface_m2_retenue'].mean(),
+        'valeur_moyenne': g['valeur_fonciere'].mean(),
+    }).reset_index()
+    return _records(df)
+
+
+def build_temporel(dvf):
+    g = dvf.groupby(['annee', 'arrondissement'])
+    df = pd.DataFrame({
+        'prix_m2_moyen': g['prix_m2'].mean(),
+        'prix_m2_median': g['prix_m2'].median(),
+        'nombre_transactions': g.size(),
+        'surface_moyenne': g['surface_m2_retenue'].mean(),
+    }).reset_index().sort_values(['arrondissement', 'annee'])
+    #évolution du prix médian par rapport à l'année précédente du même arrondissement
+    df['variation_median_pct'] = df.groupby('arrondissement')['prix_m2_median'].pct_change() * 100
+    return _records(df.sort_values(['annee', 'arrondissement']))
+
+
+def build_accessibilite(dvf, ircom):
+    """Années de revenu fiscal moyen d'un foyer pour acheter un T2 de SURFACE_T2 m² (appartements)"""
+    apparts = dvf[dvf['type_local'] == 'Appartement'].groupby('arrondissement')['prix_m2']
+    df = pd.DataFrame({'prix_m2_moyen': apparts.mean(), 'prix_m2_median': apparts.median()})
+    df['prix_t2'] = df['prix_m2_moyen'] * SURFACE_T2
+    if ircom is not None:
+        #rfr_foyers_fiscaux en k€, sommé sur toutes les années disponibles
+        rfr = ircom.groupby('arrondissement')[['rfr_foyers_fiscaux', 'nb_foyers_fiscaux']].sum()
+        df['rfr_moyen_par_foyer'] = rfr['rfr_foyers_fiscaux'] * 1000 / rfr['nb_foyers_fiscaux']
+    else:
+        df['rfr_moyen_par_foyer'] = np.nan
+    df['annees_revenu_t2'] = df['prix_t2'] / df['rfr_moyen_par_foyer']
+    return _records(df.reset_index())
+
+
+def load_sources(dvf_path, ircom_path):
+    """(DVF, IRCOM ou None) réduits aux colonnes utiles ; DVF None si le fichier est absent"""
+    if not dvf_path.exists():
+        return None, None
+    dvf = pd.read_csv(dvf_path, sep=';', usecols=DVF_COLONNES, low_memory=False)
+    dvf = dvf.rename(columns={'code_arrondissement': 'arrondissement'}).dropna(subset=['arrondissement', 'annee'])
+    dvf = dvf.astype({'arrondissement': int, 'annee': int})
+
+    ircom = None
+    if ircom_path.exists():
+        ircom = pd.read_csv(ircom_path, sep=';', usecols=['code_commune', 'nb_foyers_fiscaux', 'rfr_foyers_fiscaux'])
+        #code_commune 101-120 ou 75101-75120 selon les versions du fichier
+        ircom['arrondissement'] = pd.to_numeric(ircom['code_commune'], errors='coerce') % 100
+    return dvf, ircom
+
+
+class StatsTables:
+    """
+    tables = StatsTables()
+    corps, etag = tables.response('temporel', arr=11, debut=2021)   # corps JSON (bytes) mis en cache
+    """
+
+    def __init__(self, dvf_path=DVF_PATH, ircom_path=IRCOM_PATH):
+        self.sources = [dvf_path, ircom_path]
+        self.version = None
+        self.tables = {}
+        self._reponses = {}  # (table, filtres) -> (corps, etag), vidé à chaque reconstruction
+        self._verifiee = monotonic()
+        self._lock = threading.Lock()
+        self._en_cours = False
+        self.load()
+
+    def load(self):
+        version = sources_fingerprint(self.sources)
+        dvf, ircom = load_sources(*self.sources)
+        tables = {}
+        if dvf is not None:
+            tables = {
+                'arrondissements': build_arrondissements(dvf),
+                'temporel': build_temporel(dvf),
+                'accessibilite': build_accessibilite(dvf, ircom),
+            }
+            tables['annees'] = sorted({l['annee'] for l in tables['temporel']})
+        genere_le = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            self.tables, self._reponses = tables, {}
+            self.version, self.genere_le = version, genere_le
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            #fichier en cours d'écriture... : on garde les tables actuelles, nouvel essai au prochain changement
+            print(f"Erreur recalcul des statistiques: {e}")
+        finally:
+            self._en_cours = False
+
+    def check_version(self):
+        """Au plus un stat() par INTERVALLE_VERIF ; recalcul en arrière-plan si les sources ont changé"""
+        maintenant = monotonic()
+        if maintenant - self._verifiee < INTERVALLE_VERIF or self._en_cours:
+            return
+        self._verifiee = maintenant
+        if sources_fingerprint(self.sources) != self.version:
+            self._en_cours = True
+            threading.Thread(target=self._reload, daemon=True, name="stats").start()
+
+    def _filter_temporel(self, lignes, arr=None, debut=None, fin=None):
+        if arr is not None and not 1 <= arr <= 20:
+            raise ValueError("arr doit être compris entre 1 et 20")
+        return [l for l in lignes
+                if (arr is None or l['arrondissement'] == arr)
+                and (debut is None or l['annee'] >= debut) and (fin is None or l['annee'] <= fin)]
+
+    def response(self, table, **filtres):
+        """(corps JSON, ETag) ; LookupError si les données sont absentes, ValueError si un filtre est invalide"""
+        self.check_version()
+        tables = self.tables
+        if table not in tables:
+            raise LookupError(f"statistiques indisponibles ({self.sources[0].name} absent)")
+        if table == 'temporel' and tables['annees']:
+            #années ramenées à la plage des données : clé de cache bornée quelles que soient les requêtes
+            annees = tables['annees']
+            for cle in ('debut', 'fin'):
+                if filtres.get(cle) is not None:
+                    filtres[cle] = min(max(filtres[cle], annees[0]), annees[-1])
+        cle = (table, tuple(sorted(filtres.items())))
+        reponse = self._reponses.get(cle)
+        if reponse is None:
+            lignes = tables[table]
+            if table == 'temporel':
+                lignes = self._filter_temporel(lignes, **filtres)
+            corps = json.dumps({'version': self.version, 'genere_le': self.genere_le, 'lignes': lignes},
+                               ensure_ascii=False, separators=(',', ':')).encode()
+            reponse = corps, '"' + hashlib.sha1(corps).hexdigest()[:16] + '"'
+            with self._lock:
+                if self.tables is tables:
+                    self._reponses[cle] = reponse
+        return reponse
+
+
+def not_modified(if_none_match, etag):
+    """True si l'en-tête If-None-Match du client contient l'ETag courant (ou *)"""
+    if not if_none_match:
+        return False
+    valeurs = [v.strip().removeprefix('W/') for v in if_none_match.split(',')]
+    return '*' in valeurs or etag in valeurs
@@ -8,6 +8,7 @@ root_path = str(pathlib.Path(__file__).resolve().parents[2])
 if root_path not in sys.path:
     sys.path.append(root_path)
 from utils import load_dvf_data, load_rfr_data, load_annonces_data
+from utils.data_loader import DVF_COLONNES_ACCUEIL
 
 
 st.set_page_config(page_title="DVF Paris - Accueil", layout="wide")
@@ -16,7 +17,7 @@ st.title("Observatoire Immobilier Parisien")
 st.markdown("### Synthèse du marché : Ventes Actées vs Offre Actuelle vs Revenus")
 
 # Chargement
-df_dvf = load_dvf_data()
+df_dvf = load_dvf_data(DVF_COLONNES_ACCUEIL)  # partagé entre sessions : lecture seule
 df_rfr_agg = load_rfr_data(aggregate=True)  # On prend la version agrégée pour les KPIs
 df_ads = load_annonces_data()
 
@@ -71,7 +72,7 @@ if not df_dvf.empty and not df_ads.empty:
     st.subheader("Écart de Prix par Arrondissement : Réalité (DVF) vs Prétentions (Annonces)")
 
     # Agrégation DVF (Dernière année)
-    dvf_agg = df_dvf[df_dvf['annee'] == last_year].groupby('code_arrondissement')['prix_m2'].median().reset_index()
+    dvf_agg = df_dvf[df_dvf['annee'] == last_year].groupby('code_arrondissement', observed=True)['prix_m2'].median().reset_index()
     dvf_agg['Type'] = f'Ventes ({last_year})'
 
     # Agrégation Annonces
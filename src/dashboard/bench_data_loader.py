@@ -0,0 +1,104 @@
+"""
+Chargement DVF du dashboard : lecture complète aux types par défaut contre colonnes utiles aux types compacts
+
+Chaque variante est lue dans un process neuf (spawn) pour mesurer sa durée, la mémoire du DataFrame
+et le pic de RSS du process. On mesure aussi ce que coûte chaque accès au cache :
+st.cache_data dépickle une copie à chaque appel, st.cache_resource renvoie l'objet partagé.
+
+    python src/dashboard/bench_data_loader.py
+    python src/dashboard/bench_data_loader.py --fichier autre_extrait_dvf.csv
+"""
+import sys
+import time
+import pickle
+import argparse
+import multiprocessing as mp
+from pathlib import Path
+
+import pandas as pd
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.dashboard.utils import data_loader
+
+VARIANTES = {
+    "complet, types par défaut (avant)": "avant",
+    "complet, types compacts": None,
+    "colonnes de l'accueil, types compacts": data_loader.DVF_COLONNES_ACCUEIL,
+}
+
+
+def _rss_max_mo():
+    """Pic de mémoire du process en Mo (resource sous Unix, sinon psutil s'il est installé)"""
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Ko sous Linux
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memoire = psutil.Process().memory_info()
+        return getattr(memoire, 'peak_wset', memoire.rss) / 1e6  # pic du working set sous Windows
+    except ImportError:
+        return float('nan')
+
+
+def mesure(fichier, colonnes, sortie):
+    data_loader.PATH_DVF = Path(fichier)
+    debut = time.perf_counter()
+    if colonnes == "avant":
+        df = pd.read_csv(data_loader.PATH_DVF, sep=';', low_memory=False)
+    else:
+        df = data_loader.read_dvf(colonnes)
+    duree = time.perf_counter() - debut
+
+    #coût d'un accès avec cache_data : pickle à la mise en cache, dépickle à chaque appel
+    donnees = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    debut = time.perf_counter()
+    pickle.loads(donnees)
+    acces_ms = (time.perf_counter() - debut) * 1000
+
+    sortie.put({
+        'lignes': len(df),
+        'colonnes': df.shape[1],
+        'lecture_s': duree,
+        'memoire_mo': df.memory_usage(deep=True).sum() / 1e6,
+        'rss_max_mo': _rss_max_mo(),
+        'acces_cache_data_ms': acces_ms,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire et durée du chargement DVF du dashboard")
+    parser.add_argument('--fichier', type=Path, default=data_loader.PATH_DVF, help="CSV DVF nettoyé")
+    args = parser.parse_args()
+    if not args.fichier.exists():
+        print(f"Fichier DVF absent : {args.fichier}")
+        sys.exit(1)
+
+    ctx = mp.get_context("spawn")
+    print(f"{args.fichier.name}\n")
+    print(f"{'variante':<40}{'col.':>5}{'lecture s':>11}{'DataFrame Mo':>14}{'RSS max Mo':>12}{'cache_data ms/accès':>21}")
+    resultats = {}
+    for nom, colonnes in VARIANTES.items():
+        sortie = ctx.Queue()
+        p = ctx.Process(target=mesure, args=(args.fichier, colonnes, sortie))
+        p.start()
+        r = sortie.get()
+        p.join()
+        resultats[nom] = r
+        print(f"{nom:<40}{r['colonnes']:>5}{r['lecture_s']:>11.2f}{r['memoire_mo']:>14.1f}{r['rss_max_mo']:>12.0f}"
+              f"{r['acces_cache_data_ms']:>21.1f}")
+
+    avant, apres = resultats[list(VARIANTES)[0]], resultats[list(VARIANTES)[-1]]
+    print(f"\nAccueil : DataFrame x{avant['memoire_mo'] / apres['memoire_mo']:.0f} plus petit, "
+          f"lecture x{avant['lecture_s'] / apres['lecture_s']:.1f} plus rapide ; "
+          f"avec cache_resource, un accès ne copie plus rien (cache_data : {avant['acces_cache_data_ms']:.1f} ms)")
+    print(f"({avant['lignes']:,} lignes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Explorateur de données : coût d'une interaction avant / après le filtrage et la pagination côté serveur
+
+Avant, chaque rerun de la page sérialisait le jeu complet pour st.dataframe et le convertissait
+en CSV pour le bouton de téléchargement, même sans clic. Après, une interaction calcule (ou relit)
+la sélection et ne sérialise qu'une page ; l'export n'est fait qu'au clic.
+Les sérialisations sont celles de Streamlit (Arrow, envoyé au navigateur).
+
+    python src/dashboard/bench_explorer.py
+    python src/dashboard/bench_explorer.py --fichier autre_extrait_dvf.csv
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+from streamlit import dataframe_util
+
+# Hack Path pour trouver src
+root_path = str(Path(__file__).resolve().parents[2])
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from src.dashboard.utils import data_loader
+from src.dashboard.utils.explorer import DataExplorer
+
+#suite d'interactions d'un utilisateur : (description, filtres, tri, décroissant, page)
+FILTRES = {'type_local': ['Appartement'], 'prix_m2': (8000, 12000)}
+SCENARIO = [
+    ("affichage initial", {}, None, False, 0),
+    ("filtre type + plage de prix", FILTRES, None, False, 0),
+    ("tri prix décroissant", FILTRES, 'prix_m2', True, 0),
+    ("page suivante", FILTRES, 'prix_m2', True, 1),
+    ("page suivante", FILTRES, 'prix_m2', True, 2),
+    ("recherche dans la voie", dict(FILTRES, adresse_nom_voie="rue"), 'prix_m2', True, 0),
+    ("tri date", dict(FILTRES, adresse_nom_voie="rue"), 'date_mutation', False, 0),
+]
+
+
+def chrono(fonction, *args, **kwargs):
+    debut = time.perf_counter()
+    resultat = fonction(*args, **kwargs)
+    return resultat, (time.perf_counter() - debut) * 1000
+
+
+def rerun_avant(df, colonnes):
+    """Ancienne page : tableau complet + CSV complet à chaque rerun"""
+    corps = dataframe_util.convert_pandas_df_to_arrow_bytes(df[colonnes])
+    df.to_csv(sep=';', index=False).encode('utf-8')
+    return len(corps)
+
+
+def rerun_apres(explorer, colonnes, filtres, tri, decroissant, numero):
+    page, _ = explorer.page(filtres, tri, decroissant, numero, colonnes=colonnes)
+    return len(dataframe_util.convert_pandas_df_to_arrow_bytes(page))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût des interactions de l'explorateur de données")
+    parser.add_argument('--fichier', type=Path, default=data_loader.PATH_DVF, help="CSV DVF nettoyé")
+    args = parser.parse_args()
+    if not args.fichier.exists():
+        print(f"Fichier DVF absent : {args.fichier}")
+        sys.exit(1)
+
+    data_loader.PATH_DVF = args.fichier
+    df = data_loader.read_dvf()
+    colonnes = df.columns.tolist()[:10]  # colonnes affichées par défaut
+    explorer = DataExplorer(df)
+    print(f"{args.fichier.name} : {len(df):,} lignes\n")
+
+    octets_avant, _ = chrono(rerun_avant, df, colonnes)
+    print(f"{'interaction':<32}{'avant ms':>10}{'après ms':>10}{'envoyé avant':>14}{'envoyé après':>14}")
+    for description, filtres, tri, decroissant, numero in SCENARIO:
+        #avant : le coût ne dépend pas de l'interaction (tout est resérialisé)
+        _, ms_avant = chrono(rerun_avant, df, colonnes)
+        octets, ms_apres = chrono(rerun_apres, explorer, colonnes, filtres, tri, decroissant, numero)
+        print(f"{description:<32}{ms_avant:>10.0f}{ms_apres:>10.1f}{octets_avant / 1e6:>11.1f} Mo{octets / 1e3:>11.0f} Ko")
+
+    print("\nExport à la demande (sélection filtrée / jeu complet) :")
+    for format in ('csv', 'parquet'):
+        filtre, ms_filtre = chrono(explorer.export, format, FILTRES, 'prix_m2', True)
+        complet, ms_complet = chrono(explorer.export, format)
+        print(f"  {format:<8}{ms_filtre:>7.0f} ms ({filtre.getbuffer().nbytes / 1e6:.1f} Mo) / "
+              f"{ms_complet:.0f} ms ({complet.getbuffer().nbytes / 1e6:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import sys
 from pathlib import Path
 import sqlite3
+from datetime import datetime, timedelta
 import pandas as pd
 import streamlit as st
 
@@ -9,8 +10,36 @@ root_path = str(Path(__file__).resolve().parents[3])
 if root_path not in sys.path:
     sys.path.insert(0, root_path)
 
+from src.api import database
+from src.api.database import query_logs, summarize_logs, aggregate_logs, TAILLE_PAGE_MAX
+from src.api.log_retention import RETENTION_JOURS, ARCHIVE_DIR
+from src.dashboard.utils import geocode_cache
+
 # Chemin vers la DB
-DB_PATH = Path(root_path) / "logs_estimations.db"
+DB_PATH = database.DB_PATH
+CACHE_DB_PATH = geocode_cache.CACHE_DB_PATH
+
+ECHANTILLON_LATENCE = 1000  # dernières estimations utilisées pour médiane / p95
+PERIODES = {"24 dernières heures": 1, "7 derniers jours": 7, "30 derniers jours": 30, "Tout": None}
+TTL_AGREGATS = 60  # secondes : les agrégats sur toute la fenêtre ne sont pas recalculés à chaque interaction
+
+
+@st.cache_resource(show_spinner=False)
+def migrate_db(db_path):
+    """Index et colonnes manquantes sur les bases existantes : une fois par base et par process, pas à chaque rerun"""
+    database.init_db()
+    return db_path
+
+
+@st.cache_data(ttl=TTL_AGREGATS, show_spinner=False)
+def cached_summary(debut, arrondissement):
+    return summarize_logs(debut=debut, arrondissement=arrondissement)
+
+
+@st.cache_data(ttl=TTL_AGREGATS, show_spinner=False)
+def cached_aggregates(par, debut, arrondissement):
+    return pd.DataFrame(aggregate_logs(par, debut=debut, arrondissement=arrondissement))
+
 
 st.set_page_config(page_title="Admin Logs", layout="wide")
 st.title("Logs des Estimations")
@@ -18,28 +47,111 @@ st.title("Logs des Estimations")
 if not DB_PATH.exists():
     st.warning("Aucune base de données trouvée. Lancez d'abord l'API et faites une estimation.")
 else:
+    migrate_db(str(DB_PATH))
+
     # Bouton de rafraîchissement
     if st.button("Rafraîchir les données"):
+        cached_summary.clear()
+        cached_aggregates.clear()
         st.rerun()
 
-    # Connexion et lecture
-    conn = sqlite3.connect(DB_PATH)
-    query = "SELECT * FROM logs ORDER BY timestamp DESC"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    #Filtres : tout est calculé en SQL sur la fenêtre choisie, rien n'est chargé en entier
+    col1, col2 = st.columns(2)
+    periode = col1.selectbox("Période", list(PERIODES), index=2)
+    arr_choix = col2.selectbox("Arrondissement", ["Tous"] + list(range(1, 21)))
+    jours = PERIODES[periode]
+    #arrondi à la minute : même fenêtre (et même entrée de cache) d'une interaction à l'autre
+    maintenant = datetime.now().replace(second=0, microsecond=0)
+    debut = (maintenant - timedelta(days=jours)).isoformat() if jours else None
+    arrondissement = None if arr_choix == "Tous" else arr_choix
+    filtres = dict(debut=debut, arrondissement=arrondissement)
+
+    resume = cached_summary(debut, arrondissement)
 
     # Métriques
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Estimations", len(df))
-    if not df.empty:
-        last_date = pd.to_datetime(df['timestamp']).dt.strftime('%d/%m %H:%M').iloc[0]
+    col1.metric("Total Estimations", f"{resume['n']:,}")
+    if resume['n']:
+        last_date = pd.to_datetime(resume['derniere']).strftime('%d/%m %H:%M')
         col2.metric("Dernière activité", last_date)
 
         # Prix moyen estimé
-        avg_price = df['prix_estime'].mean()
-        col3.metric("Prix moyen estimé", f"{avg_price:,.0f} €/m²")
+        col3.metric("Prix moyen estimé", f"{resume['prix_moyen'] or 0:,.0f} €/m²")
+
+        #Activité par jour et par arrondissement (GROUP BY côté SQLite)
+        col1, col2 = st.columns(2)
+        df_jour = cached_aggregates('jour', debut, arrondissement)
+        col1.caption("Estimations par jour")
+        col1.bar_chart(df_jour.set_index('groupe')['n'])
+        df_arr = cached_aggregates('arrondissement', debut, arrondissement).dropna(subset=['groupe'])
+        col2.caption("Prix moyen estimé par arrondissement (€/m²)")
+        col2.bar_chart(df_arr.set_index('groupe')['prix_moyen'])
+
+    #Latence par étape (colonnes t_*_ms ajoutées par l'instrumentation de estimate_complet)
+    #moyenne sur toute la fenêtre, médiane / p95 sur les ECHANTILLON_LATENCE dernières estimations
+    timing_cols = database.TIMING_COLUMNS
+    if any(resume.get(c) is not None for c in timing_cols):
+        st.subheader("Latence par étape (ms)")
+        df_recent = pd.DataFrame(query_logs(ECHANTILLON_LATENCE, **filtres)['logs'])
+        df_lat = df_recent[timing_cols].astype(float).agg(['median', lambda s: s.quantile(0.95)]).T
+        df_lat.columns = ['Médiane', 'p95']
+        df_lat.insert(0, 'Moyenne', [resume[c] for c in timing_cols])
+        df_lat.index = [c[2:-3] for c in timing_cols]
+        st.dataframe(df_lat.round(2), width='stretch')
+        st.caption(f"Médiane et p95 sur les {len(df_recent)} dernières estimations")
+
+    #Cache de géocodage : provenance de chaque géocodage (colonne geocode_source) et temps gagné sur la BAN
+    df_geo = cached_aggregates('source', debut, arrondissement)
+    df_geo = df_geo.dropna(subset=['groupe']).set_index('groupe') if not df_geo.empty else df_geo
+    if not df_geo.empty:
+        st.subheader("Cache de géocodage")
+        df_geo = df_geo[['n', 't_geocodage_ms']].rename(columns={'n': 'count', 't_geocodage_ms': 'mean'})
+        hits = df_geo.loc[df_geo.index.str.startswith('cache_'), 'count'].sum()
+        appels_ban = df_geo['count'].get('ban', 0)
+
+        col1, col2, col3 = st.columns(3)
+        if hits + appels_ban:
+            col1.metric("Taux de hit (hors index DVF)", f"{hits / (hits + appels_ban):.1%}")
+        if appels_ban and hits:
+            cout_hit = (df_geo.loc[df_geo.index.str.startswith('cache_'), 'count']
+                        * df_geo.loc[df_geo.index.str.startswith('cache_'), 'mean']).sum() / hits
+            gain = hits * (df_geo.loc['ban', 'mean'] - cout_hit)
+            col2.metric("Temps BAN économisé", f"{gain / 1000:,.1f} s")
+        if CACHE_DB_PATH.exists():
+            conn = sqlite3.connect(CACHE_DB_PATH)
+            n_total, n_negatifs = conn.execute(
+                "SELECT COUNT(*), SUM(valeur IS NULL) FROM geocodes WHERE expiration > strftime('%s', 'now')"
+            ).fetchone()
+            conn.close()
+            col3.metric("Adresses en cache (dont introuvables)", f"{n_total} ({n_negatifs or 0})")
+
+        df_geo.columns = ['Requêtes', 'Géocodage moyen (ms)']
+        st.dataframe(df_geo.round(2), width='stretch')
 
     st.divider()
+    #au-delà de la rétention, les totaux ci-dessus viennent des résumés journaliers (logs_jour)
+    st.caption(f"Détail ligne à ligne sur les {RETENTION_JOURS} derniers jours ; les lignes plus anciennes "
+               f"sont archivées en Parquet dans {ARCHIVE_DIR.name}/ (log_retention.py).")
+
+    #Tableau paginé par curseur : une page = une requête indexée, quelle que soit sa position
+    taille_page = st.selectbox("Lignes par page", [50, 100, 500], index=0)
+    cle_filtres = (periode, arr_choix, taille_page)
+    if st.session_state.get('logs_filtres') != cle_filtres:
+        st.session_state.logs_filtres = cle_filtres
+        st.session_state.logs_curseurs = [None]  # curseur de début de chaque page visitée
+    curseurs = st.session_state.logs_curseurs
+
+    page = query_logs(taille_page, curseurs[-1], **filtres)
+    df = pd.DataFrame(page['logs'])
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    if col1.button("Page précédente", disabled=len(curseurs) == 1):
+        curseurs.pop()
+        st.rerun()
+    if col2.button("Page suivante", disabled=page['suivant'] is None):
+        curseurs.append(page['suivant'])
+        st.rerun()
+    col3.caption(f"Page {len(curseurs)}")
 
     # Tableau interactif
     st.dataframe(
@@ -50,16 +162,24 @@ else:
             "classification": st.column_config.TextColumn("Classe", width="small"),
             "confiance": st.column_config.ProgressColumn("Confiance", format="%.1f%%", min_value=0, max_value=100),
         },
-        use_container_width=True,
+        width='stretch',
         height=500
     )
 
-    # Export CSV
-    csv = df.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        "Télécharger les logs (CSV)",
-        csv,
-        "logs_estimations.csv",
-        "text/csv",
-        key='download-csv'
-    )
\ No newline at end of file
+    # Export CSV de la fenêtre filtrée, construit page par page et seulement à la demande
+    if st.button("Préparer l'export CSV"):
+        pages, curseur = [], None
+        while True:
+            page = query_logs(TAILLE_PAGE_MAX, curseur, **filtres)
+            pages.append(pd.DataFrame(page['logs']))
+            curseur = page['suivant']
+            if curseur is None:
+                break
+        csv = pd.concat(pages).to_csv(index=False).encode('utf-8')
+        st.download_button(
+            "Télécharger les logs (CSV)",
+            csv,
+            "logs_estimations.csv",
+            "text/csv",
+            key='download-csv'
+        )
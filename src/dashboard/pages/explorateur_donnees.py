@@ -1,33 +1,96 @@
+import time
 import streamlit as st
 from src.dashboard.utils.data_loader import load_dvf_data, load_rfr_data, load_annonces_data
+from src.dashboard.utils.explorer import DataExplorer
 
 st.set_page_config(page_title="Explorateur", layout="wide")
 st.title("Explorateur de Données Brutes")
 
+CHARGEURS = {
+    "Transactions DVF": load_dvf_data,
+    "Revenus Fiscaux (RFR)": load_rfr_data,
+    "Annonces Immobilières": load_annonces_data,
+}
+FORMATS_EXPORT = {"CSV": ("csv", "text/csv"), "Parquet": ("parquet", "application/vnd.apache.parquet")}
+
+
+@st.cache_resource(show_spinner="Préparation de l'explorateur...")
+def get_explorer(dataset_name):
+    """Un explorateur par jeu de données, partagé par les sessions (index de tri et sélections réutilisés)"""
+    return DataExplorer(CHARGEURS[dataset_name]())
+
+
 # Sélecteur de Source
-dataset_name = st.radio("Choisir le jeu de données à explorer :",
-                        ["Transactions DVF", "Revenus Fiscaux (RFR)", "Annonces Immobilières"],
-                        horizontal=True)
-
-df = None
-if dataset_name == "Transactions DVF":
-    df = load_dvf_data()
-elif dataset_name == "Revenus Fiscaux (RFR)":
-    df = load_rfr_data()
-elif dataset_name == "Annonces Immobilières":
-    df = load_annonces_data()
-
-if df is not None and not df.empty:
-    st.write(f"**{len(df)}** lignes chargées.")
-
-    # Filtres dynamiques simples
-    with st.expander("Filtres rapides"):
-        cols = st.multiselect("Colonnes à afficher", df.columns.tolist(), default=df.columns.tolist()[:10])
-
-    st.dataframe(df[cols] if cols else df, use_container_width=True, height=600)
-
-    # Bouton Download
-    csv = df.to_csv(sep=';', index=False).encode('utf-8')
-    st.download_button("Télécharger ce dataset", csv, f"{dataset_name}.csv", "text/csv")
+dataset_name = st.radio("Choisir le jeu de données à explorer :", list(CHARGEURS), horizontal=True)
+
+explorer = get_explorer(dataset_name)
+df = explorer.df
+
+if len(explorer):
+    st.write(f"**{len(explorer)}** lignes chargées.")
+
+    #Filtres, tri et pagination appliqués côté serveur : seule la page affichée est envoyée au navigateur
+    filtres = {}
+    with st.expander("Filtres rapides", expanded=True):
+        cols = st.multiselect("Colonnes à afficher", df.columns.tolist(), default=df.columns.tolist()[:10],
+                              key=f"colonnes-{dataset_name}")
+        a_filtrer = st.multiselect("Filtrer sur", df.columns.tolist(), key=f"filtres-{dataset_name}")
+        for col in a_filtrer:
+            info = explorer.column_info(col)
+            cle = f"filtre-{dataset_name}-{col}"
+            if info['type'] == 'plage':
+                bornes = (info['min'], info['max'])
+                plage = st.slider(col, *bornes, value=bornes, key=cle)
+                if plage != bornes:
+                    filtres[col] = plage
+            elif info['type'] == 'liste':
+                choix = st.multiselect(col, info['valeurs'], key=cle)
+                if choix:
+                    filtres[col] = choix
+            else:
+                texte = st.text_input(f"{col} contient", key=cle)
+                if texte:
+                    filtres[col] = texte
+
+        col_tri, col_ordre, col_taille = st.columns([2, 1, 1])
+        tri = col_tri.selectbox("Trier par", [None] + df.columns.tolist(),
+                                format_func=lambda c: "(ordre du fichier)" if c is None else c, key=f"tri-{dataset_name}")
+        decroissant = col_ordre.toggle("Décroissant", disabled=tri is None)
+        taille_page = col_taille.selectbox("Lignes par page", [50, 100, 500], index=1)
+
+    #retour à la première page quand la requête change
+    cle_requete = (dataset_name, repr(sorted(filtres.items())), tri, decroissant, taille_page)
+    if st.session_state.get('explorateur_requete') != cle_requete:
+        st.session_state.explorateur_requete = cle_requete
+        st.session_state.explorateur_page = 0
+    numero = st.session_state.explorateur_page
+
+    debut = time.perf_counter()
+    page, total = explorer.page(filtres, tri, decroissant, numero, taille_page, cols or None)
+    duree_ms = (time.perf_counter() - debut) * 1000
+    n_pages = max(1, -(-total // taille_page))
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    if col1.button("Page précédente", disabled=numero == 0):
+        st.session_state.explorateur_page -= 1
+        st.rerun()
+    if col2.button("Page suivante", disabled=numero >= n_pages - 1):
+        st.session_state.explorateur_page += 1
+        st.rerun()
+    col3.caption(f"Page {numero + 1}/{n_pages} : {total:,} lignes sélectionnées sur {len(explorer):,} "
+                 f"({duree_ms:.0f} ms)")
+
+    st.dataframe(page, use_container_width=True, height=600)
+
+    # Export de la sélection (filtres, tri, colonnes affichées), construit seulement au clic
+    format_export = st.radio("Format d'export", list(FORMATS_EXPORT), horizontal=True)
+    extension, mime = FORMATS_EXPORT[format_export]
+    st.download_button(
+        f"Télécharger la sélection ({total:,} lignes)",
+        lambda: explorer.export(extension, filtres, tri, decroissant, cols or None),
+        f"{dataset_name}.{extension}",
+        mime,
+        on_click='ignore'
+    )
 else:
-    st.warning("Jeu de données vide ou introuvable.")
\ No newline at end of file
+    st.warning("Jeu de données vide ou introuvable.")
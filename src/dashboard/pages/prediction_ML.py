@@ -4,7 +4,9 @@ import streamlit as st
 import streamlit.components.v1 as components
 import folium
 import plotly.graph_objects as go
+import plotly.express as px
 from src.dashboard.utils.ml_predictor import get_predictor
+from src.dashboard.utils.data_loader import load_importance_arrondissements
 import requests
 API_URL = "http://127.0.0.1:8000/predict"
 
@@ -87,4 +89,13 @@ if submitted and adresse:
                 st.error(f"Erreur API ({response.status_code}) : {response.text}")
 
         except requests.exceptions.ConnectionError:
-            st.error("Impossible de contacter l'API. Vérifiez que `src/api/main.py` est bien lancé.")
\ No newline at end of file
+            st.error("Impossible de contacter l'API. Vérifiez que `src/api/main.py` est bien lancé.")
+
+#IMPORTANCE DES VARIABLES (calculée à l'entraînement, pas d'appel API)
+df_importance = load_importance_arrondissements()
+if not df_importance.empty:
+    with st.expander("Ce qui pèse dans l'estimation, arrondissement par arrondissement"):
+        st.caption("Hausse de l'erreur moyenne (€/m²) quand la variable est brouillée par permutation.")
+        fig_imp = px.imshow(df_importance.T, aspect="auto", color_continuous_scale="Reds",
+                            labels={'x': 'Arrondissement', 'y': 'Variable', 'color': '€/m²'})
+        st.plotly_chart(fig_imp, use_container_width=True)
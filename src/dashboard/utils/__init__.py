@@ -3,38 +3,42 @@ Utilitaires pour le dashboard Streamlit
 
 Expose les fonctions principales pour simplifier les imports, pas de chemin long dans chaque fichier :
     from src.dashboard.utils import load_dvf, MLPredictor, load_static_plot
+
+Les noms sont importés au premier accès (PEP 562) : importer un seul module du paquet
+(arrondissements, geocoder_offline, ban_client... depuis les scripts de src/algos)
+ne charge ni streamlit, ni les modèles, ni pyarrow.
 """
+from importlib import import_module
 
-# Data loaders
-from .data_loader import (
-    load_dvf_data,
-    load_rfr_data,
-    load_annonces_data
-)
-
-# ML predictor
-from .ml_predictor import (
-    MLPredictor,
-    get_predictor
-)
-
-# Viz helper
-from .viz_helper import (
-    render_image,
-    render_html
-)
-
-__all__ = [
+#nom exposé -> module du paquet qui le définit
+_EXPORTS = {
     # Data
-    'load_dvf_data',
-    'load_rfr_data',
-    'load_annonces_data',
+    'load_dvf_data': 'data_loader',
+    'load_rfr_data': 'data_loader',
+    'load_annonces_data': 'data_loader',
+    'load_importance_arrondissements': 'data_loader',
+    'DataExplorer': 'explorer',
 
     # ML
-    'MLPredictor',
-    'get_predictor',
+    'MLPredictor': 'ml_predictor',
+    'get_predictor': 'ml_predictor',
 
     # Viz
-    'render_image',
-    'render_html'
-]
\ No newline at end of file
+    'render_image': 'viz_helper',
+    'render_html': 'viz_helper',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    valeur = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = valeur
+    return valeur
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,174 @@
+"""
+Arrondissement d'un point (lat, lon) à partir des polygones de data/arrondissements.geojson
+
+Le code postal ne suffit pas (75116, bois de Boulogne / Vincennes, repli silencieux sur le 1er) :
+on teste l'appartenance géométrique.
+    - les polygones sont rasterisés une fois sur une grille régulière (TAILLE_CELLULE degrés)
+    - une cellule entièrement dans un arrondissement donne la réponse directement (lecture de tableau, O(1))
+    - seules les cellules traversées par une frontière font un test exact point-dans-polygone,
+      limité aux arrondissements qui passent par cette cellule
+    - resolve_many travaille sur des tableaux numpy (190K ventes DVF en un appel)
+"""
+import json
+from functools import lru_cache
+
+import numpy as np
+from src.config import paths
+
+GEOJSON_PATH = paths.data / "arrondissements.geojson"
+TAILLE_CELLULE = 0.0005  # degrés, ~40-55 m à Paris
+PROPRIETE_CODE = "c_ar"  # numéro d'arrondissement dans le GeoJSON (comme les cartes folium)
+
+
+def load_polygons(geojson):
+    """{code: [anneau (n, 2) lon/lat, ...]} ; Polygon et MultiPolygon, trous compris"""
+    polygons = {}
+    for feature in geojson['features']:
+        code = int(feature['properties'][PROPRIETE_CODE])
+        geometry = feature['geometry']
+        parts = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+        rings = polygons.setdefault(code, [])
+        for part in parts:
+            rings.extend(np.asarray(ring, dtype=float)[:, :2] for ring in part)
+    return polygons
+
+
+def _edges(rings):
+    """Segments (x1, y1, x2, y2) de tous les anneaux"""
+    return np.vstack([np.hstack([ring[:-1], ring[1:]]) for ring in rings if len(ring) > 1])
+
+
+def points_in_polygon(lon, lat, edges):
+    """
+    Règle pair-impair (lancer de rayon horizontal), vectorisée sur les points.
+    Avec tous les anneaux d'un polygone, les trous sont gérés naturellement.
+    """
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    edges = edges[edges[:, 1] != edges[:, 3]]
+    x1, y1, x2, y2 = (c[None, :] for c in edges.T)
+    inside = np.zeros(lon.shape, dtype=bool)
+
+    #points x segments par blocs (~2M cases) pour borner la mémoire
+    bloc = max(1, 2_000_000 // max(1, len(edges)))
+    for debut in range(0, len(lon), bloc):
+        px = lon[debut:debut + bloc, None]
+        py = lat[debut:debut + bloc, None]
+        straddle = (y1 > py) != (y2 > py)
+        x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        inside[debut:debut + bloc] = np.count_nonzero(straddle & (px < x_cross), axis=1) % 2 == 1
+    return inside
+
+
+class ArrondissementResolver:
+
+    def __init__(self, polygons, taille_cellule=TAILLE_CELLULE):
+        self.codes = sorted(polygons)
+        self.edges = {code: _edges(rings) for code, rings in polygons.items()}
+        self.taille = taille_cellule
+
+        tous = np.vstack([e for e in self.edges.values()])
+        marge = 2 * taille_cellule
+        self.lon0 = min(tous[:, 0].min(), tous[:, 2].min()) - marge
+        self.lat0 = min(tous[:, 1].min(), tous[:, 3].min()) - marge
+        lon1 = max(tous[:, 0].max(), tous[:, 2].max()) + marge
+        lat1 = max(tous[:, 1].max(), tous[:, 3].max()) + marge
+        self.nx = int(np.ceil((lon1 - self.lon0) / taille_cellule))
+        self.ny = int(np.ceil((lat1 - self.lat0) / taille_cellule))
+
+        #grid : code de l'arrondissement au centre de chaque cellule (0 = hors Paris)
+        #frontiere : cellules traversées par au moins un segment -> test exact
+        #candidats[code] : cellules de frontière où ce polygone passe
+        self.grid = np.zeros((self.ny, self.nx), dtype=np.int8)
+        self.frontiere = np.zeros((self.ny, self.nx), dtype=bool)
+        self.candidats = {}
+        for code in self.codes:
+            self._rasterize(code)
+
+    def _rasterize(self, code):
+        edges = self.edges[code]
+
+        #remplissage par lignes de balayage au centre des cellules
+        y = self.lat0 + (np.arange(self.ny) + 0.5) * self.taille
+        x = self.lon0 + (np.arange(self.nx) + 0.5) * self.taille
+        x1, y1, x2, y2 = edges.T
+        non_horizontal = y1 != y2
+        for j in range(self.ny):
+            straddle = non_horizontal & ((y1 > y[j]) != (y2 > y[j]))
+            if not straddle.any():
+                continue
+            xs = np.sort(x1[straddle] + (y[j] - y1[straddle]) * (x2[straddle] - x1[straddle])
+                         / (y2[straddle] - y1[straddle]))
+            #nombre de croisements à gauche de chaque centre : impair = dedans
+            inside = np.searchsorted(xs, x) % 2 == 1
+            self.grid[j, inside] = code
+
+        #cellules traversées : segments densifiés à un demi-pas de cellule, plus les cellules voisines
+        longueurs = np.hypot(x2 - x1, y2 - y1)
+        n_pts = np.maximum(2, np.ceil(longueurs / (self.taille / 2)).astype(int) + 1)
+        t = np.concatenate([np.linspace(0, 1, n) for n in n_pts])
+        idx = np.repeat(np.arange(len(edges)), n_pts)
+        px = x1[idx] + t * (x2 - x1)[idx]
+        py = y1[idx] + t * (y2 - y1)[idx]
+        ci = ((px - self.lon0) / self.taille).astype(int)
+        cj = ((py - self.lat0) / self.taille).astype(int)
+
+        masque = np.zeros((self.ny, self.nx), dtype=bool)
+        for dj in (-1, 0, 1):
+            for di in (-1, 0, 1):
+                masque[np.clip(cj + dj, 0, self.ny - 1), np.clip(ci + di, 0, self.nx - 1)] = True
+        self.frontiere |= masque
+        self.candidats[code] = masque
+
+    @classmethod
+    def from_geojson(cls, path=GEOJSON_PATH, taille_cellule=TAILLE_CELLULE):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(load_polygons(json.load(f)), taille_cellule)
+
+    def resolve_many(self, lat, lon):
+        """Tableau d'arrondissements (0 = hors Paris ou coordonnées manquantes)"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        result = np.zeros(lat.shape, dtype=np.int8)
+
+        ci = np.floor((lon - self.lon0) / self.taille)
+        cj = np.floor((lat - self.lat0) / self.taille)
+        valides = np.isfinite(ci) & np.isfinite(cj) & (ci >= 0) & (ci < self.nx) & (cj >= 0) & (cj < self.ny)
+        ci = np.where(valides, ci, 0).astype(int)
+        cj = np.where(valides, cj, 0).astype(int)
+
+        #cas général : lecture directe de la grille
+        interieur = valides & ~self.frontiere[cj, ci]
+        result[interieur] = self.grid[cj[interieur], ci[interieur]]
+
+        #cellules de frontière : test exact contre les seuls polygones présents dans la cellule
+        bord = np.flatnonzero(valides & self.frontiere[cj, ci])
+        for code in self.codes:
+            pts = bord[self.candidats[code][cj[bord], ci[bord]]]
+            if len(pts) == 0:
+                continue
+            dedans = points_in_polygon(lon[pts], lat[pts], self.edges[code])
+            result[pts[dedans]] = code
+        return result
+
+    def resolve(self, lat, lon):
+        """Arrondissement (1-20) d'un point, None hors Paris"""
+        try:
+            i = int((lon - self.lon0) // self.taille)
+            j = int((lat - self.lat0) // self.taille)
+        except (TypeError, ValueError):  # None / NaN
+            return None
+        if not (0 <= i < self.nx and 0 <= j < self.ny):
+            return None
+        if not self.frontiere[j, i]:
+            return int(self.grid[j, i]) or None
+        code = int(self.resolve_many(np.array([lat]), np.array([lon]))[0])
+        return code or None
+
+
+@lru_cache(maxsize=1)
+def get_resolver():
+    """Résolveur partagé, construit au premier appel ; None si le GeoJSON est absent"""
+    if not GEOJSON_PATH.is_file():
+        return None
+    return ArrondissementResolver.from_geojson(GEOJSON_PATH)
@@ -0,0 +1,279 @@
+"""
+Client HTTP de l'API Adresse (BAN) pour le géocodage
+
+    - connexions keep-alive réutilisées (requests.Session / httpx.AsyncClient) : pas de handshake TCP+TLS par appel
+    - timeouts stricts (connexion / lecture) : un serveur qui ne répond plus ne bloque pas le worker
+    - nouvelles tentatives avec attente exponentielle et jitter sur les erreurs réseau, 429 et 5xx
+    - disjoncteur : après SEUIL_ECHECS échecs consécutifs, plus aucun appel pendant DUREE_OUVERTURE secondes
+      (une 4xx ne compte pas : la BAN a répondu, c'est la requête qui est refusée)
+    - requête refusée (400 : q de moins de 3 ou plus de 200 caractères...) : None, comme une adresse introuvable
+      (mise en cache négatif par l'appelant) ; une adresse hors de ces longueurs n'est pas envoyée
+    - BanClient pour le code synchrone (Streamlit), AsyncBanClient pour FastAPI
+
+Les appels qui échouent (y compris une réponse 200 illisible) lèvent BanUnavailable ;
+une adresse introuvable ou refusée renvoie None.
+Pour tester sans réseau : python src/api/ban_stub.py (serveur local qui simule latence et pannes),
+python src/api/ban_stub.py --verifier pour contrôler retries, timeouts et disjoncteur.
+"""
+import os
+import random
+import threading
+import time
+import asyncio
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+BAN_URL = os.environ.get("BAN_URL", "https://api-adresse.data.gouv.fr/search/")
+CITYCODE_PARIS = "75056"
+
+TIMEOUT_CONNEXION = 1.0  # secondes
+TIMEOUT_LECTURE = 2.0
+MAX_TENTATIVES = 3
+ATTENTE_BASE = 0.1  # secondes, doublée à chaque tentative (jitter complet)
+TAILLE_POOL = 10
+
+SEUIL_ECHECS = 5
+DUREE_OUVERTURE = 30.0
+
+CODES_A_REESSAYER = {429, 500, 502, 503, 504}
+#la BAN rejette la saisie elle-même : réponse définitive pour cette adresse
+CODES_REQUETE_REFUSEE = {400, 413, 414, 422}
+#longueurs de q acceptées par la BAN
+LONGUEUR_MIN_ADRESSE, LONGUEUR_MAX_ADRESSE = 3, 200
+
+
+class BanUnavailable(Exception):
+    """BAN injoignable, en erreur ou disjoncteur ouvert"""
+
+
+def parse_ban_response(data):
+    """
+    Premier résultat de la BAN au format de MLPredictor.geocode_address, None si aucun.
+    ValueError si le corps n'a pas la forme attendue.
+    """
+    try:
+        if not data.get('features'):
+            return None
+        props = data['features'][0]['properties']
+        coords = data['features'][0]['geometry']['coordinates']
+        longitude, latitude = float(coords[0]), float(coords[1])
+        postcode = props.get('postcode')
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError) as e:
+        raise ValueError(f"réponse BAN inattendue: {e!r}") from e
+
+    #detection arrondissement
+    if postcode and str(postcode).startswith('75'):
+        arrondissement = int(str(postcode)[-2:])
+    else:
+        arrondissement = 1  # Fallback
+
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'arrondissement': arrondissement,
+        'label': props.get('label'),
+        'source': 'ban',
+        'precision': props.get('type')  # housenumber / street / locality / municipality
+    }
+
+
+def attente_backoff(tentative):
+    """Jitter complet : uniforme entre 0 et base * 2^tentative"""
+    return random.uniform(0, ATTENTE_BASE * 2 ** tentative)
+
+
+class CircuitBreaker:
+    """
+    fermé -> ouvert après SEUIL_ECHECS échecs consécutifs ;
+    ouvert -> un seul appel d'essai autorisé après DUREE_OUVERTURE (semi-ouvert) ; succès -> fermé
+    """
+
+    def __init__(self, seuil=SEUIL_ECHECS, duree_ouverture=DUREE_OUVERTURE):
+        self.seuil = seuil
+        self.duree_ouverture = duree_ouverture
+        self.echecs = 0
+        self.ouvert_depuis = None
+        self._essai_en_cours = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.ouvert_depuis is None:
+                return True
+            if time.monotonic() - self.ouvert_depuis < self.duree_ouverture or self._essai_en_cours:
+                return False
+            self._essai_en_cours = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.echecs = 0
+            self.ouvert_depuis = None
+            self._essai_en_cours = False
+
+    def failure(self):
+        with self._lock:
+            self.echecs += 1
+            self._essai_en_cours = False
+            if self.echecs >= self.seuil:
+                self.ouvert_depuis = time.monotonic()
+
+    @property
+    def etat(self):
+        if self.ouvert_depuis is None:
+            return 'ferme'
+        return 'ouvert' if time.monotonic() - self.ouvert_depuis < self.duree_ouverture else 'semi-ouvert'
+
+
+class _BaseBanClient:
+    def __init__(self, base_url=None, timeout_connexion=TIMEOUT_CONNEXION, timeout_lecture=TIMEOUT_LECTURE,
+                 max_tentatives=MAX_TENTATIVES, breaker=None):
+        self.base_url = base_url or BAN_URL
+        self.timeout_connexion = timeout_connexion
+        self.timeout_lecture = timeout_lecture
+        self.max_tentatives = max_tentatives
+        self.breaker = breaker or CircuitBreaker()
+        self.compteurs = {'appels': 0, 'tentatives': 0, 'echecs': 0, 'erreurs_client': 0, 'refus_disjoncteur': 0}
+        self._lock = threading.Lock()  # BanClient est appelé depuis plusieurs threads (pool d'E/S)
+
+    def _params(self, address):
+        return {'q': address, 'citycode': CITYCODE_PARIS, 'limit': 1}
+
+    def _compte(self, cle):
+        with self._lock:
+            self.compteurs[cle] += 1
+
+    def _check_breaker(self):
+        self._compte('appels')
+        if not self.breaker.allow():
+            self._compte('refus_disjoncteur')
+            raise BanUnavailable("disjoncteur ouvert")
+
+    def _echec(self, erreur):
+        self._compte('echecs')
+        self.breaker.failure()
+        raise BanUnavailable(str(erreur)) from erreur
+
+    def _erreur_client(self, erreur, status_code):
+        """
+        4xx : pas de nouvelle tentative ni d'échec du disjoncteur (le service répond).
+        Saisie refusée -> None (adresse inutilisable) ; autre 4xx (403, 404 : accès, URL) -> BanUnavailable
+        """
+        self._compte('erreurs_client')
+        self.breaker.success()
+        if status_code in CODES_REQUETE_REFUSEE:
+            return None
+        raise BanUnavailable(str(erreur)) from erreur
+
+    @staticmethod
+    def _longueur_valide(address):
+        return LONGUEUR_MIN_ADRESSE <= len(address.strip()) <= LONGUEUR_MAX_ADRESSE
+
+    def stats(self):
+        with self._lock:
+            return dict(self.compteurs, disjoncteur=self.breaker.etat)
+
+
+class BanClient(_BaseBanClient):
+    """Client synchrone, une Session partagée (thread-safe pour des GET simples)"""
+
+    def __init__(self, *args, taille_pool=TAILLE_POOL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=taille_pool, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def search(self, address):
+        if not self._longueur_valide(address):
+            return None
+        self._check_breaker()
+        derniere_erreur = None
+        for tentative in range(self.max_tentatives):
+            if tentative:
+                time.sleep(attente_backoff(tentative))
+            self._compte('tentatives')
+            try:
+                r = self.session.get(self.base_url, params=self._params(address),
+                                     timeout=(self.timeout_connexion, self.timeout_lecture))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                derniere_erreur = e
+                continue
+            if r.status_code in CODES_A_REESSAYER:
+                derniere_erreur = requests.HTTPError(f"HTTP {r.status_code}")
+                continue
+            if 400 <= r.status_code < 500:
+                return self._erreur_client(requests.HTTPError(f"HTTP {r.status_code}"), r.status_code)
+            try:
+                r.raise_for_status()
+                geo = parse_ban_response(r.json())
+            except (requests.HTTPError, ValueError) as e:
+                #autre erreur serveur ou réponse illisible : inutile de réessayer
+                self._echec(e)
+            self.breaker.success()
+            return geo
+        self._echec(derniere_erreur)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncBanClient(_BaseBanClient):
+    """
+    Client asyncio pour FastAPI. Un httpx.AsyncClient est lié à la boucle qui l'a créé :
+    on en garde un par boucle (une seule en production, plusieurs avec TestClient).
+    """
+
+    def __init__(self, *args, taille_pool=TAILLE_POOL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limits = httpx.Limits(max_connections=taille_pool, max_keepalive_connections=taille_pool)
+        self.timeout = httpx.Timeout(self.timeout_lecture, connect=self.timeout_connexion)
+        self._clients = {}
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            #boucles fermées : leurs clients ne sont plus utilisables
+            self._clients = {l: c for l, c in self._clients.items() if not l.is_closed()}
+            client = self._clients[loop] = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        return client
+
+    async def search(self, address):
+        if not self._longueur_valide(address):
+            return None
+        self._check_breaker()
+        client = self._client()
+        derniere_erreur = None
+        for tentative in range(self.max_tentatives):
+            if tentative:
+                await asyncio.sleep(attente_backoff(tentative))
+            self._compte('tentatives')
+            try:
+                r = await client.get(self.base_url, params=self._params(address))
+            except httpx.TransportError as e:
+                #connexion refusée, timeouts...
+                derniere_erreur = e
+                continue
+            if r.status_code in CODES_A_REESSAYER:
+                derniere_erreur = httpx.HTTPStatusError(f"HTTP {r.status_code}", request=r.request, response=r)
+                continue
+            if 400 <= r.status_code < 500:
+                return self._erreur_client(
+                    httpx.HTTPStatusError(f"HTTP {r.status_code}", request=r.request, response=r), r.status_code)
+            try:
+                r.raise_for_status()
+                geo = parse_ban_response(r.json())
+            except (httpx.HTTPStatusError, ValueError) as e:
+                self._echec(e)
+            self.breaker.success()
+            return geo
+        self._echec(derniere_erreur)
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
@@ -12,28 +12,85 @@ try:
     PATH_DVF = BASE_DIR / "data/DVF/geocodes/cleaned/dvf_paris_2020-2025-exploitables-clean.csv"
     PATH_RFR = BASE_DIR / "data/fiscal/cleaned/ircom_2020-2023_paris_clean.csv"
     PATH_ANNONCES = BASE_DIR / "data/scrapped/annonces_paris_clean_final.csv"
+    PATH_IMPORTANCE = BASE_DIR / "models/importance_arrondissements.csv"
 except ImportError:
     # Fallback chemins relatifs
     PATH_DVF = Path("data/DVF/geocodes/cleaned/dvf_paris_2020-2025-exploitables-clean.csv")
     PATH_RFR = Path("data/fiscal/cleaned/ircom_2020-2023_paris_clean.csv")
     PATH_ANNONCES = Path("data/scrapped/annonces_paris_clean_final.csv")
-
-
-@st.cache_data
-def load_dvf_data():
-    """Charge les données DVF."""
+    PATH_IMPORTANCE = Path("models/importance_arrondissements.csv")
+
+
+#types compacts des colonnes DVF : float32 / int16 pour les mesures, catégories pour les libellés répétés
+#(quelques dizaines de valeurs distinctes pour des centaines de milliers de lignes).
+#float64 pour les valeurs exportées telles quelles par l'explorateur : un float32 n'a que 7 chiffres
+#significatifs (1 234 567,89 € -> 1 234 567,875 ; longitude 2,3456789 -> 2,3456788)
+DVF_DTYPES = {
+    'valeur_fonciere': 'float64',
+    'surface_reelle_bati': 'float32',
+    'surface_terrain': 'float32',
+    'surface_m2_retenue': 'float32',
+    'prix_m2': 'float32',
+    'nombre_pieces_principales': 'float32',
+    'longitude': 'float64',
+    'latitude': 'float64',
+    'annee': 'int16',
+    'mois': 'int16',
+    'code_arrondissement': 'Int16',
+    'arrondissement': 'Int16',
+    'date_mutation': 'category',
+    'nature_mutation': 'category',
+    'type_local': 'category',
+    'adresse_numero': 'category',
+    'adresse_nom_voie': 'category',
+    'code_postal': 'category',
+    'code_commune': 'category',
+}
+#arrondissement lu en entier puis converti : catégories 1..20 numériques (tri et axes des graphiques)
+DVF_CATEGORIES_NUMERIQUES = ['code_arrondissement']
+
+#colonnes utilisées par la page d'accueil (KPIs et comparaison DVF / annonces)
+DVF_COLONNES_ACCUEIL = ('annee', 'prix_m2', 'code_arrondissement')
+
+
+def read_dvf(colonnes=None):
+    """
+    CSV DVF nettoyé -> DataFrame aux types compacts (DVF_DTYPES), limité à `colonnes` (None : toutes).
+    Sans cache : utilisé par load_dvf_data et par les mesures de bench_data_loader.py.
+    """
     if not PATH_DVF.exists():
         return pd.DataFrame()
 
-    df = pd.read_csv(PATH_DVF, sep=';', low_memory=False)
+    #moteur pyarrow : ne découpe que les colonnes demandées (le moteur C tokenise toute la ligne)
+    entete = pd.read_csv(PATH_DVF, sep=';', nrows=0).columns
+    usecols = None
+    if colonnes is not None:
+        #anciens fichiers : 'arrondissement' au lieu de 'code_arrondissement'
+        voulues = set(colonnes) | ({'arrondissement'} if 'code_arrondissement' in colonnes else set())
+        usecols = [c for c in entete if c in voulues]
+    dtype = {c: t for c, t in DVF_DTYPES.items() if c in (usecols or entete)}
+    df = pd.read_csv(PATH_DVF, sep=';', usecols=usecols, dtype=dtype, engine='pyarrow')
 
     # Standardisation Arrondissement (1-20)
     if 'code_arrondissement' not in df.columns and 'arrondissement' in df.columns:
         df.rename(columns={'arrondissement': 'code_arrondissement'}, inplace=True)
+    for col in DVF_CATEGORIES_NUMERIQUES:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
 
     return df
 
 
+@st.cache_resource(show_spinner="Chargement des transactions DVF...")
+def load_dvf_data(colonnes=None):
+    """
+    Charge les données DVF (colonnes : tuple des colonnes utiles, None pour toutes).
+    cache_resource : un seul DataFrame par jeu de colonnes, partagé par toutes les sessions sans copie
+    (cache_data le dépicklerait à chaque appel) ; il ne doit donc pas être modifié en place.
+    """
+    return read_dvf(colonnes)
+
+
 @st.cache_data
 def load_rfr_data(aggregate=True):
     """
@@ -92,4 +149,13 @@ def load_annonces_data():
     if 'type' in df.columns and 'type_local' not in df.columns:
         df.rename(columns={'type': 'type_local'}, inplace=True)
 
-    return df
\ No newline at end of file
+    return df
+
+
+@st.cache_data
+def load_importance_arrondissements():
+    """Importance des features par arrondissement (hausse de MAE en €/m²), produite par prediction.py."""
+    if not PATH_IMPORTANCE.exists():
+        return pd.DataFrame()
+
+    return pd.read_csv(PATH_IMPORTANCE, sep=';', index_col='arrondissement')
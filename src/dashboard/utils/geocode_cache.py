@@ -0,0 +1,157 @@
+"""
+Cache de géocodage à deux niveaux devant l'API BAN
+
+    - niveau 1 : LRU en mémoire du process (dict ordonné, quelques milliers d'adresses)
+    - niveau 2 : table SQLite sur disque, partagée entre l'API, le dashboard et les redémarrages
+La clé est l'adresse normalisée (minuscules, sans accents ni ponctuation superflue).
+Les entrées expirent après TTL_JOURS ; une adresse introuvable est aussi mise en cache
+(cache négatif, durée plus courte) pour ne pas réinterroger la BAN à chaque saisie.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from src.config import paths
+
+CACHE_DB_PATH = paths.models.path / "geocode_cache.db"  # artefact local, ignoré par git
+
+TAILLE_LRU = 5000
+TTL_JOURS = 30
+TTL_NEGATIF_HEURES = 24
+
+
+def normalize_address(address):
+    """'10, Rue de Rivoli  75004 PARIS' -> '10 rue de rivoli 75004 paris'"""
+    texte = unicodedata.normalize('NFKD', str(address)).encode('ascii', 'ignore').decode().lower()
+    texte = re.sub(r"[^a-z0-9 ]", " ", texte)
+    return " ".join(texte.split())
+
+
+class GeocodeCache:
+    """
+    cache.get(address) -> (trouvé, valeur, niveau) ; valeur None = adresse introuvable (cache négatif)
+    cache.put(address, valeur, duree_miss_ms) ; valeur None pour une adresse introuvable
+    cache.put_many([(address, valeur, duree_miss_ms), ...]) : une seule transaction pour un lot
+    """
+
+    def __init__(self, db_path=None, taille_lru=TAILLE_LRU,
+                 ttl=TTL_JOURS * 86400, ttl_negatif=TTL_NEGATIF_HEURES * 3600):
+        self.db_path = db_path or CACHE_DB_PATH
+        self.taille_lru = taille_lru
+        self.ttl = ttl
+        self.ttl_negatif = ttl_negatif
+        self._lru = OrderedDict()  # clé -> (expiration, valeur)
+        self._lock = threading.Lock()
+        self.compteurs = {'hits_memoire': 0, 'hits_disque': 0, 'hits_negatifs': 0, 'misses': 0}
+        #durée cumulée des appels BAN, pour estimer le temps gagné par hit
+        self._duree_miss_ms = 0.0
+        self._init_db()
+
+    def _connect(self):
+        #une connexion par appel : le cache est utilisé depuis plusieurs threads (FastAPI, Streamlit)
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS geocodes (
+                cle TEXT PRIMARY KEY,
+                valeur TEXT,
+                expiration REAL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _remember(self, cle, expiration, valeur):
+        with self._lock:
+            self._lru[cle] = (expiration, valeur)
+            self._lru.move_to_end(cle)
+            while len(self._lru) > self.taille_lru:
+                self._lru.popitem(last=False)
+
+    def _count(self, compteur, valeur):
+        with self._lock:
+            self.compteurs[compteur] += 1
+            if valeur is None and compteur != 'misses':
+                self.compteurs['hits_negatifs'] += 1
+
+    def get(self, address):
+        cle = normalize_address(address)
+        maintenant = time.time()
+
+        with self._lock:
+            entree = self._lru.get(cle)
+            if entree is not None:
+                if entree[0] > maintenant:
+                    self._lru.move_to_end(cle)
+                else:
+                    del self._lru[cle]
+                    entree = None
+        if entree is not None:
+            self._count('hits_memoire', entree[1])
+            return True, entree[1], 'memoire'
+
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT valeur, expiration FROM geocodes WHERE cle = ?", (cle,)).fetchone()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Erreur cache géocodage: {e}")
+            row = None
+
+        if row is not None and row[1] > maintenant:
+            valeur = json.loads(row[0]) if row[0] is not None else None
+            self._remember(cle, row[1], valeur)
+            self._count('hits_disque', valeur)
+            return True, valeur, 'disque'
+
+        self._count('misses', None)
+        return False, None, None
+
+    def put(self, address, valeur, duree_miss_ms=0.0):
+        self.put_many([(address, valeur, duree_miss_ms)])
+
+    def put_many(self, entrees):
+        lignes = []
+        for address, valeur, duree_miss_ms in entrees:
+            cle = normalize_address(address)
+            expiration = time.time() + (self.ttl if valeur is not None else self.ttl_negatif)
+            self._remember(cle, expiration, valeur)
+            with self._lock:
+                self._duree_miss_ms += duree_miss_ms
+            lignes.append((cle, json.dumps(valeur) if valeur is not None else None, expiration))
+        if not lignes:
+            return
+
+        try:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO geocodes (cle, valeur, expiration) VALUES (?, ?, ?)", lignes)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Erreur cache géocodage: {e}")
+
+    def purge(self):
+        """Supprime les entrées expirées de la table (le LRU s'en charge à la lecture)"""
+        conn = self._connect()
+        n = conn.execute("DELETE FROM geocodes WHERE expiration <= ?", (time.time(),)).rowcount
+        conn.commit()
+        conn.close()
+        return n
+
+    def stats(self):
+        """Compteurs, taux de hit et temps BAN économisé (estimé avec la durée moyenne d'un miss)"""
+        with self._lock:
+            c = dict(self.compteurs)
+            duree_miss_ms = self._duree_miss_ms
+            c['taille_lru'] = len(self._lru)
+        hits = c['hits_memoire'] + c['hits_disque']
+        total = hits + c['misses']
+        c['taux_hit'] = hits / total if total else None
+        c['miss_moyen_ms'] = duree_miss_ms / c['misses'] if c['misses'] else None
+        c['gain_estime_ms'] = hits * c['miss_moyen_ms'] if c['miss_moyen_ms'] is not None else None
+        return c
@@ -0,0 +1,224 @@
+"""
+Géocodeur hors-ligne construit à partir des adresses DVF nettoyées
+
+Le fichier DVF porte adresse_numero / adresse_nom_voie / code_postal / latitude / longitude pour ~190K ventes :
+on en tire un index rue -> numéros -> coordonnées.
+    - recherche exacte (rue normalisée + numéro)
+    - rue approchée via un index de trigrammes ("bd voltair" -> "bd voltaire")
+    - numéro absent de DVF : interpolation entre les numéros connus du même côté de la rue (pairs/impairs)
+
+Construction (une fois, après clean.py) :
+    python src/dashboard/utils/geocoder_offline.py
+MLPredictor charge models/geocodeur_dvf.pkl s'il existe, l'API BAN ne sert plus qu'en secours.
+"""
+import re
+import sys
+import pickle
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILENAME = "geocodeur_dvf.pkl"
+SEUIL_SIMILARITE = 0.45  # Jaccard sur trigrammes en dessous duquel on renonce
+
+#formes longues -> abréviations utilisées dans DVF (appliqué aux deux côtés)
+ABREVIATIONS = {
+    'avenue': 'av', 'boulevard': 'bd', 'place': 'pl', 'faubourg': 'fg', 'saint': 'st', 'sainte': 'ste',
+    'impasse': 'imp', 'allee': 'all', 'square': 'sq', 'passage': 'pas', 'villa': 'vla', 'chemin': 'che',
+    'route': 'rte', 'cours': 'crs', 'galerie': 'gal', 'hameau': 'ham', 'sentier': 'sen', 'quartier': 'qua',
+    'grande': 'gde', 'petite': 'pte', 'docteur': 'dr', 'general': 'gal', 'marechal': 'mal',
+    'president': 'pdt', 'professeur': 'pr', 'bld': 'bd', 'blvd': 'bd',
+}
+MOTS_IGNORES = {'paris', 'france', 'cedex'}
+
+
+def normalize_voie(texte):
+    """Minuscules, sans accents ni ponctuation, abréviations DVF"""
+    texte = unicodedata.normalize('NFKD', str(texte)).encode('ascii', 'ignore').decode().lower()
+    texte = re.sub(r"[^a-z0-9 ]", " ", texte)
+    mots = [ABREVIATIONS.get(m, m) for m in texte.split() if m not in MOTS_IGNORES]
+    return " ".join(mots)
+
+
+def parse_address(address):
+    """'10 bis rue de Rivoli, 75004 Paris' -> (10, 'rue de rivoli', '75004')"""
+    texte = str(address)
+    cp = re.search(r"\b(75\d{3})\b", texte)
+    code_postal = cp.group(1) if cp else None
+    if cp:
+        texte = texte.replace(cp.group(1), " ")
+
+    numero = None
+    m = re.match(r"\s*(\d+)\s*,?\s*(?:(bis|ter|quater|[btq])\b)?", texte, flags=re.IGNORECASE)
+    if m:
+        numero = int(m.group(1))
+        texte = texte[m.end():]
+
+    return numero, normalize_voie(texte), code_postal
+
+
+def trigrams(texte):
+    padded = f"  {texte} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class OfflineGeocoder:
+    """Index rue normalisée -> numéros triés -> (lat, lon, code postal)"""
+
+    def __init__(self, streets):
+        #streets : {voie_normalisee: {'label': str, 'numeros': [int], 'lat': [..], 'lon': [..], 'cp': [..]}}
+        self.streets = streets
+        self._build_trigram_index()
+
+    def _build_trigram_index(self):
+        self.street_names = list(self.streets)
+        self.street_trigrams = [trigrams(name) for name in self.street_names]
+        self.trigram_index = {}
+        for idx, grams in enumerate(self.street_trigrams):
+            for g in grams:
+                self.trigram_index.setdefault(g, []).append(idx)
+
+    @classmethod
+    def from_dvf(cls, df):
+        """Construit l'index depuis le DataFrame DVF nettoyé (colonnes adresse_* / code_postal / lat / lon)"""
+        df = df[['adresse_numero', 'adresse_nom_voie', 'code_postal', 'latitude', 'longitude']].copy()
+        for col in ['adresse_numero', 'code_postal', 'latitude', 'longitude']:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        df = df.dropna(subset=['adresse_nom_voie', 'latitude', 'longitude'])
+        df['voie'] = df['adresse_nom_voie'].map(normalize_voie)
+
+        #une position par (rue, numéro) : moyenne des ventes géocodées à ce numéro
+        df['adresse_numero'] = df['adresse_numero'].fillna(-1).astype(int)
+        agg = (df.groupby(['voie', 'adresse_numero'])
+                 .agg(lat=('latitude', 'mean'), lon=('longitude', 'mean'),
+                      cp=('code_postal', lambda s: s.mode().iat[0] if s.notna().any() else np.nan),
+                      label=('adresse_nom_voie', 'first'))
+                 .reset_index())
+
+        streets = {}
+        for voie, g in agg.groupby('voie', sort=False):
+            g = g.sort_values('adresse_numero')
+            streets[voie] = {
+                'label': g['label'].iat[0],
+                'numeros': g['adresse_numero'].tolist(),
+                'lat': g['lat'].tolist(),
+                'lon': g['lon'].tolist(),
+                'cp': [None if pd.isna(c) else f"{int(c)}" for c in g['cp']],
+            }
+        return cls(streets)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self.streets, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(pickle.load(f))
+
+    def match_street(self, voie):
+        """Rue exacte, sinon la plus proche au sens des trigrammes (Jaccard)"""
+        if voie in self.streets:
+            return voie, 1.0
+        grams = trigrams(voie)
+        shared = Counter()
+        for g in grams:
+            shared.update(self.trigram_index.get(g, ()))
+        best, best_score = None, 0.0
+        for idx, n in shared.items():
+            score = n / (len(grams) + len(self.street_trigrams[idx]) - n)
+            if score > best_score:
+                best, best_score = idx, score
+        if best is None or best_score < SEUIL_SIMILARITE:
+            return None, best_score
+        return self.street_names[best], best_score
+
+    def _locate(self, street, numero, code_postal):
+        """(lat, lon, cp, precision) pour un numéro de la rue, exact ou interpolé"""
+        idx_all = range(len(street['numeros']))
+        #rue à cheval sur plusieurs arrondissements : on privilégie le code postal donné
+        if code_postal and code_postal in street['cp']:
+            idx_all = [i for i in idx_all if street['cp'][i] == code_postal]
+        idx = [i for i in idx_all if street['numeros'][i] >= 0]
+
+        if numero is None or not idx:
+            i_ref = list(idx_all)
+            lat = float(np.mean([street['lat'][i] for i in i_ref]))
+            lon = float(np.mean([street['lon'][i] for i in i_ref]))
+            return lat, lon, street['cp'][i_ref[0]], 'rue'
+
+        numeros = [street['numeros'][i] for i in idx]
+        pos = bisect_left(numeros, numero)
+        if pos < len(numeros) and numeros[pos] == numero:
+            i = idx[pos]
+            return street['lat'][i], street['lon'][i], street['cp'][i], 'exact'
+
+        #même côté de la rue (parité) si possible
+        cote = [k for k, n in enumerate(numeros) if n % 2 == numero % 2] or list(range(len(numeros)))
+        bas = [k for k in cote if numeros[k] < numero]
+        haut = [k for k in cote if numeros[k] > numero]
+        if bas and haut:
+            a, b = idx[bas[-1]], idx[haut[0]]
+            na, nb = street['numeros'][a], street['numeros'][b]
+            t = (numero - na) / (nb - na)
+            lat = street['lat'][a] + t * (street['lat'][b] - street['lat'][a])
+            lon = street['lon'][a] + t * (street['lon'][b] - street['lon'][a])
+            return lat, lon, street['cp'][a], 'interpolation'
+        i = idx[bas[-1]] if bas else idx[haut[0]]
+        return street['lat'][i], street['lon'][i], street['cp'][i], 'numero_proche'
+
+    def geocode(self, address):
+        """Même format que MLPredictor.geocode_address, None si la rue n'est pas reconnue"""
+        numero, voie, code_postal = parse_address(address)
+        if not voie:
+            return None
+        key, score = self.match_street(voie)
+        if key is None:
+            return None
+
+        street = self.streets[key]
+        lat, lon, cp, precision = self._locate(street, numero, code_postal)
+        cp = cp or code_postal
+        if cp and cp.startswith('75'):
+            arrondissement = int(cp[-2:])
+        else:
+            arrondissement = 1  # même fallback que le géocodage BAN
+
+        label = f"{numero} {street['label'].title()}" if numero is not None else street['label'].title()
+        return {
+            'latitude': float(lat),
+            'longitude': float(lon),
+            'arrondissement': arrondissement,
+            'label': f"{label} {cp or ''} Paris".replace("  ", " "),
+            'source': 'dvf',
+            'precision': precision,
+            'score': round(score, 3),
+        }
+
+
+def main():
+    root_path = Path(__file__).resolve().parents[3]
+    if str(root_path) not in sys.path:
+        sys.path.insert(0, str(root_path))
+    from src.config import paths
+
+    input_path = paths.data.DVF.geocodes.cleaned / "dvf_paris_2020-2025-exploitables-clean.csv"
+    output_path = paths.models.path / INDEX_FILENAME
+
+    print(f"Chargement: {input_path.name}")
+    df = pd.read_csv(input_path, sep=';', dtype=str,
+                     usecols=['adresse_numero', 'adresse_nom_voie', 'code_postal', 'latitude', 'longitude'])
+    geocoder = OfflineGeocoder.from_dvf(df)
+    n_numeros = sum(len(s['numeros']) for s in geocoder.streets.values())
+    print(f"OK - {len(geocoder.streets)} voies, {n_numeros} numéros")
+
+    geocoder.save(output_path)
+    print(f"Index sauvegardé: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
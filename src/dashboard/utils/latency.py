@@ -0,0 +1,113 @@
+"""
+Mesure des durées par étape d'une estimation (géocodage, features, scaler, modèles...)
+
+Chaque estimation crée un StageTimer : les durées sont gardées pour la réponse / la ligne de log,
+et ajoutées aux histogrammes du process (STAGE_HISTOGRAMS) pour voir les points chauds sans profiler.
+"""
+import math
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+#bornes hautes des buckets en millisecondes (la dernière case = au-delà)
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Histogramme cumulable à buckets fixes, thread-safe"""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        idx = bisect_left(self.buckets, ms)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += ms
+
+    def quantile(self, q):
+        """Approximation : borne haute du bucket qui contient le quantile q"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return float('nan')
+        rang = q * total
+        cumul = 0
+        for borne, n in zip(self.buckets + (float('inf'),), counts):
+            cumul += n
+            if cumul >= rang:
+                return borne
+        return float('inf')
+
+    def snapshot(self):
+        """Résumé sérialisable en JSON (None si vide ou au-delà du dernier bucket)"""
+        with self._lock:
+            count, total = self.count, self.sum
+        resume = {
+            'count': count,
+            'moyenne_ms': total / count if count else None,
+            'p50_ms': self.quantile(0.50),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+        }
+        return {k: (v if v is None or math.isfinite(v) else None) for k, v in resume.items()}
+
+
+class StageHistograms:
+    """Un histogramme par nom d'étape, créé à la première mesure"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, ms):
+        hist = self._histograms.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(stage, LatencyHistogram())
+        hist.observe(ms)
+
+    def items(self):
+        with self._lock:
+            return list(self._histograms.items())
+
+    def snapshot(self):
+        return {stage: hist.snapshot() for stage, hist in self.items()}
+
+
+STAGE_HISTOGRAMS = StageHistograms()
+
+
+class StageTimer:
+    """Chronomètre d'une estimation : with timer.stage('geocodage'): ..."""
+
+    def __init__(self, histograms=STAGE_HISTOGRAMS):
+        self.durations_ms = {}
+        self._histograms = histograms
+        self._start = perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        debut = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (perf_counter() - debut) * 1000)
+
+    def record(self, name, ms):
+        """Durée mesurée ailleurs (étape partagée par un lot de requêtes)"""
+        self.durations_ms[name] = round(ms, 3)
+        self._histograms.observe(name, ms)
+
+    def finish(self):
+        """Ajoute le total (toutes étapes + glue) et renvoie les durées"""
+        total = (perf_counter() - self._start) * 1000
+        self.durations_ms['total'] = round(total, 3)
+        self._histograms.observe('total', total)
+        return self.durations_ms
@@ -1,63 +1,245 @@
+import os
 import pickle
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, monotonic
 import pandas as pd
 import numpy as np
-import requests
 import streamlit as st
 from src.config import paths
+from src.dashboard.utils.quantile_trees import FusedQuantileTrees, garder_bornes
+from src.dashboard.utils.latency import StageTimer
+from src.dashboard.utils.geocoder_offline import OfflineGeocoder, INDEX_FILENAME
+from src.dashboard.utils.geocode_cache import GeocodeCache
+from src.dashboard.utils.arrondissements import get_resolver
+from src.dashboard.utils.ban_client import BanClient, AsyncBanClient, BanUnavailable, CircuitBreaker
+from src.dashboard.utils.micro_batch import MicroBatcher
 
 MODELS_DIR = paths.models.path
 
+#pools bornés du chemin asynchrone (threads créés à la demande, rien n'est lancé côté Streamlit)
+IO_THREADS = 8
+CPU_THREADS = min(4, os.cpu_count() or 1)
+
+#artefacts dont dépend une estimation : leur empreinte sert de version de modèle
+MODEL_FILES = ["model_linear_regression.pkl", "model_logistic_regression.pkl", "scaler.pkl",
+               "feature_names.pkl", "model_quantiles.pkl", INDEX_FILENAME]
+INTERVALLE_VERIF_MODELE = 5.0  # secondes entre deux stat() des fichiers de models/
+
+#erreurs renvoyées par estimate_* : {'error': message, 'cause': cause}
+ERREUR_ADRESSE = "Adresse introuvable à Paris"
+ERREUR_BAN = "Service de géocodage (BAN) indisponible, réessayer plus tard"
+
+
+def model_fingerprint(models_dir=None):
+    """Empreinte courte (nom, taille, date de modification) des fichiers de MODEL_FILES présents"""
+    models_dir = models_dir or MODELS_DIR
+    h = hashlib.sha1()
+    for name in MODEL_FILES:
+        try:
+            infos = os.stat(models_dir / name)
+        except FileNotFoundError:
+            continue
+        h.update(f"{name}:{infos.st_size}:{infos.st_mtime_ns};".encode())
+    return h.hexdigest()[:12]
+
+
+class ModelBundle:
+    """
+    Modèles et index d'une version de models/ : chargés ensemble, remplacés d'un bloc.
+    Un lot en cours garde la référence à son ensemble (jamais un nouveau modèle avec un ancien scaler).
+    """
+
+    def __init__(self, version=None, model_linear=None, model_logistic=None, scaler=None, feature_names=None,
+                 quantile_trees=None, offline_geocoder=None):
+        self.version = version
+        self.model_linear = model_linear
+        self.model_logistic = model_logistic
+        self.scaler = scaler
+        self.feature_names = feature_names
+        self.quantile_trees = quantile_trees
+        self.offline_geocoder = offline_geocoder
+
+    @classmethod
+    def load(cls, models_dir=None):
+        """
+        Ensemble complet ; exception si un modèle obligatoire ne se charge pas ou si les fichiers
+        changent pendant la lecture. Quantiles et index DVF absents -> None.
+        """
+        models_dir = models_dir or MODELS_DIR
+        version = model_fingerprint(models_dir)
+        obligatoires = {}
+        for attribut, name in [('model_linear', "model_linear_regression.pkl"),
+                               ('model_logistic', "model_logistic_regression.pkl"),
+                               ('scaler', "scaler.pkl"), ('feature_names', "feature_names.pkl")]:
+            with open(models_dir / name, 'rb') as f:
+                obligatoires[attribut] = pickle.load(f)
+
+        #intervalles quantiles optionnels (anciens dossiers models/ sans model_quantiles.pkl -> +/-20%)
+        quantile_trees = None
+        try:
+            with open(models_dir / "model_quantiles.pkl", 'rb') as f:
+                bundle = pickle.load(f)
+            quantile_trees = FusedQuantileTrees(*garder_bornes(bundle['models'], bundle['quantiles']))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur chargement quantiles: {e}")
+
+        #index d'adresses DVF (geocoder_offline.py), sinon tout passe par l'API BAN
+        offline_geocoder = None
+        try:
+            offline_geocoder = OfflineGeocoder.load(models_dir / INDEX_FILENAME)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur chargement géocodeur hors-ligne: {e}")
+
+        #fichier réécrit pendant la lecture : version incohérente, nouvel essai quand l'empreinte sera stable
+        if model_fingerprint(models_dir) != version:
+            raise RuntimeError("fichiers de models/ modifiés pendant le chargement")
+        return cls(version, quantile_trees=quantile_trees, offline_geocoder=offline_geocoder, **obligatoires)
+
+
 class MLPredictor:
     def __init__(self):
-        self.model_linear = None
-        self.model_logistic = None
-        self.scaler = None
-        self.feature_names = None
-        self._load_models()
+        self.geocode_cache = GeocodeCache()
+        #un seul disjoncteur : si la BAN tombe, les deux clients arrêtent de l'appeler
+        breaker = CircuitBreaker()
+        self.ban_client = BanClient(breaker=breaker)
+        self.ban_client_async = AsyncBanClient(breaker=breaker)
+        self.io_executor = ThreadPoolExecutor(IO_THREADS, thread_name_prefix="io")
+        self.cpu_executor = ThreadPoolExecutor(CPU_THREADS, thread_name_prefix="modele")
+        #requêtes asynchrones simultanées regroupées en un appel des modèles
+        self.batcher = MicroBatcher(self.estimate_batch, self.cpu_executor)
+        self._version_verifiee = monotonic()
+        self._empreinte_vue = None
+        self._empreinte_echec = None  # empreinte dont le chargement a échoué : pas de nouvel essai tant qu'elle ne change pas
+        self._rechargement_en_cours = False
 
-    def _load_models(self):
+        #polygones data/arrondissements.geojson (absent -> arrondissement du code postal), hors models/
+        self.arrondissement_resolver = None
         try:
-            with open(MODELS_DIR / "model_linear_regression.pkl", 'rb') as f:
-                self.model_linear = pickle.load(f)
-            with open(MODELS_DIR / "model_logistic_regression.pkl", 'rb') as f:
-                self.model_logistic = pickle.load(f)
-            with open(MODELS_DIR / "scaler.pkl", 'rb') as f:
-                self.scaler = pickle.load(f)
-            with open(MODELS_DIR / "feature_names.pkl", 'rb') as f:
-                self.feature_names = pickle.load(f)
+            self.arrondissement_resolver = get_resolver()
+        except Exception as e:
+            print(f"Erreur chargement arrondissements: {e}")
+
+        try:
+            self.models = ModelBundle.load()
         except Exception as e:
             print(f"Erreur chargement: {e}")
+            self.models = ModelBundle()
+
+    #accès en lecture à l'ensemble courant
+    model_version = property(lambda self: self.models.version)
+    model_linear = property(lambda self: self.models.model_linear)
+    model_logistic = property(lambda self: self.models.model_logistic)
+    scaler = property(lambda self: self.models.scaler)
+    feature_names = property(lambda self: self.models.feature_names)
+    quantile_trees = property(lambda self: self.models.quantile_trees)
+    offline_geocoder = property(lambda self: self.models.offline_geocoder)
 
-    def geocode_address(self, address: str):
-        #utilisation de l'API publique Adresse
-        url = "https://api-adresse.data.gouv.fr/search/"
-        params = {'q': address, 'citycode': '75056', 'limit': 1}
+    def check_model_version(self):
+        """
+        Version des modèles servie ; rechargement en arrière-plan si les fichiers de models/ ont changé
+        (réentraînement). Au plus un stat() par INTERVALLE_VERIF_MODELE, le rechargement attend que
+        l'empreinte soit stable d'une vérification à l'autre (fichiers en cours d'écriture).
+        L'ancienne version reste servie jusqu'à ce que la nouvelle soit entièrement chargée.
+        """
+        maintenant = monotonic()
+        if maintenant - self._version_verifiee < INTERVALLE_VERIF_MODELE or self._rechargement_en_cours:
+            return self.model_version
+        self._version_verifiee = maintenant
 
+        empreinte = model_fingerprint()
+        if empreinte not in (self.model_version, self._empreinte_echec):
+            if empreinte == self._empreinte_vue:
+                self._rechargement_en_cours = True
+                threading.Thread(target=self._reload, args=(empreinte,), daemon=True, name="modeles").start()
+            self._empreinte_vue = empreinte
+        return self.model_version
+
+    def _reload(self, empreinte):
         try:
-            r = requests.get(url, params=params)
-            data = r.json()
-            if data['features']:
-                props = data['features'][0]['properties']
-                coords = data['features'][0]['geometry']['coordinates']
-                postcode = props.get('postcode')
-
-                #detection arrondissement
-                if postcode and str(postcode).startswith('75'):
-                    arrondissement = int(str(postcode)[-2:])
-                else:
-                    arrondissement = 1 # Fallback
-
-                return {
-                    'latitude': coords[1],
-                    'longitude': coords[0],
-                    'arrondissement': arrondissement,
-                    'label': props.get('label')
-                }
+            print(f"Modèles modifiés ({self.model_version} -> {empreinte}), rechargement")
+            models = ModelBundle.load()
+            #une seule affectation : les lots en cours finissent avec l'ancien ensemble
+            self.models = models
         except Exception as e:
+            self._empreinte_echec = empreinte
+            print(f"Erreur rechargement des modèles, version {self.model_version} conservée: {e}")
+        finally:
+            self._rechargement_en_cours = False
+
+    def _geocode_local(self, address):
+        """(trouvé, geo) sans réseau : index DVF puis cache LRU + SQLite"""
+        #d'abord l'index DVF local, l'API publique Adresse en secours
+        offline_geocoder = self.models.offline_geocoder
+        if offline_geocoder is not None:
+            geo = offline_geocoder.geocode(address)
+            if geo:
+                return True, geo
+
+        #une adresse déjà vue (trouvée ou non) ne repart pas vers la BAN
+        trouve, geo, niveau = self.geocode_cache.get(address)
+        if trouve:
+            return True, (dict(geo, source=f"cache_{niveau}") if geo else None)
+        return False, None
+
+    def geocode_address(self, address: str, leve_indisponible=False):
+        """geo ou None ; BanUnavailable (erreur réseau, disjoncteur) levée si leve_indisponible, sinon None"""
+        trouve, geo = self._geocode_local(address)
+        if trouve:
+            return geo
+
+        debut = perf_counter()
+        try:
+            geo = self.ban_client.search(address)
+        except BanUnavailable as e:
+            #erreur réseau / disjoncteur : pas de mise en cache, on réessaiera
             print(f"Erreur Geocoding: {e}")
-        return None
+            if leve_indisponible:
+                raise
+            return None
+        self.geocode_cache.put(address, geo, (perf_counter() - debut) * 1000)
+        return geo
+
+    async def geocode_address_async(self, address: str, leve_indisponible=False):
+        """
+        Même chose que geocode_address sans rien bloquer sur la boucle asyncio :
+        index DVF et cache SQLite dans le pool d'E/S, appel BAN asynchrone
+        """
+        loop = asyncio.get_running_loop()
+        trouve, geo = await loop.run_in_executor(self.io_executor, self._geocode_local, address)
+        if trouve:
+            return geo
+
+        debut = perf_counter()
+        try:
+            geo = await self.ban_client_async.search(address)
+        except BanUnavailable as e:
+            print(f"Erreur Geocoding: {e}")
+            if leve_indisponible:
+                raise
+            return None
+        await loop.run_in_executor(self.io_executor, self.geocode_cache.put,
+                                   address, geo, (perf_counter() - debut) * 1000)
+        return geo
 
     def prepare_features(self, surface_m2, nb_pieces, annee, latitude, longitude, code_arrondissement):
+        return self.prepare_features_batch([surface_m2], [nb_pieces], [annee],
+                                           [latitude], [longitude], [code_arrondissement])
+
+    def prepare_features_batch(self, surface_m2, nb_pieces, annee, latitude, longitude, code_arrondissement,
+                               feature_names=None):
+        """Features de plusieurs biens (listes / tableaux de même longueur), une ligne par bien"""
+        feature_names = self.feature_names if feature_names is None else feature_names
+        latitude = np.asarray(latitude, dtype=float)
+        longitude = np.asarray(longitude, dtype=float)
+        code_arrondissement = np.asarray(code_arrondissement)
+
         #distance point 0 (notre dame)
         R = 6371
         lat_nd, lon_nd = 48.853, 2.3499
@@ -69,10 +251,10 @@ class MLPredictor:
 
         #dictionnaire
         data = {
-            'log_surface_m2': np.log1p(surface_m2),
+            'log_surface_m2': np.log1p(np.asarray(surface_m2, dtype=float)),
             'dist_center': dist_center,
-            'annee_norm': (annee - 2020) / 5.0,
-            'nb_pieces_fill': float(nb_pieces),
+            'annee_norm': (np.asarray(annee, dtype=float) - 2020) / 5.0,
+            'nb_pieces_fill': np.asarray(nb_pieces, dtype=float),
             'latitude': latitude,
             'longitude': longitude
         }
@@ -80,53 +262,144 @@ class MLPredictor:
         #one hot encoding
         for i in range(1, 21):
             col_name = f"arrond_{i}"
-            if col_name in self.feature_names:
-                data[col_name] = 1 if code_arrondissement == i else 0
+            if col_name in feature_names:
+                data[col_name] = (code_arrondissement == i).astype(int)
 
         #DataFrame aligné
-        df = pd.DataFrame([data])
-        for col in self.feature_names:
+        df = pd.DataFrame(data)
+        for col in feature_names:
             if col not in df.columns:
                 df[col] = 0
 
-        return df[self.feature_names]
+        return df[feature_names]
 
     def estimate_complet(self, surface_m2, nb_pieces, annee, address_str):
+        #durées par étape : renvoyées dans 'timings_ms' et cumulées dans STAGE_HISTOGRAMS
+        timer = StageTimer()
+
         # geocodage
-        geo = self.geocode_address(address_str)
+        indisponible = False
+        with timer.stage('geocodage'):
+            try:
+                geo = self.geocode_address(address_str, leve_indisponible=True)
+            except BanUnavailable:
+                geo, indisponible = None, True
+        if indisponible:
+            return {'error': ERREUR_BAN, 'cause': 'ban_indisponible', 'timings_ms': timer.finish()}
+        return self._estimate(timer, geo, surface_m2, nb_pieces, annee)
+
+    async def estimate_complet_async(self, surface_m2, nb_pieces, annee, address_str):
+        """
+        Variante pour FastAPI : géocodage asynchrone, puis modèles dans le pool de calcul
+        (séparé du pool d'E/S : une rafale de géocodages lents ne retarde pas les prédictions),
+        par lots avec les requêtes arrivées dans la même fenêtre (micro_batch.py)
+        """
+        timer = StageTimer()
+        indisponible = False
+        with timer.stage('geocodage'):
+            try:
+                geo = await self.geocode_address_async(address_str, leve_indisponible=True)
+            except BanUnavailable:
+                geo, indisponible = None, True
+        if indisponible:
+            #panne BAN : à distinguer d'une adresse introuvable (métriques, code HTTP)
+            return {'error': ERREUR_BAN, 'cause': 'ban_indisponible', 'timings_ms': timer.finish()}
         if not geo:
-            return {'error': "Adresse introuvable à Paris"}
+            return self._estimate(timer, geo, surface_m2, nb_pieces, annee)
+        return await self.batcher.submit((timer, geo, surface_m2, nb_pieces, annee))
+
+    def _estimate(self, timer, geo, surface_m2, nb_pieces, annee):
+        return self.estimate_batch([(timer, geo, surface_m2, nb_pieces, annee)])[0]
+
+    def estimate_batch(self, items):
+        """
+        Estimations de plusieurs biens en un appel de chaque modèle (micro-batching de l'API, CSV).
+        items : [(timer, geo, surface_m2, nb_pieces, annee), ...] -> une réponse par item, dans l'ordre.
+        Chaque timer reçoit la durée des étapes du lot entier (ce que la requête a attendu).
+        """
+        #un seul ensemble de modèles pour tout le lot, même si un rechargement le remplace entre-temps
+        models = self.models
+        results = [None] * len(items)
+        lignes = []
+        for k, (timer, geo, surface_m2, nb_pieces, annee) in enumerate(items):
+            if not geo:
+                results[k] = {'error': ERREUR_ADRESSE, 'cause': 'adresse_introuvable', 'timings_ms': timer.finish()}
+            else:
+                lignes.append(k)
+        if not lignes:
+            return results
+
+        timers = [items[k][0] for k in lignes]
+        geos = [items[k][1] for k in lignes]
+        surfaces = np.array([items[k][2] for k in lignes], dtype=float)
+
+        def record(stage, debut):
+            ms = (perf_counter() - debut) * 1000
+            for timer in timers:
+                timer.record(stage, ms)
 
         #préparation
-        X = self.prepare_features(
-            surface_m2, nb_pieces, annee,
-            geo['latitude'], geo['longitude'], geo['arrondissement']
+        debut = perf_counter()
+        latitudes = np.array([g['latitude'] for g in geos], dtype=float)
+        longitudes = np.array([g['longitude'] for g in geos], dtype=float)
+        #arrondissement par les polygones plutôt que par le code postal (repli sur ce dernier hors grille)
+        if self.arrondissement_resolver is not None:
+            if len(geos) == 1:
+                codes = [self.arrondissement_resolver.resolve(latitudes[0], longitudes[0])]
+            else:
+                codes = self.arrondissement_resolver.resolve_many(latitudes, longitudes).tolist()
+            geos = [dict(g, arrondissement=int(c)) if c else g for g, c in zip(geos, codes)]
+        X = self.prepare_features_batch(
+            surfaces, [items[k][3] for k in lignes], [items[k][4] for k in lignes],
+            latitudes, longitudes, [g['arrondissement'] for g in geos], models.feature_names
         )
+        record('preparation', debut)
 
         #le scaler renvoie un numpy array (sans nom), on le remet en DataFrame pour que Sklearn arrête de crier
-        X_scaled_array = self.scaler.transform(X)
-        X_scaled = pd.DataFrame(X_scaled_array, columns=self.feature_names)
+        debut = perf_counter()
+        X_scaled_array = models.scaler.transform(X)
+        X_scaled = pd.DataFrame(X_scaled_array, columns=models.feature_names)
+        record('scaling', debut)
 
         #prédiction
-        prix_m2 = self.model_linear.predict(X_scaled)[0]
-
-        #classification
-        probas = self.model_logistic.predict_proba(X_scaled)[0]
-        classe = self.model_logistic.predict(X_scaled)[0]
-
-        return {
-            'prix_m2_estime': prix_m2,
-            'prix_total_estime': prix_m2 * surface_m2,
-            'prix_m2_min': prix_m2 * 0.80,
-            'prix_m2_max': prix_m2 * 1.20,
-            'prix_total_min': (prix_m2 * surface_m2) * 0.80,
-            'prix_total_max': (prix_m2 * surface_m2) * 1.20,
-            'classification': "Cher" if classe == 1 else "Bon marché",
-            'probabilite_cher': probas[1],
-            'probabilite_bon_marche': probas[0],
-            'confiance': max(probas) * 100,
-            'geo_info': geo
-        }
+        debut = perf_counter()
+        prix_m2 = models.model_linear.predict(X_scaled)
+        record('prediction', debut)
+
+        #classification : la classe se déduit des probas, pas besoin d'un second appel à predict
+        debut = perf_counter()
+        probas = models.model_logistic.predict_proba(X_scaled)
+        classes = models.model_logistic.classes_[np.argmax(probas, axis=1)]
+        record('classification', debut)
+
+        #intervalle : quantiles bas/haut évalués en une passe, sinon +/-20%
+        debut = perf_counter()
+        if models.quantile_trees is not None:
+            bornes = models.quantile_trees.predict(X_scaled_array)
+            prix_m2_min = np.minimum(bornes[:, 0], prix_m2)
+            prix_m2_max = np.maximum(bornes[:, -1], prix_m2)
+        else:
+            prix_m2_min = prix_m2 * 0.80
+            prix_m2_max = prix_m2 * 1.20
+        record('quantiles', debut)
+
+        for n, k in enumerate(lignes):
+            surface_m2 = items[k][2]
+            results[k] = {
+                'prix_m2_estime': prix_m2[n],
+                'prix_total_estime': prix_m2[n] * surface_m2,
+                'prix_m2_min': prix_m2_min[n],
+                'prix_m2_max': prix_m2_max[n],
+                'prix_total_min': prix_m2_min[n] * surface_m2,
+                'prix_total_max': prix_m2_max[n] * surface_m2,
+                'classification': "Cher" if classes[n] == 1 else "Bon marché",
+                'probabilite_cher': probas[n, 1],
+                'probabilite_bon_marche': probas[n, 0],
+                'confiance': max(probas[n]) * 100,
+                'geo_info': geos[n],
+                'timings_ms': timers[n].finish()
+            }
+        return results
 
 @st.cache_resource
 def get_predictor():
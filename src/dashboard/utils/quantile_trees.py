@@ -0,0 +1,85 @@
+"""
+Evaluation fusionnee des modeles quantiles (HistGradientBoosting)
+
+prediction.py entraine un HGBR par quantile (bornes basse / haute) et les sauvegarde ensemble
+dans model_quantiles.pkl. Plutot que d'appeler model.predict pour chacun (une validation sklearn
+et une passe sur les arbres par modele), on aplatit tous les arbres dans des tableaux numpy
+et on les parcourt en une seule fois pour une ligne (ou un lot de lignes).
+"""
+import numpy as np
+
+
+def garder_bornes(models, quantiles):
+    """Modeles des quantiles extremes seulement : les anciens model_quantiles.pkl contiennent aussi un median inutilise"""
+    quantiles = list(quantiles)
+    bornes = [quantiles.index(min(quantiles)), quantiles.index(max(quantiles))]
+    return [models[i] for i in bornes], [quantiles[i] for i in bornes]
+
+
+class FusedQuantileTrees:
+    """Parcours simultane de tous les arbres de plusieurs HGBR quantiles"""
+
+    def __init__(self, models, quantiles):
+        self.quantiles = list(quantiles)
+
+        feature_idx, threshold, missing_left = [], [], []
+        left, right, is_leaf, value = [], [], [], []
+        roots, tree_model = [], []
+        max_depth = 0
+        offset = 0
+
+        for m, model in enumerate(models):
+            for iteration in model._predictors:
+                for predictor in iteration:
+                    nodes = predictor.nodes
+                    if nodes['is_categorical'].any():
+                        raise ValueError("Features categorielles non supportees par l'evaluation fusionnee")
+
+                    feature_idx.append(nodes['feature_idx'])
+                    threshold.append(nodes['num_threshold'])
+                    missing_left.append(nodes['missing_go_to_left'].astype(bool))
+                    #indices locaux a l'arbre -> indices globaux
+                    left.append(nodes['left'].astype(np.int64) + offset)
+                    right.append(nodes['right'].astype(np.int64) + offset)
+                    is_leaf.append(nodes['is_leaf'].astype(bool))
+                    value.append(nodes['value'])
+
+                    roots.append(offset)
+                    tree_model.append(m)
+                    max_depth = max(max_depth, int(nodes['depth'].max()))
+                    offset += len(nodes)
+
+        self.feature_idx = np.concatenate(feature_idx)
+        self.threshold = np.concatenate(threshold)
+        self.missing_left = np.concatenate(missing_left)
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.is_leaf = np.concatenate(is_leaf)
+        self.value = np.concatenate(value)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.max_depth = max_depth
+
+        #matrice arbre -> modele pour sommer les feuilles par quantile en un produit
+        self.tree_to_model = np.zeros((len(roots), len(models)))
+        self.tree_to_model[np.arange(len(roots)), tree_model] = 1.0
+        self.baselines = np.array([float(np.ravel(model._baseline_prediction)[0]) for model in models])
+
+    def predict(self, X):
+        """Renvoie un tableau (n_lignes, n_quantiles), trie pour eviter les croisements de quantiles"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.tile(self.roots, (X.shape[0], 1))
+
+        for _ in range(self.max_depth):
+            leaf = self.is_leaf[node]
+            if leaf.all():
+                break
+            x = X[rows, self.feature_idx[node]]
+            go_left = np.where(np.isnan(x), self.missing_left[node], x <= self.threshold[node])
+            node = np.where(leaf, node, np.where(go_left, self.left[node], self.right[node]))
+
+        raw = self.value[node] @ self.tree_to_model + self.baselines
+        return np.sort(raw, axis=1)